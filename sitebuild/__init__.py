@@ -0,0 +1,5 @@
+"""Post-build pipeline for the portfolio.
+
+Hugo renders the site into ``public/``; the stages in this package then
+rewrite that output in place. Run them with ``python -m sitebuild``.
+"""
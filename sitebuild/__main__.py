@@ -0,0 +1,35 @@
+"""``python -m sitebuild [stage ...]`` -- run post-build stages on public/."""
+
+import argparse
+import sys
+
+from .pipeline import STAGES, run_stages
+from .site import BuildError, load_site
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="sitebuild", description=__doc__)
+    parser.add_argument("stages", nargs="*", metavar="stage",
+                        help=f"stages to run (default: all of "
+                             f"{', '.join(STAGES)})")
+    parser.add_argument("--public", help="build output (default: public/)")
+    parser.add_argument("-j", "--jobs", type=int,
+                        help="stages to run at once (default: CPU count)")
+    parser.add_argument("--force", action="store_true",
+                        help="run stages even if their inputs are unchanged")
+    args = parser.parse_args(argv)
+
+    unknown = [s for s in args.stages if s not in STAGES]
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(unknown)}")
+    try:
+        site = load_site(public=args.public)
+        run_stages(site, args.stages or STAGES, args.jobs, args.force)
+    except BuildError as e:
+        print(f"sitebuild: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
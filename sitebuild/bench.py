@@ -0,0 +1,114 @@
+"""Build benchmark: ``python -m sitebuild.bench [-n N] [-o out.json]``.
+
+Runs N clean builds (public/ and every cache removed first) and N warm
+ones through ``sitebuild.build``, recording wall time, the peak RSS of
+the largest single process in the build (Python or Hugo; it is not
+summed over the process tree) and the size of public/. With ``--baseline``
+it compares medians against an earlier run and fails on regressions,
+so a Hugo bump has to show it is no slower or heavier.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from .build import find_hugo, installed_version
+from .site import BuildError, load_site
+
+METRICS = ("seconds", "max_process_rss_kb", "bytes")
+
+
+def output_size(public):
+    files = [p for p in public.rglob("*") if p.is_file()]
+    return len(files), sum(p.stat().st_size for p in files)
+
+
+def timed_build(site, clean):
+    cmd = [sys.executable, "-m", "sitebuild.build", "--any-version",
+           "--no-telemetry", "--public", str(site.public)]
+    cmd += ["--clean"] if clean else []
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=site.root, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.DEVNULL)
+    # ru_maxrss from wait4 covers this child and its waited-for
+    # descendants (hugo), but is the largest of them, not their sum.
+    _, status, usage = os.wait4(proc.pid, 0)
+    seconds = time.perf_counter() - start
+    if os.waitstatus_to_exitcode(status):
+        raise BuildError(f"{'clean' if clean else 'warm'} build failed; "
+                         f"run python -m sitebuild.build to see why")
+    rss = usage.ru_maxrss // (1024 if sys.platform == "darwin" else 1)
+    files, size = output_size(site.public)
+    return {"kind": "clean" if clean else "warm",
+            "seconds": round(seconds, 3), "max_process_rss_kb": rss,
+            "files": files, "bytes": size}
+
+
+def summarise(runs):
+    out = {}
+    for kind in ("clean", "warm"):
+        group = [r for r in runs if r["kind"] == kind]
+        out[kind] = {m: statistics.median(r[m] for r in group)
+                     for m in METRICS}
+    return out
+
+
+def compare(result, baseline, tolerance):
+    """Print deltas; return the metrics that regressed past tolerance."""
+    worse = []
+    for kind, metrics in result["summary"].items():
+        for m, value in metrics.items():
+            old = baseline["summary"].get(kind, {}).get(m)
+            if not old:
+                continue
+            change = (value - old) / old
+            flag = change > tolerance
+            print(f"{kind:5} {m:18} {old:>12} -> {value:>12} "
+                  f"({change:+.1%}){'  REGRESSION' if flag else ''}")
+            if flag:
+                worse.append(f"{kind} {m}")
+    return worse
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="sitebuild.bench",
+                                     description=__doc__.split("\n")[0])
+    parser.add_argument("-n", type=int, default=3,
+                        help="builds of each kind (default: 3)")
+    parser.add_argument("-o", "--output", help="write results here")
+    parser.add_argument("--baseline", help="earlier results to compare to")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="allowed slowdown/growth (default: 0.10)")
+    args = parser.parse_args(argv)
+    try:
+        site = load_site()
+        hugo = find_hugo(site)
+        os.environ["PATH"] = (os.path.dirname(hugo) + os.pathsep
+                              + os.environ["PATH"])
+        runs = [timed_build(site, clean=True) for _ in range(args.n)]
+        runs += [timed_build(site, clean=False) for _ in range(args.n)]
+        result = {"hugo": installed_version(hugo)[0], "runs": runs,
+                  "summary": summarise(runs)}
+        text = json.dumps(result, indent=2)
+        if args.output:
+            with open(args.output, "w") as f:
+                f.write(text + "\n")
+        else:
+            print(text)
+        if args.baseline:
+            with open(args.baseline) as f:
+                worse = compare(result, json.load(f), args.tolerance)
+            if worse:
+                raise BuildError("regressed: " + ", ".join(worse))
+    except BuildError as e:
+        print(f"sitebuild.bench: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
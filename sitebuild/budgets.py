@@ -0,0 +1,178 @@
+"""Page-weight and request-count budgets.
+
+For every page, add up the HTML and everything it loads (stylesheets,
+their imports and ``url()`` references, scripts, images; not the lazily
+fetched icons and manifest), raw and gzip-compressed, and fail the build
+if a page goes over its budget in ``[params.sitebuild.budgets]``::
+
+    [params.sitebuild.budgets."/"]
+      compressed = "50KB"
+      requests = 10
+
+``"*"`` sets the default for every page. Besides ``raw``,
+``compressed`` and ``requests``, a budget can cap the compressed bytes
+of one kind: ``html``, ``css``, ``js``, ``font``, ``image``.
+"""
+
+import gzip
+import json
+import re
+
+from .fingerprint import CSS_IMPORT, CSS_URL
+from .markup import find_tags
+from .site import BuildError, log
+
+KINDS = {
+    ".html": "html", ".css": "css", ".js": "js", ".mjs": "js",
+    ".woff": "font", ".woff2": "font", ".ttf": "font", ".otf": "font",
+    ".avif": "image", ".webp": "image", ".jpg": "image", ".jpeg": "image",
+    ".png": "image", ".gif": "image", ".svg": "image", ".ico": "image",
+}
+TEXT = {"html", "css", "js"}
+LOADED_RELS = {"stylesheet", "preload", "modulepreload"}
+# Fetched lazily, off the critical path (touch and manifest icons only
+# when the site is installed), so they don't count towards page weight.
+LAZY_RELS = {"icon", "shortcut", "manifest", "apple-touch-icon"}
+UNITS = {"": 1, "B": 1, "KB": 1000, "MB": 1000 ** 2}
+
+
+def parse_size(value):
+    if isinstance(value, int):
+        return value
+    m = re.fullmatch(r"\s*([\d.]+)\s*([KM]?B?)\s*", str(value).upper())
+    if not m:
+        raise BuildError(f"bad size in budgets: {value!r}")
+    return int(float(m.group(1)) * UNITS[m.group(2)])
+
+
+def kind(path):
+    return KINDS.get(path.suffix.lower(), "other")
+
+
+def compressed_size(path):
+    raw = path.stat().st_size
+    if kind(path) not in TEXT and path.suffix != ".svg":
+        return raw
+    gz = path.with_name(path.name + ".gz")
+    if gz.is_file():
+        return gz.stat().st_size
+    return min(raw, len(gzip.compress(path.read_bytes(), compresslevel=9)))
+
+
+def pick_candidate(srcset, sizes, density=2):
+    """The srcset entry a ``density``x screen would fetch for a px
+    ``sizes``."""
+    entries = []
+    for part in srcset.split(","):
+        bits = part.split()
+        if bits:
+            w = bits[1] if len(bits) > 1 else "1x"
+            entries.append((float(w[:-1]) if w[-1] in "wx" else 0, bits[0]))
+    entries.sort()
+    m = re.fullmatch(r"\s*(\d+)px\s*", sizes or "")
+    if m and all(e[0] > 10 for e in entries):
+        want = density * int(m.group(1))
+        for width, url in entries:
+            if width >= want:
+                return url
+    return entries[-1][1] if entries else None
+
+
+def picture_sources(text):
+    """Map each ``<img>`` start offset to the first ``<source>`` before it
+    in the same ``<picture>``."""
+    out = {}
+    for m in re.finditer(r"<picture\b.*?</picture>", text, re.S | re.I):
+        tags = find_tags(m.group(0), "source", "img")
+        first = next((t for t in tags if t.name == "source"), None)
+        for t in tags:
+            if t.name == "img" and first is not None:
+                out[m.start() + t.start] = first
+    return out
+
+
+def subresources(site, page, lazy=False):
+    """Files in public/ that loading ``page`` fetches; with ``lazy``, also
+    its icons and manifest."""
+    wanted = LOADED_RELS | (LAZY_RELS if lazy else set())
+    text = page.read_text()
+    sources = picture_sources(text)
+    refs = []
+    for tag in find_tags(text, "link", "script", "img", "video", "audio"):
+        if tag.name == "link":
+            rels = set((tag.get("rel") or "").lower().split())
+            if rels & wanted:
+                refs.append(tag.get("href"))
+        elif tag.name == "img":
+            src = sources.get(tag.start, tag)
+            url = pick_candidate(src.get("srcset") or "", src.get("sizes"))
+            refs.append(url or tag.get("src"))
+        else:
+            refs.append(tag.get("src") or tag.get("poster"))
+    refs += [m.group(2) for m in CSS_URL.finditer(text)]
+
+    found, queue = {}, [(r, page) for r in refs if r]
+    while queue:
+        ref, owner = queue.pop()
+        path = site.resolve(ref, owner)
+        if path is None or path in found or path == page:
+            continue
+        found[path] = True
+        if path.suffix == ".css":
+            css = path.read_text()
+            queue += [(m.group(2), path) for m in CSS_IMPORT.finditer(css)]
+            queue += [(m.group(2), path) for m in CSS_URL.finditer(css)]
+    return list(found)
+
+
+def weigh(site, page):
+    files = [page] + subresources(site, page)
+    report = {"requests": len(files) - 1, "raw": 0, "compressed": 0,
+              "kinds": {}}
+    for path in files:
+        raw, comp = path.stat().st_size, compressed_size(path)
+        report["raw"] += raw
+        report["compressed"] += comp
+        k = report["kinds"].setdefault(kind(path), {"raw": 0,
+                                                    "compressed": 0})
+        k["raw"] += raw
+        k["compressed"] += comp
+    return report
+
+
+def page_url(site, page):
+    url = site.url_for(page)
+    return url[:-len("index.html")] if url.endswith("/index.html") else url
+
+
+def check(report, budget):
+    over = []
+    for key, limit in budget.items():
+        limit = parse_size(limit)
+        if key in ("raw", "compressed", "requests"):
+            value = report[key]
+        elif key in set(KINDS.values()):
+            value = report["kinds"].get(key, {}).get("compressed", 0)
+        else:
+            raise BuildError(f"unknown budget metric {key!r}")
+        if value > limit:
+            over.append(f"{key} {value} > {limit}")
+    return over
+
+
+def run(site):
+    budgets = site.settings("budgets")
+    default = budgets.get("*", {})
+    reports, failures = {}, []
+    for page in site.pages():
+        url = page_url(site, page)
+        report = reports[url] = weigh(site, page)
+        over = check(report, budgets.get(url, default))
+        log("budgets", f"{url}: {report['requests']} requests, "
+                       f"{report['raw']} raw / {report['compressed']} "
+                       f"compressed bytes" + (" OVER" if over else ""))
+        failures += [f"{url}: {o}" for o in over]
+    site.cache.mkdir(parents=True, exist_ok=True)
+    (site.cache / "budgets.json").write_text(json.dumps(reports, indent=2))
+    if failures:
+        raise BuildError("over budget:\n  " + "\n  ".join(failures))
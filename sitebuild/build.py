@@ -0,0 +1,167 @@
+"""Local build with the pinned Hugo: ``python -m sitebuild.build``.
+
+The Hugo version lives in ``[params.sitebuild.hugo]`` so CI and local
+builds agree. If the ``hugo`` on PATH is a different version, the
+pinned release is downloaded into .cache/hugo-bin, checked against the
+release's checksums.txt, and used instead.
+"""
+
+import argparse
+import hashlib
+import io
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import tarfile
+import time
+import urllib.request
+
+from . import telemetry
+from .pipeline import STAGES, run_stages
+from .site import BuildError, load_site, log
+
+RELEASE = ("https://github.com/gohugoio/hugo/releases/download/"
+           "v{version}/hugo{flavour}_{version}_{os}-{arch}.tar.gz")
+CHECKSUMS = ("https://github.com/gohugoio/hugo/releases/download/"
+             "v{version}/hugo_{version}_checksums.txt")
+
+
+def pinned(site):
+    cfg = site.settings("hugo")
+    if "version" not in cfg:
+        raise BuildError("[params.sitebuild.hugo] version is not set")
+    return cfg["version"], cfg.get("extended", False)
+
+
+def installed_version(hugo):
+    try:
+        out = subprocess.run([hugo, "version"], capture_output=True,
+                             text=True).stdout
+    except OSError:
+        return None, False
+    m = re.search(r"v(\d+\.\d+\.\d+)", out)
+    return (m.group(1) if m else None), "+extended" in out
+
+
+def download(site, version, extended):
+    flavour = "_extended" if extended else ""
+    dest = site.root / ".cache" / "hugo-bin" / f"{version}{flavour}"
+    binary = dest / "hugo"
+    if binary.is_file():
+        return binary
+    system = platform.system().lower()
+    machine = platform.machine().lower()
+    arch = {"x86_64": "amd64", "amd64": "amd64",
+            "aarch64": "arm64", "arm64": "arm64"}.get(machine)
+    if system not in {"linux", "darwin"} or not arch:
+        raise BuildError(f"no Hugo download for {system}/{machine}; "
+                         f"install Hugo {version} yourself")
+    if system == "darwin":
+        arch = "universal"
+    url = RELEASE.format(version=version, flavour=flavour, os=system,
+                         arch=arch)
+    log("build", f"downloading {url}")
+    try:
+        with urllib.request.urlopen(url) as resp:
+            data = resp.read()
+        with urllib.request.urlopen(CHECKSUMS.format(version=version)) as resp:
+            sums = resp.read().decode()
+    except OSError as e:
+        raise BuildError(f"could not download Hugo {version}: {e}") from None
+    verify(data, url.rsplit("/", 1)[-1], sums)
+    dest.mkdir(parents=True, exist_ok=True)
+    with tarfile.open(fileobj=io.BytesIO(data)) as tar:
+        tar.extract("hugo", dest, filter="data")
+    binary.chmod(0o755)
+    return binary
+
+
+def verify(data, name, sums):
+    """Check ``data`` against ``name``'s line in a checksums.txt."""
+    want = next((line.split()[0] for line in sums.splitlines()
+                 if line.split()[1:] == [name]), None)
+    if want is None:
+        raise BuildError(f"{name} is not listed in the Hugo checksums")
+    have = hashlib.sha256(data).hexdigest()
+    if have != want.lower():
+        raise BuildError(f"{name}: sha256 {have} does not match the "
+                         f"release checksum {want}")
+
+
+def find_hugo(site, any_version=False):
+    version, extended = pinned(site)
+    hugo = shutil.which("hugo")
+    if hugo:
+        have, have_extended = installed_version(hugo)
+        if any_version or (have == version
+                           and (have_extended or not extended)):
+            return hugo
+        log("build", f"hugo on PATH is {have}, pinned is {version}")
+    return str(download(site, version, extended))
+
+
+def hugo_args(site, themes=None):
+    # Clean so that outputs of earlier builds (renamed, compressed or
+    # generated files) don't get fingerprinted and deployed again.
+    return ["--minify", "--cleanDestinationDir",
+            "--themesDir", str(themes or site.root / "themes"),
+            "--baseURL", site.config["baseURL"],
+            "--destination", str(site.public)]
+
+
+def build(site, clean=False, any_version=False, post=True, themes=None,
+          jobs=None, record=False):
+    hugo = find_hugo(site, any_version)
+    if clean:
+        for path in (site.public, site.root / "resources" / "_gen",
+                     site.cache):
+            shutil.rmtree(path, ignore_errors=True)
+    args = hugo_args(site, themes) + (telemetry.HUGO_FLAGS if record else [])
+    start = time.perf_counter()
+    proc = subprocess.run([hugo, *args], cwd=site.root,
+                          stdout=subprocess.PIPE, text=True)
+    seconds = time.perf_counter() - start
+    sys.stdout.write(proc.stdout)
+    if proc.returncode:
+        raise BuildError(f"hugo exited with {proc.returncode}")
+    log("hugo", f"done in {seconds:.2f}s")
+    stages = run_stages(site, STAGES, jobs) if post else {}
+    if record:
+        telemetry.append(telemetry.record(site, seconds, proc.stdout, stages))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="sitebuild.build",
+                                     description=__doc__.split("\n")[0])
+    parser.add_argument("--clean", action="store_true",
+                        help="drop public/ and all caches first")
+    parser.add_argument("--any-version", action="store_true",
+                        help="use whatever hugo is on PATH")
+    parser.add_argument("--hugo-only", action="store_true",
+                        help="skip the post-build stages")
+    parser.add_argument("--pinned-version", action="store_true",
+                        help="print the pinned Hugo version and exit")
+    parser.add_argument("-j", "--jobs", type=int,
+                        help="stages to run at once (default: CPU count)")
+    parser.add_argument("--no-telemetry", action="store_true",
+                        help="don't append this build to "
+                             ".cache/telemetry.jsonl")
+    parser.add_argument("--public", help="build output (default: public/)")
+    args = parser.parse_args(argv)
+    try:
+        site = load_site(public=args.public)
+        if args.pinned_version:
+            print(pinned(site)[0])
+            return 0
+        build(site, args.clean, args.any_version, not args.hugo_only,
+              jobs=args.jobs, record=not args.no_telemetry)
+    except BuildError as e:
+        print(f"sitebuild.build: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,385 @@
+"""One stylesheet and one deferred script per page type.
+
+Pages that load the same local stylesheets share a bundle under
+``/bundles/``: ``@import`` chains are inlined, the sheets concatenated,
+and rules that are empty or repeated later dropped (the critical stage
+has already removed selectors nothing matches). Local scripts are
+concatenated the same way into one ``defer`` script, without top-level
+functions that nothing calls. Each bundle gets a source map, and the
+fingerprint stage hashes it like any other asset.
+
+A page is left as it is when merging could change what it does: a
+``<style>`` or remote stylesheet between its local ones, an inline or
+module script after its first local script, scripts that don't all
+agree on strict mode, ``document.write``, and so on.
+"""
+
+import gzip
+import json
+import re
+from urllib.parse import urlsplit
+
+from . import css, js
+from .budgets import page_url
+from .critical import BLOCKING_MEDIA, IMPORT, LOADER
+from .fingerprint import CSS_URL
+from .markup import find_tags, render_tag, splice
+from .site import log
+
+BUNDLES = "bundles"
+JS_TYPES = {None, "", "text/javascript", "application/javascript"}
+# Scripts that behave differently once they stop blocking the parser.
+UNDEFERRABLE = re.compile(r"document\.write|document\.currentScript")
+B64 = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/"
+
+
+def _vlq(n):
+    n = ((-n) << 1) | 1 if n < 0 else n << 1
+    out = ""
+    while True:
+        digit, n = n & 31, n >> 5
+        out += B64[digit | (32 if n else 0)]
+        if not n:
+            return out
+
+
+class SourceMap:
+    """Source map v3 for text copied verbatim out of other files.
+
+    Mappings are added at the start of each copied piece, each line and
+    after every ``;`` and ``}``: coarse, but every one is exact.
+    """
+
+    def __init__(self, file):
+        self.file = file
+        self.sources, self.contents = [], []
+        self.lines = [[]]
+        self.last = [0, 0, 0]   # source, line, column
+        self.col = 0
+
+    def source(self, url, content):
+        self.sources.append(url)
+        self.contents.append(content)
+        return len(self.sources) - 1
+
+    def _mark(self, src, line, col):
+        seg = [self.col, src - self.last[0], line - self.last[1],
+               col - self.last[2]]
+        self.lines[-1].append(seg)
+        self.last = [src, line, col]
+
+    def copy(self, src, start, end):
+        """Record ``contents[src][start:end]`` as the next output."""
+        text = self.contents[src]
+        line = text.count("\n", 0, start)
+        col = start - (text.rfind("\n", 0, start) + 1)
+        self._mark(src, line, col)
+        for i in range(start, end):
+            ch = text[i]
+            if ch == "\n":
+                line, col = line + 1, 0
+                self.lines.append([])
+                self.col = 0
+                if i + 1 < end:
+                    self._mark(src, line, col)
+                continue
+            col += 1
+            self.col += 1
+            if ch in ";}" and i + 1 < end:
+                self._mark(src, line, col)
+        return text[start:end]
+
+    def literal(self, text):
+        """Unmapped output, such as the separators between files."""
+        for ch in text:
+            if ch == "\n":
+                self.lines.append([])
+                self.col = 0
+            else:
+                self.col += 1
+        return text
+
+    def dumps(self):
+        lines = []
+        for segs in self.lines:
+            prev, out = 0, []
+            for col, *rest in segs:
+                out.append(_vlq(col - prev) + "".join(_vlq(v) for v in rest))
+                prev = col
+            lines.append(",".join(out))
+        return json.dumps({"version": 3, "file": self.file,
+                           "sources": self.sources,
+                           "sourcesContent": self.contents, "names": [],
+                           "mappings": ";".join(lines)})
+
+
+def _rebased(site, path):
+    """Stylesheet text with relative ``url()``s made site-absolute."""
+    def sub(m):
+        ref = m.group(2)
+        if ref.startswith("/") or ":" in ref:
+            return m.group(0)
+        target = site.resolve(ref, path, False)
+        return m.group(0) if target is None else \
+            f"url({site.url_for(target)})"
+    return CSS_URL.sub(sub, path.read_text())
+
+
+def _css_pieces(site, path, seen):
+    """``(path, text, start, end)`` statements of ``path`` in cascade
+    order, with local ``@import``s inlined; None if one can't be."""
+    seen.add(path)
+    text = _rebased(site, path)
+    out = []
+    for start, end in css.statements(text):
+        stmt = text[start:end]
+        name = re.match(r"@([\w-]+)", stmt)
+        name = name and name.group(1).lower()
+        if name == "charset":
+            continue
+        if name == "import":
+            m = IMPORT.match(stmt[len("@import"):].rstrip(";").strip())
+            target = m and site.resolve(m.group(1), path)
+            if target is None:
+                return None     # remote or conditional: can't inline
+            if target not in seen:
+                inner = _css_pieces(site, target, seen)
+                if inner is None:
+                    return None
+                out += inner
+            continue
+        out.append((path, text, start, end))
+    return out
+
+
+def build_css(site, paths, url):
+    """``(bundle text, map, dropped)`` for ``paths``, or None."""
+    pieces, seen = [], set()
+    for path in paths:
+        more = _css_pieces(site, path, seen)
+        if more is None:
+            return None
+        pieces += more
+    if any(re.match(r"@import", t[a:b], re.I) for _, t, a, b in pieces):
+        return None
+    # An empty rule does nothing, and an identical rule later in the
+    # cascade wins wherever this one would.
+    keep, later, dropped = [], set(), 0
+    for piece in reversed(pieces):
+        _, text, a, b = piece
+        stmt = re.sub(r"\s+", " ", text[a:b]).strip()
+        if stmt in later or re.fullmatch(r"[^@{][^{]*\{\s*\}", stmt):
+            dropped += 1
+            continue
+        later.add(stmt)
+        keep.append(piece)
+    keep.reverse()
+
+    smap = SourceMap(url.rsplit("/", 1)[-1])
+    index, out = {}, []
+    for path, text, a, b in keep:
+        if path not in index:
+            index[path] = smap.source(site.url_for(path), text)
+        out.append(smap.copy(index[path], a, b))
+    return "".join(out), smap, dropped
+
+
+def build_js(site, paths, url, elsewhere):
+    smap = SourceMap(url.rsplit("/", 1)[-1])
+    texts = {p: p.read_text() for p in paths}
+    joined = ";\n".join(texts.values())
+    try:
+        js.tokens(joined)
+        drop = js.unused_functions(joined, elsewhere)
+    except ValueError:
+        drop = {}
+    # Map the dropped spans back onto each file.
+    spans, offset = {}, 0
+    for path, text in texts.items():
+        spans[path] = sorted((a - offset, b - offset) for a, b in drop.values()
+                             if offset <= a < offset + len(text))
+        offset += len(text) + 2
+    out = []
+    for path, text in texts.items():
+        src = smap.source(site.url_for(path), text)
+        pos = 0
+        for a, b in spans[path] + [(len(text), len(text))]:
+            if a > pos:
+                out.append(smap.copy(src, pos, a))
+            pos = b
+        out.append(smap.literal(";\n"))
+    return "".join(out), smap, sorted(drop)
+
+
+def _element_end(text, tag, name):
+    close = text.find(f"</{name}>", tag.end)
+    return tag.end if close < 0 else close + len(name) + 3
+
+
+def css_slots(site, page, text):
+    """The page's local stylesheets as ``(start, end, path, form)``, or
+    None if merging them could change the cascade."""
+    slots, others = [], []
+    for tag in find_tags(text, "link", "style"):
+        if text.endswith("<noscript>", 0, tag.start):
+            continue
+        rels = set((tag.get("rel") or "").lower().split())
+        path = site.resolve(tag.get("href") or "", page)
+        local = path is not None and path.suffix == ".css"
+        if tag.name == "style":
+            others.append(tag.start)
+        elif "stylesheet" in rels:
+            if local and tag.get("media") in BLOCKING_MEDIA:
+                slots.append((tag.start, tag.end, path, "link", tag))
+            else:
+                others.append(tag.start)
+        elif "preload" in rels and tag.get("as") == "style":
+            tail = text[tag.end:]
+            m = re.match(r"<noscript>(<link\b[^>]*>)</noscript>", tail)
+            if local and tag.get("onload") == LOADER and m:
+                slots.append((tag.start, tag.end + m.end(), path, "preload",
+                              tag))
+            else:
+                others.append(tag.start)
+    if len({s[3] for s in slots}) > 1:
+        return None
+    if slots and any(slots[0][0] < o < slots[-1][0] for o in others):
+        return None
+    return slots
+
+
+def js_slots(site, page, text):
+    """The page's local classic scripts as ``(start, end, path)``, or
+    None if deferring them all could change what runs when."""
+    slots = []
+    for tag in find_tags(text, "script"):
+        kind = (tag.get("type") or "").lower()
+        src = tag.get("src")
+        end = _element_end(text, tag, "script")
+        if kind not in JS_TYPES and kind != "module":
+            continue        # data blocks such as JSON-LD
+        if "async" in tag.attrs:
+            continue
+        path = src and site.resolve(src, page)
+        if kind == "module" or not src or path is None:
+            if slots and (src or text[tag.end:end - 9].strip()):
+                return None
+            continue
+        if path.suffix != ".js" or "nomodule" in tag.attrs or \
+                UNDEFERRABLE.search(path.read_text()):
+            return None
+        slots.append((tag.start, end, path, tag))
+    # A "use strict" prologue only counts at the start of the bundle, so
+    # concatenating would make strict files sloppy or the reverse.
+    if len({js.is_strict(s[2].read_text()) for s in slots}) > 1:
+        return None
+    return slots
+
+
+def _name(site, pages, taken):
+    urls = sorted(page_url(site, p) for p in pages)
+    if "/" in urls:
+        name = "home"
+    else:
+        first = urlsplit(urls[0]).path.strip("/").split("/")[0]
+        name = re.sub(r"[^\w-]", "-", first) or "page"
+    base, n = name, 2
+    while name in taken:
+        name, n = f"{base}-{n}", n + 1
+    taken.add(name)
+    return name
+
+
+def _write(site, url, text, smap, comment):
+    path = site.public / url.lstrip("/")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    map_name = path.name + ".map"
+    path.write_text(text + comment.format(map_name) + "\n")
+    (path.parent / map_name).write_text(smap.dumps())
+    data = path.read_bytes()
+    return {"bytes": len(data),
+            "gzip": len(gzip.compress(data, compresslevel=9, mtime=0))}
+
+
+def run(site):
+    pages = site.pages()
+    texts = {p: p.read_text() for p in pages}
+    slots = {p: {"css": css_slots(site, p, texts[p]),
+                 "js": js_slots(site, p, texts[p])} for p in pages}
+    # Anything that could call into a bundle: pages (inline scripts and
+    # handlers) and every script, bundled or not.
+    sources = {p: p.read_text() for p in site.public.rglob("*")
+               if p.suffix in (".js", ".mjs")}
+    report, edits = {}, {p: [] for p in pages}
+    for kind, ext in (("css", ".css"), ("js", ".js")):
+        groups = {}
+        for page in pages:
+            found = slots[page][kind]
+            if found and (len(found) > 1 or kind == "css"):
+                key = tuple(s[2] for s in found)
+                groups.setdefault(key, []).append(page)
+        names = set()
+        for paths, users in groups.items():
+            url = f"/{BUNDLES}/{_name(site, users, names)}{ext}"
+            if kind == "css":
+                built = build_css(site, list(paths), url)
+                if built is None or (len(paths) == 1 and not built[2] and
+                                     len(built[1].sources) == 1):
+                    continue    # nothing to merge or drop
+                text, smap, dropped = built
+                info = _write(site, url, text, smap,
+                              "/*# sourceMappingURL={} */")
+                info["dropped_rules"] = dropped
+            else:
+                elsewhere = "".join(texts.values()) + "".join(
+                    t for p, t in sources.items() if p not in paths)
+                text, smap, dropped = build_js(site, list(paths), url,
+                                               elsewhere)
+                info = _write(site, url, text, smap,
+                              "//# sourceMappingURL={}")
+                info["dropped_functions"] = dropped
+            info["sources"] = {u: len(c.encode())
+                               for u, c in zip(smap.sources, smap.contents)}
+            info["pages"] = [page_url(site, p) for p in users]
+            report[url] = info
+            for page in users:
+                edits[page] += _replace(slots[page][kind], url)
+
+    for page, page_edits in edits.items():
+        if page_edits:
+            page.write_text(splice(texts[page], page_edits))
+    site.cache.mkdir(parents=True, exist_ok=True)
+    (site.cache / "bundles.json").write_text(json.dumps(report, indent=2))
+    for url, info in report.items():
+        before = sum(info["sources"].values())
+        if "dropped_rules" in info:
+            dropped = f"{info['dropped_rules']} rule(s)"
+        else:
+            dropped = ", ".join(info["dropped_functions"]) or "nothing"
+        log("bundle", f"{url}: {len(info['sources'])} file(s), {before} -> "
+                      f"{info['bytes']} bytes ({info['gzip']} gzipped), "
+                      f"dropped {dropped}, {len(info['pages'])} page(s)")
+    if not report:
+        log("bundle", "nothing to bundle")
+
+
+def _replace(found, url):
+    """Edits swapping the first slot for the bundle and dropping the rest."""
+    start, end, _, *rest = found[0]
+    tag = rest[-1]
+    if tag.name == "script":
+        attrs = {k: v for k, v in tag.attrs.items()
+                 if k not in ("src", "integrity", "defer")}
+        new = render_tag("script", {"src": url, **attrs, "defer": None}) + \
+            "</script>"
+    elif rest[0] == "preload":
+        attrs = {**tag.attrs, "href": url}
+        attrs.pop("integrity", None)
+        new = (render_tag("link", attrs) + "<noscript>" +
+               render_tag("link", {"rel": "stylesheet", "href": url}) +
+               "</noscript>")
+    else:
+        attrs = {**tag.attrs, "href": url}
+        attrs.pop("integrity", None)
+        new = render_tag("link", attrs)
+    return [(start, end, new)] + [(s[0], s[1], "") for s in found[1:]]
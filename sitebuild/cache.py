@@ -0,0 +1,30 @@
+"""Content-addressed store for expensive stage outputs.
+
+Outputs are keyed by the hash of their input bytes plus whatever
+settings affect them, so a rebuild only re-encodes files that changed.
+"""
+
+import json
+import shutil
+
+from .site import sha256
+
+
+class ContentCache:
+    def __init__(self, site, name):
+        self.dir = site.cache / name
+
+    def key(self, data, **settings):
+        return sha256(data + json.dumps(settings, sort_keys=True).encode())
+
+    def fetch(self, key, suffix, dest):
+        """Copy a cached output to ``dest``; False on a miss."""
+        path = self.dir / (key + suffix)
+        if not path.is_file():
+            return False
+        shutil.copyfile(path, dest)
+        return True
+
+    def store(self, key, suffix, src):
+        self.dir.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(src, self.dir / (key + suffix))
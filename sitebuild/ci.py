@@ -0,0 +1,58 @@
+"""Step timing and cache reporting for the GitHub Actions workflow.
+
+    python -m sitebuild.ci step <name> -- <command ...>
+    python -m sitebuild.ci cache <name> <cache-hit output>
+
+Each call appends a record to .cache/sitebuild/steps.jsonl and, on
+Actions, a row to the job summary so hit rates and timings are visible
+on every run.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+
+from .site import ROOT
+
+STEPS = ROOT / ".cache" / "sitebuild" / "steps.jsonl"
+
+
+def record(entry):
+    STEPS.parent.mkdir(parents=True, exist_ok=True)
+    with open(STEPS, "a") as f:
+        f.write(json.dumps(entry) + "\n")
+    summary = os.environ.get("GITHUB_STEP_SUMMARY")
+    if summary:
+        new = not os.path.exists(summary) or not os.path.getsize(summary)
+        with open(summary, "a") as f:
+            if new:
+                f.write("| step | result | seconds |\n|---|---|---|\n")
+            f.write(f"| {entry['name']} | {entry['result']} "
+                    f"| {entry.get('seconds', '')} |\n")
+    print(f"[ci] {entry['name']}: {entry['result']}"
+          + (f" in {entry['seconds']}s" if "seconds" in entry else ""),
+          file=sys.stderr)
+
+
+def main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if len(argv) >= 3 and argv[0] == "cache":
+        # actions/cache sets cache-hit to '' on a miss, 'false' on a
+        # restore-keys hit and 'true' on an exact hit.
+        result = {"true": "hit", "false": "partial"}.get(argv[2], "miss")
+        record({"name": f"cache:{argv[1]}", "result": result})
+        return 0
+    if len(argv) >= 4 and argv[0] == "step" and argv[2] == "--":
+        start = time.perf_counter()
+        code = subprocess.call(argv[3:])
+        record({"name": argv[1], "result": "ok" if code == 0 else "failed",
+                "seconds": round(time.perf_counter() - start, 2)})
+        return code
+    print(__doc__, file=sys.stderr)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
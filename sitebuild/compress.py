@@ -0,0 +1,56 @@
+"""Precompressed ``.gz`` and ``.br`` siblings for text assets.
+
+Hosts and servers that understand precompressed files can serve these
+directly instead of compressing on every request.
+"""
+
+import gzip
+
+from .site import BuildError, log, process_pool
+
+DEFAULT_EXTENSIONS = [".html", ".css", ".js", ".svg", ".xml",
+                      ".webmanifest"]
+SUFFIXES = (".gz", ".br")
+
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        raise BuildError("brotli is required for the compress stage "
+                         "(pip install -r requirements.txt)") from None
+    return brotli
+
+
+def compress_file(path):
+    """Write the siblings that beat ``path``; return their sizes."""
+    brotli = _brotli()
+    data = path.read_bytes()
+    encoded = {
+        ".gz": gzip.compress(data, compresslevel=9, mtime=0),
+        ".br": brotli.compress(data, quality=11),
+    }
+    sizes = {}
+    for suffix, blob in encoded.items():
+        sibling = path.with_name(path.name + suffix)
+        if len(blob) < len(data):
+            sibling.write_bytes(blob)
+            sizes[suffix] = len(blob)
+        elif sibling.exists():
+            sibling.unlink()
+    return path, len(data), sizes
+
+
+def run(site):
+    _brotli()
+    exts = set(site.settings("compress").get("extensions",
+                                             DEFAULT_EXTENSIONS))
+    files = [p for p in sorted(site.public.rglob("*"))
+             if p.is_file() and p.suffix in exts]
+    raw = total = 0
+    with process_pool() as pool:
+        for path, size, sizes in pool.map(compress_file, files,
+                                          chunksize=8):
+            raw += size
+            total += sizes.get(".br", sizes.get(".gz", size))
+    log("compress", f"{len(files)} files, {raw} -> {total} bytes (brotli)")
@@ -0,0 +1,192 @@
+"""Critical CSS inlining and unused-selector removal.
+
+The portfolio is a single screen, so the rules a page actually matches
+are what it needs for first paint. Those are inlined into ``<head>``
+and the full stylesheet is loaded without blocking rendering. Selectors
+that match nothing on any page (or in any class name scripts mention)
+are dropped from the stylesheets themselves.
+"""
+
+import re
+
+from . import css
+from .budgets import parse_size
+from .fingerprint import CSS_URL, update_integrity
+from .markup import find_tags, parse_tree, render_tag, splice
+from .site import log
+
+BLOCKING_MEDIA = {None, "", "all", "screen"}
+DEFAULT_MAX_INLINE = "14KB"
+LOADER = "this.onload=null;this.rel='stylesheet'"
+# ``@import url(x.css)`` / ``@import "x.css"``, with no media query.
+IMPORT = re.compile(r"""(?:url\()?\s*['"]?([^'")\s]+)['"]?\s*\)?\s*$""")
+
+
+def script_tokens(site, pages):
+    """Words in scripts that could be class names added at runtime."""
+    text = [p.read_text() for p in site.public.rglob("*.js")]
+    text += [m.group(1) for p in pages for m in re.finditer(
+        r"<script\b[^>]*>(.*?)</script>", p.read_text(), re.S | re.I)]
+    return set(re.findall(r"[\w:/.\[\]%-]+", "\n".join(text)))
+
+
+def stylesheet_links(site, page, text):
+    for tag in find_tags(text, "link"):
+        rels = set((tag.get("rel") or "").lower().split())
+        if text.endswith("<noscript>", 0, tag.start):
+            continue    # our own fallback from an earlier run
+        if "stylesheet" in rels and tag.get("media") in BLOCKING_MEDIA:
+            path = site.resolve(tag.get("href", ""), page)
+            if path is not None and path.suffix == ".css":
+                yield tag, path
+
+
+class Sheets:
+    """Parsed stylesheets, with local ``@import``s followed."""
+
+    def __init__(self, site):
+        self.site = site
+        self.nodes = {}
+        self.rebased = {}
+
+    def get(self, path):
+        if path not in self.nodes:
+            self.nodes[path] = css.parse(path.read_text())
+        return self.nodes[path]
+
+    def get_rebased(self, path):
+        """Like :meth:`get`, with relative ``url()``s made site-absolute
+        so the rules still work once inlined into a page."""
+        if path not in self.rebased:
+            def sub(m):
+                ref = m.group(2)
+                target = (None if ref.startswith("/") or ":" in ref
+                          else self.site.resolve(ref, path, False))
+                if target is None:
+                    return m.group(0)
+                return f"url({self.site.url_for(target)})"
+            self.rebased[path] = css.parse(
+                CSS_URL.sub(sub, path.read_text()))
+        return self.rebased[path]
+
+    def import_target(self, node, path):
+        """The local file an unconditional ``@import`` pulls in."""
+        if not (isinstance(node, css.AtRule) and node.name == "import"):
+            return None
+        m = IMPORT.match(node.prelude)
+        return m and self.site.resolve(m.group(1), path)
+
+    def imports(self, path):
+        for node in self.get(path):
+            target = self.import_target(node, path)
+            if target is not None:
+                yield target
+
+    def flat(self, path, seen=None):
+        """Rebased nodes of ``path`` with local imports inlined."""
+        seen = seen or set()
+        seen.add(path)
+        out = []
+        for node in self.get_rebased(path):
+            target = self.import_target(node, path)
+            if target is not None and target not in seen:
+                out += self.flat(target, seen)
+            elif target is None:
+                out.append(node)
+        return out
+
+    def closure(self, path, seen=None):
+        seen = seen if seen is not None else set()
+        if path not in seen:
+            seen.add(path)
+            for target in self.imports(path):
+                self.closure(target, seen)
+        return seen
+
+
+def keep(nodes, used, opaque=True):
+    """Copy of ``nodes`` with only the selectors ``used`` says to keep."""
+    out = []
+    for node in nodes:
+        if isinstance(node, css.Rule):
+            selectors = [s for s in node.selectors if used(s)]
+            if selectors:
+                out.append(css.Rule(selectors, node.body))
+        elif node.grouping:
+            children = keep(node.children, used, opaque)
+            if children:
+                out.append(css.AtRule(node.name, node.prelude, children))
+        elif opaque or node.name == "font-face":
+            out.append(node)
+    return out
+
+
+def matched(nodes, matcher):
+    return {s for n in css.walk(nodes) if isinstance(n, css.Rule)
+            for s in n.selectors if matcher.used(s)}
+
+
+def run(site):
+    cfg = site.settings("critical")
+    max_inline = parse_size(cfg.get("max_inline", DEFAULT_MAX_INLINE))
+    pages = site.pages()
+    extra = script_tokens(site, pages) | set(cfg.get("safelist", []))
+    sheets = Sheets(site)
+    matchers, links = {}, {}
+    for page in pages:
+        text = page.read_text()
+        links[page] = list(stylesheet_links(site, page, text))
+        matchers[page] = css.Matcher(parse_tree(text), extra)
+    if not any(links.values()):
+        log("critical", "no blocking stylesheets found")
+        return
+
+    # Used on this page, per sheet, before anything is rewritten.
+    before = {page: {p: matched(sheets.get(p), matchers[page])
+                     for _, root in links[page]
+                     for p in sheets.closure(root)}
+              for page in pages}
+
+    all_sheets = {p for page in pages for p in before[page]}
+    for path in sorted(all_sheets):
+        users = [pg for pg in pages if path in before[pg]]
+        old = path.read_text()
+        pruned = css.serialize(keep(sheets.get(path), lambda s: any(
+            matchers[pg].used(s) for pg in users)))
+        path.write_text(pruned)
+        log("critical", f"{site.url_for(path)}: {len(old.encode())} -> "
+                        f"{len(pruned.encode())} bytes")
+
+    for page in pages:
+        if links[page]:
+            _inline(site, page, links[page], sheets, matchers[page],
+                    max_inline)
+        # The pruned sheets no longer match the theme's SRI hashes.
+        text = page.read_text()
+        new = update_integrity(site, page, text)
+        if new != text:
+            page.write_text(new)
+
+
+def _inline(site, page, links, sheets, matcher, max_inline):
+    critical = "".join(
+        css.serialize(keep(sheets.flat(path), matcher.used, opaque=False))
+        for _, path in links)
+    blocking = sum(len(p.read_bytes()) for _, p in links)
+    if len(critical.encode()) > max_inline:
+        log("critical", f"{site.url_for(page)}: critical CSS is "
+                        f"{len(critical.encode())} bytes, over max_inline; "
+                        f"left blocking")
+        return
+    text = page.read_text()
+    edits = []
+    for i, (tag, _) in enumerate(links):
+        attrs = {k: v for k, v in tag.attrs.items() if k != "rel"}
+        lazy = render_tag("link", {"rel": "preload", "as": "style", **attrs,
+                                   "onload": LOADER})
+        fallback = f"<noscript>{tag.text}</noscript>"
+        style = f"<style>{critical}</style>" if i == 0 else ""
+        edits.append((tag.start, tag.end, style + lazy + fallback))
+    page.write_text(splice(text, edits))
+    log("critical", f"{site.url_for(page)}: {blocking} blocking CSS bytes "
+                    f"-> {len(critical.encode())} inline")
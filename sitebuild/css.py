@@ -0,0 +1,349 @@
+"""A small CSS reader: rules, at-rules and selector matching.
+
+This is not a full CSS parser. It understands the shapes minified theme
+CSS actually has: style rules, grouping at-rules (``@media``,
+``@supports``, ...) containing them, and opaque at-rules such as
+``@font-face`` that are kept as-is.
+"""
+
+import re
+from dataclasses import dataclass, field
+
+GROUPING = {"media", "supports", "layer", "container", "document"}
+
+
+@dataclass
+class Rule:
+    selectors: list
+    body: str
+
+
+@dataclass
+class AtRule:
+    name: str
+    prelude: str
+    children: list = None   # for grouping rules
+    raw: str = ""           # for everything else
+
+    @property
+    def grouping(self):
+        return self.children is not None
+
+
+@dataclass
+class _Cursor:
+    text: str
+    pos: int = 0
+    out: list = field(default_factory=list)
+
+
+def _skip_string(text, i):
+    quote = text[i]
+    i += 1
+    while i < len(text) and text[i] != quote:
+        i += 2 if text[i] == "\\" else 1
+    return i + 1
+
+
+def _scan(text, i, stops):
+    """Index of the first char in ``stops`` at nesting depth 0."""
+    depth = 0
+    while i < len(text):
+        ch = text[i]
+        if ch in "\"'":
+            i = _skip_string(text, i)
+            continue
+        if ch == "\\":
+            i += 2
+            continue
+        if text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            i = len(text) if end < 0 else end + 2
+            continue
+        if depth == 0 and ch in stops:
+            return i
+        if ch in "([{":
+            depth += 1
+        elif ch in ")]}":
+            depth -= 1
+        i += 1
+    return i
+
+
+def strip_comments(text):
+    out, i = [], 0
+    while i < len(text):
+        if text[i] in "\"'":
+            j = _skip_string(text, i)
+            out.append(text[i:j])
+            i = j
+        elif text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            i = len(text) if end < 0 else end + 2
+        else:
+            out.append(text[i])
+            i += 1
+    return "".join(out)
+
+
+def split_top(text, sep=","):
+    parts, i = [], 0
+    while i <= len(text):
+        j = _scan(text, i, sep)
+        parts.append(text[i:j].strip())
+        i = j + 1
+    return [p for p in parts if p]
+
+
+def statements(text):
+    """``(start, end)`` of each top-level rule or at-rule in ``text``,
+    leaving out the comments and whitespace between them."""
+    spans, i = [], 0
+    while i < len(text):
+        if text[i] in " \t\r\n;":
+            i += 1
+            continue
+        if text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            i = len(text) if end < 0 else end + 2
+            continue
+        j = _scan(text, i, "{;")
+        if j >= len(text) or text[j] == ";":
+            end = j + 1
+        else:
+            end = _scan(text, j + 1, "}") + 1
+        spans.append((i, min(end, len(text))))
+        i = end
+    return spans
+
+
+def parse(text):
+    return _parse_block(strip_comments(text))
+
+
+def _parse_block(text):
+    nodes, i = [], 0
+    while i < len(text):
+        while i < len(text) and text[i] in " \t\r\n;":
+            i += 1
+        if i >= len(text):
+            break
+        if text[i] == "@":
+            j = _scan(text, i, "{;")
+            head = text[i + 1:j]
+            name = re.match(r"[\w-]*", head).group(0).lower()
+            prelude = head[len(name):].strip()
+            if j >= len(text) or text[j] == ";":
+                nodes.append(AtRule(name, prelude, raw=text[i:j + 1]))
+                i = j + 1
+                continue
+            end = _scan(text, j + 1, "}")
+            if name in GROUPING:
+                nodes.append(AtRule(name, prelude,
+                                    children=_parse_block(text[j + 1:end])))
+            else:
+                nodes.append(AtRule(name, prelude, raw=text[i:end + 1]))
+            i = end + 1
+        else:
+            j = _scan(text, i, "{")
+            end = _scan(text, j + 1, "}")
+            nodes.append(Rule(split_top(text[i:j]),
+                              text[j + 1:end].strip()))
+            i = end + 1
+    return nodes
+
+
+def serialize(nodes):
+    out = []
+    for node in nodes:
+        if isinstance(node, Rule):
+            if node.selectors:
+                out.append(f"{','.join(node.selectors)}{{{node.body}}}")
+        elif node.grouping:
+            inner = serialize(node.children)
+            if inner:
+                out.append(f"@{node.name} {node.prelude}{{{inner}}}")
+        else:
+            out.append(node.raw)
+    return "".join(out)
+
+
+def walk(nodes):
+    for node in nodes:
+        yield node
+        if isinstance(node, AtRule) and node.grouping:
+            yield from walk(node.children)
+
+
+# -- selectors -------------------------------------------------------------
+
+_ESCAPE = re.compile(r"\\([0-9a-fA-F]{1,6}\s?|.)")
+_IDENT = r"(?:[\w-]|\\[0-9a-fA-F]{1,6}\s?|\\.|[^\x00-\x7f])+"
+_SIMPLE = re.compile(
+    rf"(?P<type>\*|{_IDENT})|#(?P<id>{_IDENT})|\.(?P<cls>{_IDENT})"
+    r"|\[(?P<attr>[^\]]*)\]|(?P<pe>::?" rf"{_IDENT})(?P<args>\()?")
+_COMBINATOR = re.compile(r"\s*([>+~])\s*|\s+")
+_ATTR = re.compile(rf"\s*({_IDENT})\s*(?:([~|^$*]?=)\s*"
+                   r"(\"[^\"]*\"|'[^']*'|[^\s\]]+)\s*([iIsS])?)?\s*$")
+# Pseudo-classes that depend on state or position we can't see
+# statically; treating them as matching keeps the rules they guard.
+STRUCTURAL_TRUE = {"not", "has"}
+ELEMENT_PSEUDOS = {"before", "after", "first-line", "first-letter",
+                   "placeholder", "selection", "marker", "backdrop",
+                   "file-selector-button"}
+
+
+def unescape(ident):
+    def sub(m):
+        s = m.group(1)
+        if re.fullmatch(r"[0-9a-fA-F]{1,6}\s?", s):
+            return chr(int(s.strip(), 16))
+        return s
+    return _ESCAPE.sub(sub, ident)
+
+
+def _parse_compound(text, i):
+    """Parse simple selectors at ``text[i:]``; return (parts, i)."""
+    parts = []
+    while i < len(text):
+        m = _SIMPLE.match(text, i)
+        if not m:
+            break
+        if m.group("pe"):
+            name = m.group("pe")
+            end = m.end()
+            args = None
+            if m.group("args"):
+                close = _scan(text, end, ")")
+                args, end = text[end:close], close + 1
+            if not name.startswith("::") and name[1:].lower() not in \
+                    ELEMENT_PSEUDOS:
+                parts.append(("pseudo", name[1:].lower(), args))
+            i = end
+            continue
+        if m.group("type"):
+            t = m.group("type")
+            if t != "*":
+                parts.append(("type", unescape(t).lower(), None))
+        elif m.group("id"):
+            parts.append(("id", unescape(m.group("id")), None))
+        elif m.group("cls"):
+            parts.append(("class", unescape(m.group("cls")), None))
+        else:
+            am = _ATTR.match(m.group("attr"))
+            if am:
+                value = am.group(3)
+                if value and value[0] in "\"'":
+                    value = value[1:-1]
+                parts.append(("attr", unescape(am.group(1)).lower(),
+                              (am.group(2), value, am.group(4))))
+        i = m.end()
+    return parts, i
+
+
+def parse_selector(text):
+    """``[(combinator, compound), ...]``, leftmost first."""
+    text = text.strip()
+    out, i, comb = [], 0, " "
+    while i < len(text):
+        compound, j = _parse_compound(text, i)
+        if j == i:
+            return None     # something we don't understand
+        out.append((comb, compound))
+        m = _COMBINATOR.match(text, j)
+        if not m or m.end() == j:
+            if j < len(text):
+                return None
+            break
+        comb = (m.group(1) or " ")
+        i = m.end()
+    return out or None
+
+
+class Matcher:
+    """Matches selectors against an element tree.
+
+    ``extra_classes`` are treated as present on every element; it holds
+    class names that scripts may add at runtime.
+    """
+
+    def __init__(self, root, extra_classes=()):
+        self.elements = [e for e in root.iter() if e.parent is not None]
+        self.extra = set(extra_classes)
+        self._cache = {}
+
+    def used(self, selector):
+        if selector not in self._cache:
+            parsed = parse_selector(selector)
+            # Unparseable selectors are kept: better a few spare bytes
+            # than a broken page.
+            self._cache[selector] = parsed is None or any(
+                self._match(parsed, len(parsed) - 1, el)
+                for el in self.elements)
+        return self._cache[selector]
+
+    def _match(self, parsed, idx, el):
+        comb, compound = parsed[idx]
+        if not self._compound(compound, el):
+            return False
+        if idx == 0:
+            return True
+        prev_comb = comb
+        if prev_comb == " ":
+            node = el.parent
+            while node is not None and node.parent is not None:
+                if self._match(parsed, idx - 1, node):
+                    return True
+                node = node.parent
+            return False
+        if prev_comb == ">":
+            return (el.parent is not None and el.parent.parent is not None
+                    and self._match(parsed, idx - 1, el.parent))
+        siblings = el.parent.children if el.parent else []
+        before = siblings[:siblings.index(el)]
+        if prev_comb == "+":
+            return bool(before) and self._match(parsed, idx - 1, before[-1])
+        return any(self._match(parsed, idx - 1, s) for s in before)
+
+    def _compound(self, compound, el):
+        for kind, name, arg in compound:
+            if kind == "type" and el.name != name:
+                return False
+            if kind == "id" and el.attrs.get("id") != name:
+                return False
+            if kind == "class" and name not in el.classes \
+                    and name not in self.extra:
+                return False
+            if kind == "attr" and not _attr(el, name, arg):
+                return False
+            if kind == "pseudo" and not self._pseudo(name, arg, el):
+                return False
+        return True
+
+    def _pseudo(self, name, arg, el):
+        if name == "root":
+            return el.name == "html"
+        if name in {"is", "where", "matches", "-webkit-any", "-moz-any"}:
+            subs = [parse_selector(s) for s in split_top(arg or "")]
+            return any(s is None or self._match(s, len(s) - 1, el)
+                       for s in subs)
+        return True
+
+
+def _attr(el, name, arg):
+    if name not in el.attrs:
+        return False
+    op, want, flag = arg
+    if op is None:
+        return True
+    have = el.attrs[name]
+    if flag and flag.lower() == "i":
+        have, want = have.lower(), want.lower()
+    return {
+        "=": have == want,
+        "~=": want in have.split(),
+        "|=": have == want or have.startswith(want + "-"),
+        "^=": have.startswith(want),
+        "$=": have.endswith(want),
+        "*=": want in have,
+    }[op]
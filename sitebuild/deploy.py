@@ -0,0 +1,130 @@
+"""Incremental deploy of public/ to a git branch (gh-pages by default).
+
+The deployed tree carries a manifest of content hashes. Each deploy
+diffs public/ against it and commits only the added, changed and removed
+files on top of the branch, without ever checking the branch out::
+
+    python -m sitebuild.deploy --remote <url> [--branch gh-pages] [-n]
+
+Any git URL works, including a local bare repository.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from .site import BuildError, load_site, sha256
+
+MANIFEST = ".deploy-manifest.json"
+EXTRA = {".nojekyll": b""}
+EMPTY = "0" * 40
+BOT = {"user.name": "github-actions[bot]",
+       "user.email": "41898282+github-actions[bot]@users.noreply.github.com"}
+
+
+def git(*args, cwd, input=None, check=True):
+    proc = subprocess.run(["git", *args], cwd=cwd, input=input,
+                          capture_output=True, text=True)
+    if check and proc.returncode:
+        raise BuildError(f"git {args[0]} failed: {proc.stderr.strip()}")
+    return proc.stdout.strip()
+
+
+def snapshot(public):
+    """``{path: sha256}`` for every file under ``public``."""
+    files = {}
+    for path in sorted(public.rglob("*")):
+        if path.is_file():
+            files[path.relative_to(public).as_posix()] = sha256(
+                path.read_bytes())
+    return files
+
+
+def diff(old, new):
+    """Sorted ``(status, path)`` pairs, status being A, M or D."""
+    changes = [("A" if p not in old else "M", p)
+               for p, h in new.items() if old.get(p) != h]
+    changes += [("D", p) for p in old if p not in new]
+    return sorted(changes, key=lambda c: c[1])
+
+
+def deploy(public, remote, branch="gh-pages", dry_run=False,
+           message="Deploy"):
+    # git runs in a temporary repository, so paths must be absolute.
+    public = Path(public).resolve()
+    new = snapshot(public)
+    with tempfile.TemporaryDirectory() as repo:
+        git("init", "-q", cwd=repo)
+        for key, value in BOT.items():
+            if not git("config", key, cwd=repo, check=False):
+                git("config", key, value, cwd=repo)
+        parent = None
+        if git("ls-remote", "--heads", remote, branch, cwd=repo):
+            git("fetch", "-q", "--depth", "1", remote, branch, cwd=repo)
+            parent = git("rev-parse", "FETCH_HEAD", cwd=repo)
+        old_manifest = git("show", f"{parent}:{MANIFEST}", cwd=repo,
+                           check=False) if parent else ""
+        old = json.loads(old_manifest) if old_manifest else {}
+        changes = diff(old, new)
+
+        for status, path in changes:
+            print(f"{status} {path}")
+        unchanged = len(set(new) - {p for _, p in changes})
+        print(f"{len(changes)} change(s), {unchanged} unchanged file(s) not "
+              f"uploaded")
+        if not changes or dry_run:
+            return changes
+
+        # Without a manifest we can't tell which files on the branch are
+        # ours, so the first incremental deploy replaces the whole tree.
+        if parent and old:
+            git("read-tree", parent, cwd=repo)
+        upload = [p for s, p in changes if s != "D"]
+        blobs = git("hash-object", "-w", "--stdin-paths", cwd=repo,
+                    input="\n".join(str(public / p) for p in upload))
+        lines = [f"100644 {sha}\t{p}"
+                 for sha, p in zip(blobs.split(), upload)]
+        lines += [f"0 {EMPTY}\t{p}" for s, p in changes if s == "D"]
+        extra = {**EXTRA, MANIFEST: json.dumps(new, indent=0).encode()}
+        for name, data in extra.items():
+            with tempfile.NamedTemporaryFile(dir=repo, delete=False) as f:
+                f.write(data)
+            sha = git("hash-object", "-w", f.name, cwd=repo)
+            os.unlink(f.name)
+            lines.append(f"100644 {sha}\t{name}")
+        git("update-index", "--index-info", cwd=repo,
+            input="\n".join(lines) + "\n")
+        tree = git("write-tree", cwd=repo)
+        commit = git("commit-tree", tree, *(["-p", parent] if parent else []),
+                     "-m", message, cwd=repo)
+        git("push", "-q", remote, f"{commit}:refs/heads/{branch}", cwd=repo)
+        print(f"pushed {commit[:12]} to {branch}")
+    return changes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="sitebuild.deploy",
+                                     description=__doc__.split("\n")[0])
+    parser.add_argument("--remote", required=True)
+    parser.add_argument("--branch", default="gh-pages")
+    parser.add_argument("--public", help="build output (default: public/)")
+    parser.add_argument("-m", "--message", default="Deploy")
+    parser.add_argument("-n", "--dry-run", action="store_true",
+                        help="print the changes without pushing")
+    args = parser.parse_args(argv)
+    try:
+        site = load_site(public=args.public)
+        deploy(site.public, args.remote, args.branch, args.dry_run,
+               args.message)
+    except BuildError as e:
+        print(f"sitebuild.deploy: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
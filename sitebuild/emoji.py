@@ -0,0 +1,163 @@
+"""Emoji drawn from one inline SVG sprite instead of the visitor's fonts.
+
+``enableEmoji`` turns ``:shortcodes:`` into Unicode emoji, which then
+look different on every OS (or pull in an emoji web font). Each emoji
+in the text of a page becomes a ``<use>`` of a ``<symbol>`` in the same
+sprite the link icons use, so only the glyphs actually used are sent.
+
+Artwork comes from ``assets/emoji/<codepoints>.svg`` in the site or the
+theme, named as in Twemoji. None ships with the site: ``python -m
+sitebuild.emoji`` lists the emoji in public/ and ``--vendor`` downloads
+the missing ones, to commit. Emoji without artwork are left as text and
+listed in the build log.
+"""
+
+import argparse
+import re
+import sys
+import urllib.request
+
+from .icons import add_symbols, symbol, vendored
+from .markup import find_tags, render_tag, splice
+from .site import BuildError, load_site, log
+
+TWEMOJI = "https://cdn.jsdelivr.net/gh/jdecked/twemoji@15.1.0/assets/svg/"
+ATTRIBUTION = ("Emoji graphics from Twemoji (https://github.com/jdecked/"
+               "twemoji), CC-BY 4.0.\n")
+# BMP symbols that are emoji without a U+FE0F selector.
+_WIDE = (r"\u231a\u231b\u23e9-\u23ec\u23f0\u23f3\u25fd\u25fe\u2614\u2615"
+         r"\u2648-\u2653\u267f\u2693\u26a1\u26aa\u26ab\u26bd\u26be\u26c4"
+         r"\u26c5\u26ce\u26d4\u26ea\u26f2\u26f3\u26f5\u26fa\u26fd\u2705"
+         r"\u270a\u270b\u2728\u274c\u274e\u2753-\u2755\u2757\u2795-\u2797"
+         r"\u27b0\u27bf\u2b1b\u2b1c\u2b50\u2b55")
+# Emoji in the supplementary planes. U+1F000-1F2FF is mostly cards,
+# dominoes and enclosed letters, which are text; only its emoji are
+# listed (regional indicators are matched in pairs, as flags).
+_PICTO = (r"\U0001f004\U0001f0cf\U0001f18e\U0001f191-\U0001f19a\U0001f201"
+          r"\U0001f21a\U0001f22f\U0001f232-\U0001f236\U0001f238-\U0001f23a"
+          r"\U0001f250\U0001f251\U0001f300-\U0001f64f\U0001f680-\U0001f6ff"
+          r"\U0001f7e0-\U0001f7eb\U0001f7f0\U0001f90c-\U0001f9ff"
+          r"\U0001fa70-\U0001faff")
+# Symbols that are text unless followed by U+FE0F.
+_TEXT = (r"\u00a9\u00ae\u203c\u2049\u2122\u2139\u2194-\u21aa\u2300-\u2bff"
+         r"\U0001f170\U0001f171\U0001f17e\U0001f17f\U0001f202\U0001f237")
+_BASE = (rf"(?:[{_PICTO}{_WIDE}]\ufe0f?"
+         rf"|[{_TEXT}]\ufe0f)[\U0001f3fb-\U0001f3ff]?")
+EMOJI = re.compile(
+    r"[\U0001f1e6-\U0001f1ff]{2}"          # flags
+    r"|[0-9#*]\ufe0f?\u20e3"               # keycaps
+    rf"|{_BASE}(?:\u200d{_BASE})*")
+# Markup whose text can't hold an <svg>, or isn't text at all.
+SKIP = re.compile(r"<(script|style|title|textarea|svg|noscript)\b.*?</\1\s*>"
+                  r"|<!--.*?-->|<[^>]*>", re.S | re.I)
+
+
+def code(seq):
+    """Twemoji's file name for ``seq``: FE0F only kept in ZWJ sequences."""
+    if "\u200d" not in seq:
+        seq = seq.replace("\ufe0f", "")
+    return "-".join(f"{ord(c):x}" for c in seq)
+
+
+def found(text):
+    """``(start, end, emoji)`` for every emoji in the page's text."""
+    out, pos = [], 0
+    for m in [*SKIP.finditer(text), None]:
+        end = m.start() if m else len(text)
+        out += [(e.start() + pos, e.end() + pos, e.group(0))
+                for e in EMOJI.finditer(text[pos:end])]
+        pos = m.end() if m else end
+    return out
+
+
+def use(seq, name):
+    attrs = {"class": "emoji", "role": "img", "aria-label": seq,
+             "width": "1em", "height": "1em",
+             "style": "vertical-align:-.125em"}
+    return render_tag("svg", attrs) + render_tag(
+        "use", {"href": f"#emoji-{name}"}) + "</use></svg>"
+
+
+def used(site):
+    """``{emoji: pages}`` across public/."""
+    out = {}
+    for page in site.pages():
+        for _, _, seq in found(page.read_text()):
+            out.setdefault(seq, set()).add(site.url_for(page))
+    return out
+
+
+def run(site):
+    symbols, missing, total = {}, set(), 0
+    for page in site.pages():
+        text = page.read_text()
+        if not find_tags(text, "body"):
+            continue
+        edits, names = [], []
+        for start, end, seq in found(text):
+            name = code(seq)
+            if name not in symbols and name not in missing:
+                source = vendored(site, name, "emoji")
+                if source is None:
+                    missing.add(name)
+                    continue
+                symbols[name] = symbol(name, source, "emoji")
+            if name in symbols:
+                edits.append((start, end, use(seq, name)))
+                names.append(name)
+        if edits:
+            page.write_text(add_symbols(
+                splice(text, edits), [symbols[n] for n in
+                                      dict.fromkeys(names)]))
+            total += len(edits)
+    size = sum(len(s.encode()) for s in symbols.values())
+    log("emoji", f"{total} emoji -> {len(symbols)} symbol(s), {size} bytes")
+    if missing:
+        log("emoji", f"no artwork for {', '.join(sorted(missing))}, left as "
+                     f"text; fetch it with python -m sitebuild.emoji --vendor")
+
+
+def vendor(site, seqs):
+    """Download Twemoji artwork for ``seqs`` into assets/emoji/."""
+    folder = site.root / "assets" / "emoji"
+    for seq in sorted(seqs):
+        name = code(seq)
+        if vendored(site, name, "emoji") is not None:
+            continue
+        try:
+            with urllib.request.urlopen(f"{TWEMOJI}{name}.svg",
+                                        timeout=30) as resp:
+                data = resp.read()
+        except OSError as e:
+            raise BuildError(f"could not fetch {seq} ({name}): {e}") from None
+        folder.mkdir(parents=True, exist_ok=True)
+        (folder / f"{name}.svg").write_bytes(data)
+        print(f"vendored {seq} -> assets/emoji/{name}.svg", file=sys.stderr)
+    if folder.is_dir():
+        (folder / "ATTRIBUTION").write_text(ATTRIBUTION)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="sitebuild.emoji",
+                                     description=__doc__.split("\n")[0])
+    parser.add_argument("--vendor", action="store_true",
+                        help="download missing artwork into assets/emoji/")
+    parser.add_argument("--public", help="build output (default: public/)")
+    args = parser.parse_args(argv)
+    try:
+        site = load_site(public=args.public)
+        seqs = used(site)
+        for seq, pages in sorted(seqs.items()):
+            have = vendored(site, code(seq), "emoji") is not None
+            print(f"{seq}  {code(seq):24} {'ok' if have else 'MISSING':8}"
+                  f"{', '.join(sorted(pages))}")
+        if args.vendor:
+            vendor(site, seqs)
+    except BuildError as e:
+        print(f"sitebuild.emoji: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
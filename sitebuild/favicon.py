@@ -0,0 +1,139 @@
+"""Favicon, touch icons and web manifest from the author portrait.
+
+Writes ``favicon.ico`` (16, 32 and 48 px), ``apple-touch-icon.png``,
+``icon-192.png``, ``icon-512.png`` and ``site.webmanifest`` into public/
+and links them from every page. Nothing is scaled up: ICO frames and
+manifest icons larger than the portrait are left out (a 460 px source
+gets no ``icon-512.png``), and the touch icon is made at the portrait's
+size if that is smaller. Each image is a palette PNG of at most
+``[params.sitebuild.favicon] colors`` (128 by default) if that is
+smaller than full colour. The fingerprint stage hashes the PNGs and the
+manifest; ``/favicon.ico`` keeps its name because browsers ask for it
+whether or not a page links it.
+"""
+
+import io
+import json
+
+from .images import _pil, author_image
+from .markup import find_tags, head_offset, render_tag, splice
+from .site import log
+
+ICO_SIZES = [16, 32, 48]
+TOUCH_SIZE = 180
+MANIFEST_SIZES = [192, 512]
+MANIFEST = "site.webmanifest"
+DEFAULT_COLORS = 128
+
+
+def square(im):
+    """Centre crop to the shorter side."""
+    side = min(im.size)
+    left, top = (im.width - side) // 2, (im.height - side) // 2
+    return im.crop((left, top, left + side, top + side))
+
+
+def _png_size(im):
+    buf = io.BytesIO()
+    im.save(buf, "PNG", optimize=True)
+    return len(buf.getvalue())
+
+
+def resized(im, size, colors):
+    """``im`` at ``size``, in full colour or as a palette of ``colors``
+    (0: never), whichever stores as the smaller PNG."""
+    Image = _pil()
+    out = im if im.width == size else im.resize((size, size), Image.LANCZOS)
+    if colors:
+        palette = out.quantize(colors, dither=Image.Dither.NONE)
+        if _png_size(palette) < _png_size(out):
+            return palette
+    return out
+
+
+def save_ico(im, path, colors):
+    # Each size is resampled from the full image rather than left to
+    # the ICO encoder, which would shrink a palette image.
+    sizes = [s for s in ICO_SIZES if s <= im.width] or [im.width]
+    frames = [resized(im, s, colors) for s in sizes]
+    frames[-1].save(path, "ICO", sizes=[(s, s) for s in sizes],
+                    append_images=frames[:-1])
+    return path.stat().st_size
+
+
+def save_png(im, size, path, colors):
+    resized(im, size, colors).save(path, "PNG", optimize=True)
+    return path.stat().st_size
+
+
+def manifest_sizes(side):
+    """The MANIFEST_SIZES a source of ``side`` px can fill, or just
+    ``side`` if it is smaller than all of them."""
+    return [s for s in MANIFEST_SIZES if s <= side] or [side]
+
+
+def manifest(site, cfg, sizes):
+    author = site.params.get("author", {})
+    return {
+        "name": site.config.get("title", author.get("name", "")),
+        "short_name": author.get("name", site.config.get("title", "")),
+        "start_url": "/",
+        "display": "standalone",
+        "background_color": cfg.get("background_color", "#ffffff"),
+        "theme_color": cfg.get("theme_color", "#ffffff"),
+        "icons": [{"src": f"/icon-{s}.png", "sizes": f"{s}x{s}",
+                   "type": "image/png"} for s in sizes],
+    }
+
+
+def head_tags(cfg):
+    return [
+        ("icon", render_tag("link", {"rel": "icon", "href": "/favicon.ico",
+                                     "sizes": "32x32"})),
+        ("apple-touch-icon", render_tag("link", {
+            "rel": "apple-touch-icon", "href": "/apple-touch-icon.png"})),
+        ("manifest", render_tag("link", {"rel": "manifest",
+                                         "href": f"/{MANIFEST}"})),
+        ("theme-color", render_tag("meta", {
+            "name": "theme-color",
+            "content": cfg.get("theme_color", "#ffffff")})),
+    ]
+
+
+def link_page(page, tags):
+    """Add the tags a page doesn't have yet; theme-provided ones win."""
+    text = page.read_text()
+    have = set()
+    for tag in find_tags(text, "link", "meta"):
+        have |= set((tag.get("rel") or "").lower().split())
+        have.add((tag.get("name") or "").lower())
+    missing = [markup for kind, markup in tags if kind not in have]
+    at = head_offset(text)
+    if not missing or at is None:
+        return 0
+    page.write_text(splice(text, [(at, at, "".join(missing))]))
+    return 1
+
+
+def run(site):
+    cfg = site.settings("favicon")
+    colors = cfg.get("colors", DEFAULT_COLORS)
+    Image = _pil()
+    sizes = {}
+    with Image.open(author_image(site)) as im:
+        im = square(im.convert("RGB"))
+        icons = manifest_sizes(im.width)
+        sizes["favicon.ico"] = save_ico(im, site.public / "favicon.ico",
+                                        colors)
+        outputs = [("apple-touch-icon.png", min(TOUCH_SIZE, im.width))]
+        outputs += [(f"icon-{s}.png", s) for s in icons]
+        for name, size in outputs:
+            sizes[name] = save_png(im, size, site.public / name, colors)
+    (site.public / MANIFEST).write_text(
+        json.dumps(manifest(site, cfg, icons), separators=(",", ":")))
+
+    tags = head_tags(cfg)
+    linked = sum(link_page(p, tags) for p in site.pages())
+    for name, size in sizes.items():
+        log("favicon", f"/{name}: {size} bytes")
+    log("favicon", f"icon links added to {linked} page(s)")
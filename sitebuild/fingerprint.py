@@ -0,0 +1,214 @@
+"""Content-hashed filenames for static assets.
+
+Images, fonts, stylesheets, scripts and web manifests in public/ are
+renamed to ``name.<hash>.ext`` and every reference to them in HTML, CSS
+and manifests is rewritten, so hosts that allow it can cache them as immutable.
+``public/asset-manifest.json`` maps the original URLs to the new ones.
+Files Hugo fingerprinted keep their names unless an earlier stage
+changed them, and ``integrity`` attributes are recomputed to match.
+"""
+
+import base64
+import hashlib
+import json
+import re
+from urllib.parse import urlsplit
+
+from .markup import find_tags, render_tag, splice
+from .site import log, sha256
+
+ASSETS = {".avif", ".webp", ".jpg", ".jpeg", ".png", ".gif", ".svg",
+          ".ico", ".woff", ".woff2", ".ttf", ".css", ".js", ".webmanifest"}
+# Fetched by name whether or not anything links them; a service worker
+# must also keep its URL, or the browser treats it as a new worker.
+FIXED = {"/favicon.ico", "/sw.js"}
+# ``name.<hash>.ext``: ours, or Hugo's ``| fingerprint`` (md5, sha256,
+# sha384 or sha512), by the length of the hex digest.
+HASHED = re.compile(r"\.([0-9a-f]{10}|[0-9a-f]{32}|[0-9a-f]{64}|[0-9a-f]{96}"
+                    r"|[0-9a-f]{128})(\.[^.]+)$")
+DIGESTS = {10: "sha256", 32: "md5", 64: "sha256", 96: "sha384",
+           128: "sha512"}
+SRI = {"sha256", "sha384", "sha512"}
+URL_ATTRS = {"src", "href", "poster", "content", "data-src"}
+SRCSET_ATTRS = {"srcset", "imagesrcset"}
+CSS_URL = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+CSS_IMPORT = re.compile(r"""@import\s+(['"])([^'"]+)\1""")
+MANIFEST = "asset-manifest.json"
+HASH_LEN = 10
+
+
+def is_fingerprinted(path, data=None):
+    """Whether the hash in ``path``'s name is that of its content. A
+    file rewritten after it was named (pruned CSS, say) is not."""
+    m = HASHED.search(path.name)
+    if not m:
+        return False
+    data = path.read_bytes() if data is None else data
+    algo = DIGESTS[len(m.group(1))]
+    return hashlib.new(algo, data).hexdigest().startswith(m.group(1))
+
+
+def sri(value, data):
+    """The ``integrity`` attribute ``value`` recomputed for ``data``;
+    empty if it names no algorithm we know."""
+    out = []
+    for token in value.split():
+        algo = token.split("-", 1)[0].lower()
+        if algo in SRI:
+            digest = base64.b64encode(hashlib.new(algo, data).digest())
+            out.append(f"{algo}-{digest.decode()}")
+    return " ".join(dict.fromkeys(out))
+
+
+def update_integrity(site, page, text):
+    """``text`` with every ``integrity`` on a local file matching the
+    file as it is now."""
+    edits = []
+    for tag in find_tags(text, "link", "script"):
+        value = tag.get("integrity")
+        ref = tag.get("href") or tag.get("src") or ""
+        target = value and site.resolve(ref, page)
+        if not target:
+            continue
+        new = sri(value, target.read_bytes())
+        if new != value:
+            attrs = {k: v for k, v in tag.attrs.items() if k != "integrity"}
+            if new:
+                attrs["integrity"] = new
+            edits.append((tag.start, tag.end, render_tag(tag.name, attrs)))
+    return splice(text, edits)
+
+
+def current_url(site, url):
+    """Where ``url`` lives after fingerprinting (itself if untouched)."""
+    path = site.public / MANIFEST
+    manifest = json.loads(path.read_text()) if path.is_file() else {}
+    return manifest.get(url, url)
+
+
+def _rename(ref, target, mapping):
+    """``ref`` with its filename swapped for the hashed one, if any."""
+    new = mapping.get(target)
+    if new is None:
+        return ref
+    path = urlsplit(ref).path
+    cut = ref.find(path) + len(path)
+    head, _, _ = ref[:cut].rpartition("/")
+    return (head + "/" if "/" in ref[:cut] else "") + new.name + ref[cut:]
+
+
+def rewrite_css(site, text, owner, mapping):
+    def sub(m):
+        ref = m.group(2)
+        new = _rename(ref, site.resolve(ref, owner, False), mapping)
+        return m.group(0).replace(ref, new) if new != ref else m.group(0)
+    return CSS_IMPORT.sub(sub, CSS_URL.sub(sub, text))
+
+
+def rewrite_manifest(site, text, owner, mapping):
+    data = json.loads(text)
+    for entry in data.get("icons", []) + data.get("screenshots", []):
+        if entry.get("src"):
+            entry["src"] = _rename(entry["src"], site.resolve(
+                entry["src"], owner, False), mapping)
+    return json.dumps(data, separators=(",", ":"))
+
+
+def rewrite_html(site, page, mapping):
+    text = page.read_text()
+    edits = []
+    for tag in find_tags(text):
+        attrs, changed = dict(tag.attrs), False
+        for key, value in tag.attrs.items():
+            if not value:
+                continue
+            if key in URL_ATTRS:
+                new = _rename(value, site.resolve(value, page, False), mapping)
+            elif key in SRCSET_ATTRS:
+                new = ", ".join(
+                    " ".join([_rename(u, site.resolve(u, page, False), mapping),
+                              *rest])
+                    for u, *rest in (c.split() for c in value.split(",")
+                                     if c.strip()))
+            else:
+                continue
+            if new != value:
+                attrs[key], changed = new, True
+        if changed:
+            edits.append((tag.start, tag.end,
+                          render_tag(tag.name, attrs,
+                                     tag.text.endswith("/>"))))
+    text = rewrite_css(site, splice(text, edits), page, mapping)
+    page.write_text(update_integrity(site, page, text))
+
+
+def _css_order(site, sheets):
+    """Stylesheets ordered so ``@import``-ed ones are hashed first."""
+    deps = {}
+    for sheet in sheets:
+        text = sheet.read_text()
+        refs = [m.group(2) for m in CSS_IMPORT.finditer(text)]
+        refs += [m.group(2) for m in CSS_URL.finditer(text)]
+        deps[sheet] = {site.resolve(r, sheet) for r in refs} & set(sheets)
+    order = []
+    while deps:
+        ready = sorted(s for s, d in deps.items() if not d - set(order))
+        # An import cycle can't be hashed consistently; just break it.
+        order += ready or sorted(deps)[:1]
+        for s in order:
+            deps.pop(s, None)
+    return order
+
+
+def _hash(site, path, mapping):
+    rewrite = {".css": rewrite_css,
+               ".webmanifest": rewrite_manifest}.get(path.suffix)
+    if rewrite:
+        text = path.read_text()
+        new = rewrite(site, text, path, mapping)
+        if new != text:
+            path.write_text(new)
+    data = path.read_bytes()
+    if is_fingerprinted(path, data):
+        return
+    name = HASHED.sub(r"\2", path.name)     # drop a stale hash
+    digest = sha256(data)[:HASH_LEN]
+    dest = path.with_name(f"{name[:-len(path.suffix)]}.{digest}{path.suffix}")
+    path.replace(dest)
+    mapping[path] = dest
+
+
+def run(site):
+    exclude = set(site.settings("fingerprint").get("exclude", []))
+    manifest_path = site.public / MANIFEST
+    manifest = (json.loads(manifest_path.read_text())
+                if manifest_path.is_file() else {})
+    assets = [p for p in sorted(site.public.rglob("*"))
+              if p.is_file() and p.suffix.lower() in ASSETS
+              and site.url_for(p) not in exclude | FIXED]
+    mapping = {}
+    # CSS and manifests can point at everything else, so they are
+    # hashed after the files they reference have their final names.
+    sheets = [p for p in assets if p.suffix == ".css"]
+    manifests = [p for p in assets if p.suffix == ".webmanifest"]
+    for path in [p for p in assets if p not in sheets + manifests]:
+        _hash(site, path, mapping)
+    for path in _css_order(site, sheets) + manifests:
+        _hash(site, path, mapping)
+    for page in site.pages():
+        rewrite_html(site, page, mapping)
+
+    manifest.update({site.url_for(k): site.url_for(v)
+                     for k, v in mapping.items()})
+    manifest = dict(sorted(manifest.items()))
+    manifest_path.write_text(json.dumps(manifest, indent=2) + "\n")
+
+    last_path = site.cache / MANIFEST
+    last = json.loads(last_path.read_text()) if last_path.is_file() else {}
+    changed = sorted(k for k, v in manifest.items() if last.get(k) != v)
+    site.cache.mkdir(parents=True, exist_ok=True)
+    last_path.write_text(json.dumps(manifest, indent=2) + "\n")
+    log("fingerprint", f"{len(mapping)} assets hashed, "
+                       f"{len(changed)} changed since the last build")
+    for url in changed:
+        log("fingerprint", f"  {url} -> {manifest[url]}")
@@ -0,0 +1,116 @@
+"""AVIF and WebP copies of the images under static/.
+
+Every JPEG/PNG that Hugo copied from static/ (and any responsive
+variants of it) gets ``.avif`` and ``.webp`` siblings (``run``), and
+``picture`` wraps the ``<img>`` tags that load them in ``<picture>`` so
+browsers without either format still get the original.
+"""
+
+import json
+import re
+
+from .cache import ContentCache
+from .images import RASTER, _pil, variants_of
+from .markup import find_tags, render_tag, splice
+from .site import BuildError, log
+
+FORMATS = {
+    ".avif": ("AVIF", "image/avif", {"quality": 60}),
+    ".webp": ("WEBP", "image/webp", {"quality": 80, "method": 6}),
+}
+PICTURE = re.compile(r"<picture\b.*?</picture>", re.S | re.I)
+
+
+def encode(site, cache, src):
+    """Write modern-format siblings of ``src``; return {suffix: path}."""
+    Image = _pil()
+    data = src.read_bytes()
+    out = {}
+    for suffix, (fmt, _, opts) in FORMATS.items():
+        dest = src.with_suffix(suffix)
+        key = cache.key(data, fmt=fmt, **opts)
+        if not cache.fetch(key, suffix, dest):
+            with Image.open(src) as im:
+                try:
+                    im.save(dest, fmt, **opts)
+                except (KeyError, OSError) as e:
+                    raise BuildError(f"{fmt} encoding unavailable: {e}") from e
+            cache.store(key, suffix, dest)
+        if dest.stat().st_size < len(data):
+            out[suffix] = dest
+        else:
+            dest.unlink()
+    return out
+
+
+def _sources(site, group, img):
+    """``<source>`` tags for an image and its responsive variants."""
+    tags = []
+    for suffix, (_, mime, _) in FORMATS.items():
+        entries = []
+        for path, width in group:
+            alt = path.with_suffix(suffix)
+            if not alt.is_file():
+                break
+            entries.append(site.url_for(alt) + (f" {width}w" if width else ""))
+        else:
+            attrs = {"type": mime, "srcset": ", ".join(entries)}
+            if img.get("sizes"):
+                attrs["sizes"] = img.get("sizes")
+            tags.append(render_tag("source", attrs))
+    return "".join(tags)
+
+
+def wrap_pictures(site, page, groups):
+    text = page.read_text()
+    inside = [m.span() for m in PICTURE.finditer(text)]
+    edits = []
+    for tag in find_tags(text, "img"):
+        if any(a <= tag.start < b for a, b in inside):
+            continue
+        group = groups.get(site.resolve(tag.get("src", ""), page))
+        sources = group and _sources(site, group, tag)
+        if sources:
+            edits.append((tag.start, tag.end,
+                          f"<picture>{sources}{tag.text}</picture>"))
+    if edits:
+        page.write_text(splice(text, edits))
+    return len(edits)
+
+
+def groups(site):
+    """{public image: [(path, width), ...]} for every static raster."""
+    found = {}
+    for src in sorted(site.static.rglob("*")):
+        if src.suffix.lower() not in RASTER:
+            continue
+        public = site.public / src.relative_to(site.static)
+        if public.is_file():
+            found[public] = variants_of(site, public)
+    return found
+
+
+def run(site):
+    cache = ContentCache(site, "formats")
+    report = {}
+    for group in groups(site).values():
+        for path, _ in group:
+            made = encode(site, cache, path)
+            report[site.url_for(path)] = {
+                "original": path.stat().st_size,
+                **{s.lstrip("."): p.stat().st_size for s, p in made.items()},
+            }
+
+    site.cache.mkdir(parents=True, exist_ok=True)
+    (site.cache / "formats-report.json").write_text(
+        json.dumps(report, indent=2))
+    for url, sizes in report.items():
+        best = min(sizes.values())
+        log("formats", f"{url}: {sizes['original']} -> {best} bytes "
+                       f"(saved {sizes['original'] - best})")
+
+
+def picture(site):
+    found = groups(site)
+    wrapped = sum(wrap_pictures(site, p, found) for p in site.pages())
+    log("picture", f"wrapped {wrapped} <img> tag(s) in <picture>")
@@ -0,0 +1,175 @@
+"""Inline SVG for the icons on the author links.
+
+Each ``[params.author] links`` entry is drawn with an icon. An icon-font
+``<i>`` or a remote ``<img>`` is replaced by inline SVG from
+``assets/icons/<name>.svg`` in the site or the theme, so there is no icon
+font and no icon CDN. Icons drawn more than once on a page become a
+``<use>`` of a ``<symbol>`` in a sprite inlined once per page, so their
+path data isn't repeated; an icon drawn once stays (or becomes) plain
+inline SVG, which is smaller than a symbol and a ``<use>``.
+"""
+
+import re
+from collections import Counter
+
+from .markup import find_tags, render_tag, splice
+from .site import BuildError, log
+
+SPRITE_ID = "sitebuild-icons"
+SPRITE = re.compile(rf'id="?{SPRITE_ID}\b')
+SVG = re.compile(r"<svg\b.*?</svg>", re.S | re.I)
+ICON_FONT = re.compile(r"<i\b[^>]*>\s*</i>", re.I)
+IMG = re.compile(r"<img\b[^>]*>", re.I)
+# Icon font stylesheets and kits on other hosts, dropped once nothing
+# uses them.
+ICON_CDNS = re.compile(r"^(?:https?:)?//\S*?(?:fontawesome|font-awesome|"
+                       r"ionicons|feather|bootstrap-icons)", re.I)
+FONT_CLASS = re.compile(r"^(fa[bslrd]?|fa-.*|bi|bi-.*|icon-.*)$")
+
+
+def author_links(site):
+    """``{url: name}`` from ``[params.author] links``."""
+    out = {}
+    for entry in site.params.get("author", {}).get("links", []):
+        for name, url in entry.items():
+            out[url] = name
+    return out
+
+
+def parse_svg(markup):
+    """``(attrs, inner)`` of one ``<svg>`` element."""
+    tag = find_tags(markup, "svg")[0]
+    inner = markup[tag.end:markup.rfind("</svg>")]
+    return dict(tag.attrs), inner
+
+
+def symbol(name, markup, prefix="icon"):
+    attrs, inner = parse_svg(markup)
+    sym = {"id": f"{prefix}-{name}"}
+    if "viewbox" in attrs:
+        sym["viewBox"] = attrs["viewbox"]
+    return render_tag("symbol", sym) + inner + "</symbol>"
+
+
+def vendored(site, name, folder="icons"):
+    for base in (site.root, site.root / "themes" / site.config["theme"]):
+        path = base / "assets" / folder / f"{name}.svg"
+        if path.is_file():
+            return path.read_text()
+    return None
+
+
+def use(name, attrs):
+    # Keeping viewBox keeps the icon's aspect ratio when CSS only sets
+    # one dimension; html.parser lowercased its name.
+    attrs = {("viewBox" if k == "viewbox" else k): v for k, v in attrs.items()
+             if k not in {"xmlns", "version"}}
+    attrs.setdefault("aria-hidden", "true")
+    return render_tag("svg", attrs) + render_tag(
+        "use", {"href": f"#icon-{name}"}) + "</use></svg>"
+
+
+def font_icon_attrs(tag_text):
+    tag = find_tags(tag_text, "i")[0]
+    classes = [c for c in (tag.get("class") or "").split()
+               if not FONT_CLASS.match(c)]
+    attrs = {"class": " ".join(classes + ["icon"]), "width": "1em",
+             "height": "1em", "fill": "currentColor"}
+    return attrs
+
+
+def add_symbols(text, symbols):
+    """Put ``symbols`` in the page's sprite, creating it after ``<body>``."""
+    m = SPRITE.search(text)
+    if m:
+        end = text.find("</svg>", m.end())
+        return splice(text, [(end, end, "".join(symbols))])
+    body = find_tags(text, "body")[0]
+    sprite = (render_tag("svg", {"id": SPRITE_ID,
+                                 "xmlns": "http://www.w3.org/2000/svg",
+                                 "width": "0", "height": "0",
+                                 "style": "position:absolute"})
+              + "".join(symbols) + "</svg>")
+    return splice(text, [(body.end, body.end, sprite)])
+
+
+def inline(markup, attrs):
+    """The ``<svg>`` in ``markup`` with ``attrs`` on it, to inline as is."""
+    svg, inner = parse_svg(markup)
+    svg = {("viewBox" if k == "viewbox" else k): v for k, v in svg.items()
+           if k not in {"version", "width", "height", "class"}}
+    svg.setdefault("aria-hidden", "true")
+    return render_tag("svg", {**svg, **attrs}) + inner + "</svg>"
+
+
+def rewrite_page(site, page, links, symbols):
+    text = page.read_text()
+    if SPRITE.search(text):
+        return 0
+    hits = []
+    for tag in find_tags(text, "a"):
+        name = links.get(tag.get("href"))
+        if name is None:
+            continue
+        close = text.find("</a>", tag.end)
+        body = text[tag.end:close if close >= 0 else len(text)]
+        found = [(m, "svg") for m in [SVG.search(body)] if m]
+        found += [(m, "font") for m in [ICON_FONT.search(body)] if m]
+        found += [(m, "img") for m in [IMG.search(body)] if m]
+        if found:
+            m, kind = min(found, key=lambda h: h[0].start())
+            hits.append((name, kind, tag.end + m.start(), m.group(0)))
+
+    # A symbol and a <use> cost more than the inline SVG they replace, so
+    # only icons drawn more than once on the page go in the sprite.
+    counts = Counter(name for name, _, _, _ in hits)
+    edits, used = [], []
+    for name, kind, start, markup in hits:
+        shared = counts[name] > 1
+        if kind == "svg":
+            if not shared:
+                continue
+            symbols.setdefault(name, symbol(name, markup))
+            replacement = use(name, parse_svg(markup)[0])
+        else:
+            source = vendored(site, name)
+            if source is None:
+                raise BuildError(f"no SVG for the {name!r} link icon; add "
+                                 f"assets/icons/{name}.svg")
+            attrs = (font_icon_attrs(markup) if kind == "font" else
+                     {"class": "icon", "width": "1em", "height": "1em",
+                      "fill": "currentColor"})
+            if shared:
+                symbols.setdefault(name, symbol(name, source))
+                replacement = use(name, attrs)
+            else:
+                replacement = inline(source, attrs)
+        edits.append((start, start + len(markup), replacement))
+        if shared:
+            used.append(name)
+    if not edits or not find_tags(text, "body"):
+        return 0
+    text = splice(text, edits)
+    if used:
+        text = add_symbols(text, [symbols[n] for n in dict.fromkeys(used)])
+
+    if not re.search(r'class="?[^">]*\bfa[bsrl]?\b', text):
+        drop = [(t.start, t.end, "") for t in find_tags(text, "link",
+                                                        "script")
+                if ICON_CDNS.search(t.get("href") or t.get("src") or "")]
+        if drop:
+            text = splice(text, drop)
+            text = re.sub(r"<script></script>", "", text)
+    page.write_text(text)
+    return len(edits)
+
+
+def run(site):
+    links = author_links(site)
+    if not links:
+        return
+    symbols = {}
+    total = sum(rewrite_page(site, p, links, symbols) for p in site.pages())
+    size = sum(len(s.encode()) for s in symbols.values())
+    log("icons", f"{total} link icon(s) rewritten, {len(symbols)} shared "
+                 f"symbol(s), {size} bytes: {', '.join(sorted(symbols))}")
@@ -0,0 +1,133 @@
+"""Width-bucketed variants of the author portrait.
+
+Reads ``[params.author] image`` and writes ``<name>-<width>w.<ext>``
+siblings into public/ (``run``); ``rewrite`` then points every
+``<img>`` that loads the original at them through ``srcset``/``sizes``.
+"""
+
+import json
+
+from .markup import find_tags, render_tag, splice
+from .site import BuildError, log
+
+RASTER = {".jpg", ".jpeg", ".png"}
+DEFAULT_WIDTHS = [96, 192, 384]
+DEFAULT_SIZES = "144px"
+
+
+def _pil():
+    try:
+        from PIL import Image
+    except ImportError:
+        raise BuildError("Pillow is required for image stages "
+                         "(pip install -r requirements.txt)") from None
+    return Image
+
+
+def author_image(site):
+    """public/ path of the configured author image."""
+    name = site.params.get("author", {}).get("image")
+    if not name:
+        raise BuildError("[params.author] image is not set")
+    path = site.public / name.lstrip("/")
+    if not path.is_file():
+        raise BuildError(f"author image {name} missing from {site.public}")
+    return path
+
+
+def save_image(im, path, fmt, **extra):
+    """Encode ``im`` with the settings we use for every raster output."""
+    if fmt == "JPEG":
+        extra.setdefault("quality", 82)
+        extra.setdefault("optimize", True)
+        extra.setdefault("progressive", True)
+        im = im.convert("RGB")
+    elif fmt == "PNG":
+        extra.setdefault("optimize", True)
+    im.save(path, fmt, **extra)
+
+
+def make_variants(site, source, widths):
+    Image = _pil()
+    with Image.open(source) as im:
+        fmt = im.format
+        width, height = im.size
+        buckets = sorted({w for w in widths if w < width})
+        variants = []
+        for w in buckets:
+            h = round(height * w / width)
+            out = source.with_name(f"{source.stem}-{w}w{source.suffix}")
+            save_image(im.resize((w, h), Image.LANCZOS), out, fmt)
+            variants.append({"url": site.url_for(out), "width": w,
+                             "height": h, "bytes": out.stat().st_size})
+    variants.append({"url": site.url_for(source), "width": width,
+                     "height": height, "bytes": source.stat().st_size})
+    return variants
+
+
+def responsive(site):
+    """The srcset descriptions written by :func:`run`, keyed by URL."""
+    path = site.cache / "responsive.json"
+    return json.loads(path.read_text()) if path.is_file() else {}
+
+
+def variants_of(site, image):
+    """``[(path, width)]`` for ``image`` and its responsive variants.
+
+    Width is None when the image has no variants.
+    """
+    desc = responsive(site).get(site.url_for(image))
+    if not desc:
+        return [(image, None)]
+    return [(site.public / v["url"].lstrip("/"), v["width"])
+            for v in desc["variants"]]
+
+
+def srcset(variants):
+    return ", ".join(f"{v['url']} {v['width']}w" for v in variants)
+
+
+def rewrite_img(site, page, source, attrs_for):
+    """Replace every ``<img>`` in ``page`` that loads ``source``."""
+    text = page.read_text()
+    edits = []
+    for tag in find_tags(text, "img"):
+        if site.resolve(tag.get("src", ""), page) == source:
+            attrs = attrs_for(dict(tag.attrs))
+            edits.append((tag.start, tag.end, render_tag("img", attrs)))
+    if edits:
+        page.write_text(splice(text, edits))
+    return len(edits)
+
+
+def run(site):
+    cfg = site.settings("images")
+    source = author_image(site)
+    variants = make_variants(site, source, cfg.get("widths", DEFAULT_WIDTHS))
+    desc = {"srcset": srcset(variants),
+            "sizes": cfg.get("sizes", DEFAULT_SIZES),
+            "variants": variants}
+    site.cache.mkdir(parents=True, exist_ok=True)
+    (site.cache / "responsive.json").write_text(
+        json.dumps({site.url_for(source): desc}, indent=2))
+    for v in variants:
+        log("images", f"{v['url']}: {v['width']}x{v['height']}, "
+                      f"{v['bytes']} bytes")
+
+
+def rewrite(site):
+    """Add the ``srcset``/``sizes`` recorded by ``run`` to the pages."""
+    source = author_image(site)
+    desc = responsive(site).get(site.url_for(source))
+    if not desc:
+        raise BuildError("no responsive variants recorded; "
+                         "run the images stage first")
+
+    def attrs_for(attrs):
+        attrs["srcset"] = desc["srcset"]
+        attrs["sizes"] = desc["sizes"]
+        return attrs
+
+    rewritten = sum(rewrite_img(site, p, source, attrs_for)
+                    for p in site.pages())
+    log("srcset", f"srcset added to {rewritten} <img> tag(s)")
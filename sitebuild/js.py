@@ -0,0 +1,296 @@
+"""A small JavaScript scanner: tokens and top-level function declarations.
+
+Like ``css``, this is not a parser. It knows enough of the lexical
+grammar (strings, template literals, comments, regular expression
+literals) to find the brackets and identifiers that matter, so the
+bundler can drop top-level functions nothing calls. Anything it can't
+make sense of raises ``ValueError`` and the caller leaves the code alone.
+"""
+
+import re
+
+IDENT = re.compile(r"[A-Za-z_$][\w$]*")
+# After these, a ``/`` starts a regular expression rather than a division.
+REGEX_AFTER = set("(,=:[!&|?{};+-*%<>~^") | {
+    "return", "typeof", "instanceof", "in", "of", "new", "delete", "void",
+    "throw", "case", "do", "else", "yield", "await"}
+NUMBER = re.compile(r"\.?\d[\w.]*")
+CLOSE = {")": "(", "]": "[", "}": "{"}
+# Code that can reach a function without naming it.
+DYNAMIC = re.compile(r"\beval\s*\(|\bnew\s+Function\b|\bFunction\s*\(|"
+                     r"\b(?:window|self|globalThis|this|top|parent)\s*\[")
+
+
+def _string(text, i):
+    quote, i = text[i], i + 1
+    while i < len(text) and text[i] != quote:
+        if text[i] == "\n":
+            raise ValueError("unterminated string")
+        i += 2 if text[i] == "\\" else 1
+    if i >= len(text):
+        raise ValueError("unterminated string")
+    return i + 1
+
+
+def _regex(text, i):
+    i, in_class = i + 1, False
+    while i < len(text):
+        ch = text[i]
+        if ch == "\\":
+            i += 2
+            continue
+        if ch == "\n":
+            break
+        if ch == "[":
+            in_class = True
+        elif ch == "]":
+            in_class = False
+        elif ch == "/" and not in_class:
+            m = IDENT.match(text, i + 1)
+            return m.end() if m else i + 1
+        i += 1
+    raise ValueError("unterminated regular expression")
+
+
+def tokens(text):
+    """``(token, start, end)`` for identifiers, numbers and punctuation,
+    with strings, templates, comments and regexes skipped over. Brackets
+    are checked to balance."""
+    out, stack, i, prev = [], [], 0, None
+    in_template = False
+    while i < len(text):
+        if in_template:
+            if text[i] == "\\":
+                i += 2
+            elif text[i] == "`":
+                in_template, i = False, i + 1
+                prev = "`"
+            elif text.startswith("${", i):
+                stack.append("${")
+                in_template, i = False, i + 2
+                prev = "{"
+            else:
+                i += 1
+            continue
+        ch = text[i]
+        if ch.isspace():
+            i += 1
+        elif text.startswith("//", i):
+            end = text.find("\n", i)
+            i = len(text) if end < 0 else end
+        elif text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            if end < 0:
+                raise ValueError("unterminated comment")
+            i = end + 2
+        elif ch in "\"'":
+            i = _string(text, i)
+            prev = "str"
+        elif ch == "`":
+            in_template, i = True, i + 1
+        elif ch == "/" and (prev is None or prev in REGEX_AFTER):
+            i = _regex(text, i)
+            prev = "re"
+        elif m := IDENT.match(text, i):
+            out.append((m.group(0), i, m.end()))
+            i, prev = m.end(), m.group(0)
+        elif m := NUMBER.match(text, i):
+            i, prev = m.end(), "num"
+        else:
+            if ch in "([{":
+                stack.append(ch)
+            elif ch in CLOSE:
+                if not stack:
+                    raise ValueError(f"unbalanced {ch!r} at {i}")
+                top = stack.pop()
+                if top == "${" and ch == "}":
+                    in_template = True
+                    i += 1
+                    continue
+                if top != CLOSE[ch]:
+                    raise ValueError(f"unbalanced {ch!r} at {i}")
+            out.append((ch, i, i + 1))
+            i, prev = i + 1, ch
+    if stack or in_template:
+        raise ValueError("unbalanced brackets")
+    return out
+
+
+def functions(text):
+    """``{name: (start, end)}`` of top-level ``function`` declarations."""
+    toks = tokens(text)
+    found, depth, k = {}, 0, 0
+    while k < len(toks):
+        tok, start, _ = toks[k]
+        if tok in "([{":
+            depth += 1
+        elif tok in ")]}":
+            depth -= 1
+        prev = toks[k - 1] if k else None
+        decl = tok == "function" and depth == 0 and (
+            prev is None or prev[0] in (";", "}", "async")
+            or (prev[0] == ")" and "\n" in text[prev[2]:start]))
+        if not decl:
+            k += 1
+            continue
+        if prev and prev[0] == "async":
+            start = prev[1]
+        j = k + 1 + (toks[k + 1][0] == "*")
+        if not IDENT.fullmatch(toks[j][0]):
+            k += 1
+            continue
+        name, level = toks[j][0], 0
+        # Skip the parameter list, then find the body's closing brace.
+        for j in range(j + 1, len(toks)):
+            t = toks[j][0]
+            if t in "([{":
+                level += 1
+            elif t in ")]}":
+                level -= 1
+                if level == 0 and t == "}":
+                    break
+        found[name] = (start, toks[j][2])
+        k = j + 1
+    return found
+
+
+def unused_functions(text, elsewhere=""):
+    """Top-level functions never named outside their own body, here or in
+    ``elsewhere`` (the pages that load the script); returns their spans.
+    Dropping one can leave others unused, so this repeats until stable."""
+    if DYNAMIC.search(text):
+        return {}
+    decls = functions(text)
+    dropped = {}
+    while True:
+        new = {}
+        for name, (a, b) in decls.items():
+            if name in dropped:
+                continue
+            word = re.compile(rf"(?<![\w$]){re.escape(name)}(?![\w$])")
+            live = [m.start() for m in word.finditer(text)
+                    if not a <= m.start() < b
+                    and not any(x <= m.start() < y
+                                for x, y in dropped.values())]
+            if not live and not word.search(elsewhere):
+                new[name] = (a, b)
+        if not new:
+            return dropped
+        dropped.update(new)
+
+
+# Whitespace and comments, then one directive: a string literal standing
+# as a statement of its own.
+_GAP = re.compile(r"(?:\s+|//[^\n]*|/\*.*?\*/)*", re.S)
+_DIRECTIVE = re.compile(r"""(['"])((?:(?!\1)[^\\\n]|\\.)*)\1"""
+                        r"[ \t]*(?:;|\n|\Z|(?=//|/\*))")
+
+
+def is_strict(text):
+    """Whether the script's directive prologue has ``"use strict"``."""
+    i = 0
+    while True:
+        i = _GAP.match(text, i).end()
+        m = _DIRECTIVE.match(text, i)
+        if not m:
+            return False
+        if m.group(2) == "use strict":
+            return True
+        i = m.end()
+
+
+# Sloppy-mode syntax that is an error in a module: octal literals,
+# ``with`` and ``arguments.callee``.
+SLOPPY = re.compile(r"(?<![\w$.])0\d|\bwith\s*\(|\.callee\b")
+LEXICAL = {"let", "const", "class"}
+DECLARE = LEXICAL | {"var", "function"}
+COMPOUND = set("+-*/%&|^")
+# After these, ``function`` starts a declaration rather than an expression.
+STATEMENT = {None, ";", "{", "}", ")", "else", "do", "async"}
+
+
+def _pairs(toks):
+    """{index: index of the matching bracket} for every bracket."""
+    stack, pairs = [], {}
+    for k, tok in enumerate(toks):
+        if tok in ("(", "[", "{"):
+            stack.append(k)
+        elif tok in CLOSE:
+            j = stack.pop()
+            pairs[j], pairs[k] = k, j
+    return pairs
+
+
+def _params(toks, a, b):
+    """Identifiers in ``toks[a:b]``, a parameter list."""
+    return {t for t in toks[a:b] if IDENT.fullmatch(t)}
+
+
+def _function_body(toks, pairs, k):
+    """Whether the ``{`` at ``toks[k]`` opens a function body."""
+    if k > 1 and toks[k - 2:k] == ["=", ">"]:
+        return True
+    if not k or toks[k - 1] != ")":
+        return False
+    head = toks[max(pairs[k - 1] - 3, 0):pairs[k - 1]]
+    if head[-1:] == ["function"] or head[-2:] == ["function", "*"]:
+        return True
+    return len(head) > 1 and bool(IDENT.fullmatch(head[-1])) and \
+        head[-2] in ("function", "*")
+
+
+def module_safe(text):
+    """Whether ``text`` does the same as an inline ``type=module`` script,
+    apart from running after the document is parsed.
+
+    A module is strict and has its own scope, so this rejects global
+    declarations (other scripts may use them): top-level ``let``,
+    ``const`` and ``class``, and ``var`` or function declarations
+    outside a function body, at any block depth. It also rejects
+    ``this`` and assignments to names the script doesn't declare
+    (implicit globals). It errs on the side of False.
+    """
+    if DYNAMIC.search(text) or SLOPPY.search(text):
+        return False
+    try:
+        toks = [t[0] for t in tokens(text)]
+    except ValueError:
+        return False
+    pairs = _pairs(toks)
+    declared, depth, bodies = set(), 0, []
+    for k, tok in enumerate(toks):
+        prev = toks[k - 1] if k else None
+        nxt = toks[k + 1:k + 3] + [None, None]
+        if tok in ("(", "[", "{"):
+            depth += 1
+            bodies.append(tok == "{" and _function_body(toks, pairs, k))
+        elif tok in CLOSE:
+            depth -= 1
+            bodies.pop()
+        elif tok == "this" or tok in LEXICAL and depth == 0:
+            return False
+        elif tok == "var" and not any(bodies):
+            return False
+        elif tok == "function":
+            if prev in STATEMENT and not any(bodies):
+                return False
+            j = k + 1 + (nxt[0] == "*")
+            j += j < len(toks) and bool(IDENT.fullmatch(toks[j]))
+            if j < len(toks) and toks[j] == "(":
+                declared |= _params(toks, j, pairs[j])
+        elif tok == "=" and nxt[0] == ">":
+            if prev == ")":
+                declared |= _params(toks, pairs[k - 1], k)
+            elif prev and IDENT.fullmatch(prev):
+                declared.add(prev)
+        elif IDENT.fullmatch(tok):
+            if prev in DECLARE or k > 1 and toks[k - 2:k] == ["catch", "("]:
+                declared.add(tok)
+                continue
+            assigned = (nxt[0] == "=" and nxt[1] not in ("=", ">")) or (
+                nxt[0] in COMPOUND and nxt[1] == "=") or (
+                nxt[0] in ("+", "-") and nxt[1] == nxt[0]) or (
+                prev in ("+", "-") and k > 1 and toks[k - 2] == prev)
+            if assigned and prev != "." and tok not in declared:
+                return False
+    return True
@@ -0,0 +1,95 @@
+"""Loading and decoding hints for every ``<img>``.
+
+The LCP image (the author portrait, or else the first image on the
+page) is fetched eagerly at high priority. Every other image is
+``loading=lazy decoding=async`` and, unless it already has one, gets a
+tiny blurred placeholder inlined as its background so the space isn't
+empty while it loads.
+"""
+
+import base64
+import io
+
+from .cache import ContentCache
+from .images import _pil, author_image
+from .markup import find_tags, render_tag, splice
+from .site import BuildError, log
+
+PLACEHOLDER_WIDTH = 16
+
+
+def placeholder(cache, path):
+    """``data:`` URI of a blurred thumbnail, or None for transparent
+    images (a placeholder would show through them)."""
+    data = path.read_bytes()
+    key = cache.key(data, width=PLACEHOLDER_WIDTH)
+    cached = cache.dir / (key + ".txt")
+    if cached.is_file():
+        return cached.read_text() or None
+    Image = _pil()
+    from PIL import ImageFilter
+    with Image.open(io.BytesIO(data)) as im:
+        if im.mode in ("RGBA", "LA") or "transparency" in im.info:
+            uri = ""
+        else:
+            im = im.convert("RGB")
+            im.thumbnail((PLACEHOLDER_WIDTH, PLACEHOLDER_WIDTH))
+            im = im.filter(ImageFilter.GaussianBlur(1))
+            buf = io.BytesIO()
+            im.save(buf, "WEBP", quality=30)
+            uri = ("data:image/webp;base64,"
+                   + base64.b64encode(buf.getvalue()).decode())
+    cache.dir.mkdir(parents=True, exist_ok=True)
+    cached.write_text(uri)
+    return uri or None
+
+
+def has_placeholder(attrs):
+    style = attrs.get("style") or ""
+    return "background" in style or any(
+        k in attrs for k in ("data-lqip", "data-placeholder", "placeholder"))
+
+
+def rewrite(site, page, portrait, cache):
+    text = page.read_text()
+    imgs = find_tags(text, "img")
+    if not imgs:
+        return 0, 0
+    resolved = [site.resolve(t.get("src") or "", page) for t in imgs]
+    lcp = next((i for i, p in enumerate(resolved) if p == portrait), 0)
+    edits, lazy = [], 0
+    for i, (tag, path) in enumerate(zip(imgs, resolved)):
+        attrs = dict(tag.attrs)
+        if i == lcp:
+            attrs.pop("loading", None)
+            attrs["fetchpriority"] = "high"
+        else:
+            if attrs.get("loading") != "eager":
+                attrs["loading"] = "lazy"
+                lazy += 1
+            attrs["decoding"] = "async"
+            if path is not None and path.suffix.lower() != ".svg" \
+                    and not has_placeholder(attrs):
+                uri = placeholder(cache, path)
+                if uri:
+                    style = (attrs.get("style") or "").rstrip(";")
+                    attrs["style"] = ((style + ";") if style else "") + (
+                        f"background:url({uri}) center/cover no-repeat")
+        edits.append((tag.start, tag.end, render_tag("img", attrs)))
+    page.write_text(splice(text, edits))
+    return len(imgs), lazy
+
+
+def run(site):
+    try:
+        portrait = author_image(site)
+    except BuildError:
+        portrait = None
+    cache = ContentCache(site, "placeholders")
+    total = lazy = 0
+    for page in site.pages():
+        imgs, deferred = rewrite(site, page, portrait, cache)
+        total += imgs
+        lazy += deferred
+    log("lazy", f"{total} <img> tag(s), {lazy} lazy, "
+                f"{total - lazy} eager")
@@ -0,0 +1,165 @@
+"""Throttled page-load benchmark: ``python -m sitebuild.loadbench``.
+
+Serves public/ with the preview server and loads every page in headless
+Chromium under each network profile, first-visit style (empty cache, no
+service worker). Records TTFB, FCP, LCP, bytes transferred and request
+count, takes the median over ``-n`` runs and compares with a baseline::
+
+    python -m sitebuild.loadbench --update-baseline     # record
+    python -m sitebuild.loadbench                       # compare
+
+Needs Playwright with Chromium, like ``sitebuild.offline``.
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import threading
+from pathlib import Path
+
+from .budgets import page_url
+from .serve import make_server
+from .site import BuildError, load_site
+
+# WebPageTest's connection presets: kbit/s and round-trip ms.
+PROFILES = {
+    "3g": {"down": 1600, "up": 768, "rtt": 300},
+    "4g": {"down": 9000, "up": 9000, "rtt": 170},
+    "cable": {"down": 5000, "up": 1000, "rtt": 28},
+}
+METRICS = ("ttfb", "fcp", "lcp", "bytes", "requests")
+# Timing changes smaller than this are noise, whatever the percentage.
+MIN_DELTA_MS = 50
+BASELINE = "perf/baseline.json"
+
+COLLECT = """() => new Promise((resolve) => {
+  let lcp = 0;
+  new PerformanceObserver((list) => {
+    for (const e of list.getEntries()) lcp = e.renderTime || e.loadTime;
+  }).observe({type: "largest-contentful-paint", buffered: true});
+  setTimeout(() => {
+    const nav = performance.getEntriesByType("navigation")[0];
+    const res = performance.getEntriesByType("resource");
+    const fcp = performance.getEntriesByName("first-contentful-paint")[0];
+    resolve({
+      ttfb: nav.responseStart,
+      fcp: fcp ? fcp.startTime : null,
+      lcp: lcp || null,
+      bytes: nav.transferSize + res.reduce((n, r) => n + r.transferSize, 0),
+      requests: 1 + res.length,
+    });
+  }, 500);
+})"""
+
+
+def measure(browser, url, profile):
+    context = browser.new_context(service_workers="block")
+    page = context.new_page()
+    cdp = context.new_cdp_session(page)
+    cdp.send("Network.enable")
+    cdp.send("Network.setCacheDisabled", {"cacheDisabled": True})
+    cdp.send("Network.emulateNetworkConditions", {
+        "offline": False,
+        "latency": profile["rtt"],
+        "downloadThroughput": profile["down"] * 1000 / 8,
+        "uploadThroughput": profile["up"] * 1000 / 8,
+    })
+    page.goto(url, wait_until="load")
+    result = page.evaluate(COLLECT)
+    context.close()
+    return result
+
+
+def run_bench(site, runs, profiles):
+    try:
+        from playwright.sync_api import sync_playwright
+    except ImportError:
+        raise BuildError("playwright is not installed") from None
+    server = make_server(site.public, quiet=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    results = {}
+    try:
+        with sync_playwright() as pw:
+            browser = pw.chromium.launch()
+            for page in site.pages():
+                url = page_url(site, page)
+                for name in profiles:
+                    samples = [measure(browser, base + url, PROFILES[name])
+                               for _ in range(runs)]
+                    results.setdefault(url, {})[name] = {
+                        m: _median([s[m] for s in samples]) for m in METRICS}
+            browser.close()
+    finally:
+        server.shutdown()
+    return results
+
+
+def _median(values):
+    values = [v for v in values if v is not None]
+    return round(statistics.median(values), 1) if values else None
+
+
+def compare(results, baseline, tolerance):
+    """Print a table of changes; return the regressions."""
+    worse = []
+    for url, profiles in results.items():
+        for name, metrics in profiles.items():
+            old = baseline.get(url, {}).get(name, {})
+            for m, value in metrics.items():
+                before = old.get(m)
+                if value is None or not before:
+                    continue
+                change = (value - before) / before
+                floor = 0 if m in ("bytes", "requests") else MIN_DELTA_MS
+                bad = change > tolerance and value - before > floor
+                print(f"{url:20} {name:6} {m:9} {before:>10} -> "
+                      f"{value:>10} ({change:+.1%})"
+                      f"{'  REGRESSION' if bad else ''}")
+                if bad:
+                    worse.append(f"{url} {name} {m}")
+    return worse
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="sitebuild.loadbench",
+                                     description=__doc__.split("\n")[0])
+    parser.add_argument("--public", help="build output (default: public/)")
+    parser.add_argument("-n", type=int, default=3, help="runs per page")
+    parser.add_argument("--profile", action="append",
+                        choices=sorted(PROFILES),
+                        help="network profile(s) (default: all)")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    parser.add_argument("-o", "--output", help="write results here")
+    args = parser.parse_args(argv)
+    try:
+        site = load_site(public=args.public)
+        results = run_bench(site, args.n, args.profile or list(PROFILES))
+        text = json.dumps(results, indent=2) + "\n"
+        if args.output:
+            Path(args.output).write_text(text)
+        baseline = site.root / args.baseline
+        if args.update_baseline:
+            baseline.parent.mkdir(parents=True, exist_ok=True)
+            baseline.write_text(text)
+            print(f"baseline written to {baseline}", file=sys.stderr)
+        elif baseline.is_file():
+            worse = compare(results, json.loads(baseline.read_text()),
+                            args.tolerance)
+            if worse:
+                raise BuildError("regressed: " + ", ".join(worse))
+        else:
+            print(text)
+            print(f"no baseline at {baseline}; record one with "
+                  f"--update-baseline", file=sys.stderr)
+    except BuildError as e:
+        print(f"sitebuild.loadbench: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""Lossless re-encoding of the JPEG and PNG files Hugo copied to public/.
+
+Runs before the resize and format stages so they start from the
+smallest source. JPEGs go through ``jpegtran -optimize -progressive``
+(optimised Huffman tables, progressive scans, same DCT coefficients);
+PNGs are re-saved by Pillow with ``optimize``. Both drop metadata that
+doesn't affect rendering (EXIF, comments, text chunks) but keep ICC
+profiles and transparency. A result is only kept if it is smaller and
+decodes to exactly the same pixels.
+"""
+
+import io
+import json
+import shutil
+import subprocess
+
+from .cache import ContentCache
+from .images import RASTER, _pil
+from .site import log
+
+EXIF_ORIENTATION = 0x0112
+# PNG chunks Pillow reads but won't write back; they change rendering.
+PNG_RENDERING = ("gamma", "chromaticity")
+
+
+def jpeg(data, jpegtran):
+    """jpegtran's output for ``data``, or None if it can't be done safely."""
+    Image = _pil()
+    with Image.open(io.BytesIO(data)) as im:
+        # Orientation only lives in EXIF; dropping it would rotate the image.
+        if im.getexif().get(EXIF_ORIENTATION, 1) != 1:
+            return None
+    proc = subprocess.run([jpegtran, "-copy", "icc", "-optimize",
+                           "-progressive"], input=data, capture_output=True)
+    return proc.stdout if proc.returncode == 0 else None
+
+
+def png(data):
+    Image = _pil()
+    with Image.open(io.BytesIO(data)) as im:
+        if getattr(im, "n_frames", 1) > 1 or any(k in im.info
+                                                  for k in PNG_RENDERING):
+            return None
+        keep = {k: im.info[k] for k in ("icc_profile", "transparency")
+                if k in im.info}
+        buf = io.BytesIO()
+        im.save(buf, "PNG", optimize=True, **keep)
+    return buf.getvalue()
+
+
+def same_pixels(a, b):
+    Image = _pil()
+    with Image.open(io.BytesIO(a)) as x, Image.open(io.BytesIO(b)) as y:
+        return (x.size == y.size and x.info.get("icc_profile")
+                == y.info.get("icc_profile")
+                and x.convert("RGBA").tobytes() == y.convert("RGBA").tobytes())
+
+
+def reencode(data, suffix, jpegtran):
+    """The smaller, pixel-identical encoding of ``data``, or ``data``."""
+    if suffix == ".png":
+        new = png(data)
+    else:
+        new = jpeg(data, jpegtran) if jpegtran else None
+    if new and len(new) < len(data) and same_pixels(data, new):
+        return new
+    return data
+
+
+def run(site):
+    cache = ContentCache(site, "lossless")
+    jpegtran = shutil.which("jpegtran")
+    report = {}
+    for path in sorted(site.public.rglob("*")):
+        suffix = path.suffix.lower()
+        if suffix not in RASTER or not path.is_file():
+            continue
+        data = path.read_bytes()
+        key = cache.key(data, jpegtran=bool(jpegtran))
+        if not cache.fetch(key, suffix, path):
+            new = reencode(data, suffix, jpegtran)
+            if new is not data:
+                path.write_bytes(new)
+            cache.store(key, suffix, path)
+        report[site.url_for(path)] = {"before": len(data),
+                                      "after": path.stat().st_size}
+
+    site.cache.mkdir(parents=True, exist_ok=True)
+    (site.cache / "lossless.json").write_text(json.dumps(report, indent=2))
+    for url, sizes in report.items():
+        log("lossless", f"{url}: {sizes['before']} -> {sizes['after']} "
+                        f"bytes (saved {sizes['before'] - sizes['after']})")
+    if not jpegtran and any(u.lower().endswith((".jpg", ".jpeg"))
+                            for u in report):
+        log("lossless", "jpegtran not found, JPEGs left as they are "
+                        "(install libjpeg-turbo)")
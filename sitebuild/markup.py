@@ -0,0 +1,160 @@
+"""Just enough HTML handling to find tags and rewrite them in place.
+
+Hugo's minifier drops optional quotes and closing tags, so we lean on
+``html.parser`` to find tags and then splice edited text back into the
+original string rather than re-serialising the whole document.
+"""
+
+from dataclasses import dataclass
+from html import escape
+from html.parser import HTMLParser
+
+
+@dataclass
+class Tag:
+    name: str
+    attrs: dict
+    start: int
+    end: int
+    text: str
+
+    def get(self, key, default=None):
+        return self.attrs.get(key, default)
+
+
+class _Scanner(HTMLParser):
+    def __init__(self, source, names):
+        super().__init__(convert_charrefs=True)
+        self.names = names
+        self.tags = []
+        self._lines = [0]
+        for i, ch in enumerate(source):
+            if ch == "\n":
+                self._lines.append(i + 1)
+
+    def _offset(self):
+        line, col = self.getpos()
+        return self._lines[line - 1] + col
+
+    def handle_starttag(self, tag, attrs):
+        if self.names is None or tag in self.names:
+            text = self.get_starttag_text()
+            start = self._offset()
+            self.tags.append(Tag(tag, {k: v for k, v in attrs},
+                                 start, start + len(text), text))
+
+    handle_startendtag = handle_starttag
+
+
+def find_tags(source, *names):
+    """Return every start tag in ``source`` (optionally only ``names``)."""
+    scanner = _Scanner(source, set(names) or None)
+    scanner.feed(source)
+    scanner.close()
+    return scanner.tags
+
+
+def render_tag(name, attrs, self_closing=False):
+    parts = [name]
+    for key, value in attrs.items():
+        if value is None:
+            parts.append(key)
+        else:
+            value = escape(str(value), quote=False).replace('"', "&quot;")
+            parts.append(f'{key}="{value}"')
+    return "<" + " ".join(parts) + ("/>" if self_closing else ">")
+
+
+def splice(source, edits):
+    """Apply ``(start, end, replacement)`` edits to ``source``."""
+    out, pos = [], 0
+    for start, end, text in sorted(edits, key=lambda e: e[0]):
+        out.append(source[pos:start])
+        out.append(text)
+        pos = end
+    out.append(source[pos:])
+    return "".join(out)
+
+
+def head_offset(source):
+    """Where new head tags go: after ``<meta charset>``, else after
+    ``<head>``; None if the page has neither."""
+    head = find_tags(source, "head", "meta")
+    anchor = next((t for t in head if t.name == "meta"
+                   and "charset" in t.attrs), None) or \
+        next((t for t in head if t.name == "head"), None)
+    return anchor and anchor.end
+
+
+VOID = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link",
+        "meta", "source", "track", "wbr"}
+# Start tags that close an open element of the listed kinds, which is
+# what makes ``<li>a<li>b`` (as Hugo's minifier writes it) parse right.
+IMPLIED_END = {
+    "li": {"li"}, "dt": {"dt", "dd"}, "dd": {"dt", "dd"},
+    "tr": {"tr", "td", "th"}, "td": {"td", "th"}, "th": {"td", "th"},
+    "option": {"option"}, "p": {"p"},
+}
+BLOCK = {"address", "article", "aside", "blockquote", "div", "dl",
+         "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6", "header",
+         "hr", "main", "nav", "ol", "p", "pre", "section", "table", "ul"}
+SCOPE = {"body", "html", "table", "td", "th", "button", "template"}
+
+
+class Element:
+    def __init__(self, name, attrs, parent=None):
+        self.name = name
+        self.attrs = attrs
+        self.parent = parent
+        self.children = []
+        self.classes = set((attrs.get("class") or "").split())
+
+    def iter(self):
+        yield self
+        for child in self.children:
+            yield from child.iter()
+
+    def __repr__(self):
+        return f"<{self.name} {self.attrs}>"
+
+
+class _TreeBuilder(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Element("#document", {})
+        self.stack = [self.root]
+
+    def handle_starttag(self, tag, attrs):
+        closes = IMPLIED_END.get(tag, set()) | ({"p"} if tag in BLOCK
+                                                else set())
+        for i in range(len(self.stack) - 1, 0, -1):
+            name = self.stack[i].name
+            if name in closes:
+                del self.stack[i:]
+                break
+            if name in BLOCK or name in SCOPE:
+                break
+        parent = self.stack[-1]
+        el = Element(tag, {k: v or "" for k, v in attrs}, parent)
+        parent.children.append(el)
+        if tag not in VOID:
+            self.stack.append(el)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID and self.stack[-1].name == tag:
+            self.stack.pop()
+
+    def handle_endtag(self, tag):
+        for i in range(len(self.stack) - 1, 0, -1):
+            if self.stack[i].name == tag:
+                del self.stack[i:]
+                return
+
+
+def parse_tree(source):
+    """A forgiving element tree, good enough for selector matching."""
+    builder = _TreeBuilder()
+    builder.feed(source)
+    builder.close()
+    return builder.root
@@ -0,0 +1,69 @@
+"""Headless offline check: ``python -m sitebuild.offline``.
+
+Serves public/ on localhost, loads the home page in Chromium, waits for
+the service worker to finish precaching, goes offline and reloads. The
+page must come back with the same title and a decoded author portrait.
+Needs Playwright (``pip install playwright && playwright install
+chromium``); it is not part of the normal build, and CI reports it
+without letting it block the deploy.
+"""
+
+import argparse
+import sys
+import threading
+
+from .serve import make_server
+from .site import BuildError, load_site
+
+
+def serve(public):
+    """Serve ``public`` on a free localhost port; return the server."""
+    server = make_server(public, quiet=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def check(url):
+    try:
+        from playwright.sync_api import sync_playwright
+    except ImportError:
+        raise BuildError("playwright is not installed") from None
+    with sync_playwright() as pw:
+        browser = pw.chromium.launch()
+        context = browser.new_context()
+        page = context.new_page()
+        page.goto(url)
+        title = page.title()
+        page.evaluate("navigator.serviceWorker.ready")
+        page.wait_for_function("navigator.serviceWorker.controller !== null")
+        context.set_offline(True)
+        page.reload()
+        if page.title() != title:
+            raise BuildError(f"offline reload showed {page.title()!r}, "
+                             f"expected {title!r}")
+        if not page.evaluate("[...document.images].every("
+                             "i => i.complete && i.naturalWidth > 0)"):
+            raise BuildError("images missing after offline reload")
+        browser.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="sitebuild.offline",
+                                     description=__doc__.split("\n")[0])
+    parser.add_argument("--public", help="build output (default: public/)")
+    args = parser.parse_args(argv)
+    site = load_site(public=args.public)
+    server = serve(site.public)
+    try:
+        check(f"http://127.0.0.1:{server.server_port}/")
+    except BuildError as e:
+        print(f"sitebuild.offline: {e}", file=sys.stderr)
+        return 1
+    finally:
+        server.shutdown()
+    print("offline reload ok", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
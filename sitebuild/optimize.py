@@ -0,0 +1,208 @@
+"""HTML clean-up that Hugo's ``--minify`` (and our own stages) leave.
+
+- re-render start tags minimally: unquoted values, boolean attributes,
+  no redundant defaults like ``type=text/javascript``
+- drop optional end tags (``</li>``, ``</p>``, ``</body>``, ...)
+- move inline SVGs that appear more than once into the icon sprite and
+  ``<use>`` them
+- remove repeated ``<style>``/``<script>`` blocks
+- give ``<img>`` the ``width``/``height`` it renders at (from ``sizes``
+  or the image) to avoid layout shift
+
+Pages are processed in parallel, one per core.
+"""
+
+import re
+from html import escape
+
+from .icons import SPRITE, add_symbols, parse_svg, symbol, use
+from .images import _pil
+from .markup import find_tags, render_tag, splice
+from .site import log, process_pool, sha256
+
+PROTECTED = re.compile(r"<(script|style|pre|textarea)\b.*?</\1\s*>",
+                       re.S | re.I)
+UNQUOTED = re.compile(r"^[^\s\"'=<>`]+$")
+BOOLEAN = {"allowfullscreen", "async", "autofocus", "autoplay", "checked",
+           "controls", "default", "defer", "disabled", "hidden", "ismap",
+           "loop", "multiple", "muted", "nomodule", "novalidate", "open",
+           "playsinline", "readonly", "required", "reversed", "selected"}
+REDUNDANT = {
+    ("script", "type"): {"text/javascript", "application/javascript"},
+    ("script", "language"): None,
+    ("style", "type"): {"text/css"},
+    ("style", "media"): {"all"},
+    ("link", "media"): {"all"},
+    ("form", "method"): {"get"},
+    ("input", "type"): {"text"},
+    ("button", "type"): {"submit"},
+    ("img", "decoding"): {"auto"},
+}
+EMPTY_DROPPABLE = {"class", "id", "style", "title"}
+_BLOCK = (r"address|article|aside|blockquote|div|dl|fieldset|figure|footer"
+          r"|form|h[1-6]|header|hr|main|nav|ol|p|pre|section|table|ul")
+OPTIONAL_END = [
+    (r"</li>", r"\s*(?:<li\b|</[ou]l>)"),
+    (r"</dt>", r"\s*<d[dt]\b"),
+    (r"</dd>", r"\s*(?:<d[dt]\b|</dl>)"),
+    (r"</option>", r"\s*(?:<option\b|<optgroup\b|</select>|</optgroup>)"),
+    (r"</p>", rf"\s*(?:<(?:{_BLOCK})\b|</(?:div|section|article|aside|main"
+              r"|header|footer|li|body|blockquote|td|th|form|nav)>)"),
+    (r"</t[dh]>", r"\s*(?:<t[dhr]\b|</tr>|</t(?:body|able)>)"),
+    (r"</tr>", r"\s*(?:<tr\b|</t(?:body|able)>)"),
+    (r"</head>", r"\s*<body\b"),
+]
+MIN_SVG_REPEAT = 2
+# One attribute of a start tag, to recover the case html.parser drops.
+ATTR = re.compile(r"""([^\s"'>/=]+)(?:\s*=\s*(?:"[^"]*"|'[^']*'|[^\s>]+))?""")
+
+
+def source_case(tag):
+    """``(name, {lowercased: as written})`` for ``tag``'s name and
+    attributes. Case matters in SVG (``viewBox``, ``linearGradient``),
+    and is otherwise left as the page had it."""
+    name = re.match(r"<([^\s/>]+)", tag.text).group(1)
+    names = {}
+    for m in ATTR.finditer(tag.text, len(name) + 1):
+        names.setdefault(m.group(1).lower(), m.group(1))
+    return name, names
+
+
+def minimal_tag(tag):
+    closing = tag.text.endswith("/>")
+    name, names = source_case(tag)
+    parts = [name]
+    for key, value in tag.attrs.items():
+        allowed = REDUNDANT.get((tag.name, key), ())
+        if allowed is None or (value is not None
+                               and value.lower() in allowed):
+            continue
+        if key in EMPTY_DROPPABLE and value is not None and not value.strip():
+            continue
+        written = names.get(key, key)
+        if value is None or (key in BOOLEAN and value.lower() in ("", key)):
+            parts.append(written)
+            continue
+        value = escape(value, quote=False)
+        # An unquoted last value would swallow the "/" of "/>".
+        if UNQUOTED.match(value) and not closing:
+            parts.append(f"{written}={value}")
+        else:
+            parts.append(f'{written}="{value.replace(chr(34), "&quot;")}"')
+    return "<" + " ".join(parts) + ("/>" if closing else ">")
+
+
+def _outside_protected(text, fn):
+    out, pos = [], 0
+    for m in PROTECTED.finditer(text):
+        out.append(fn(text[pos:m.start()]))
+        out.append(m.group(0))
+        pos = m.end()
+    out.append(fn(text[pos:]))
+    return "".join(out)
+
+
+def drop_optional_ends(chunk):
+    for end, before in OPTIONAL_END:
+        chunk = re.sub(f"{end}(?={before})", "", chunk, flags=re.I)
+    return chunk
+
+
+def dedupe_blocks(text):
+    seen, edits = set(), []
+    for m in re.finditer(r"<(style|script)\b([^>]*)>(.*?)</\1>", text,
+                         re.S | re.I):
+        tag = find_tags(m.group(0), m.group(1).lower())[0]
+        if m.group(1).lower() == "script" and tag.get("src"):
+            key = ("src", tag.get("src"))
+        elif not m.group(3).strip():
+            continue
+        else:
+            key = (m.group(1).lower(), tag.get("media"), tag.get("type"),
+                   m.group(3))
+        if key in seen:
+            edits.append((m.start(), m.end(), ""))
+        seen.add(key)
+    return splice(text, edits)
+
+
+def share_svgs(text):
+    sprite = SPRITE.search(text)
+    found = {}
+    for m in re.finditer(r"<svg\b.*?</svg>", text, re.S | re.I):
+        if sprite and m.start() <= sprite.start() < m.end():
+            continue
+        if "<use" in m.group(0):
+            continue
+        found.setdefault(m.group(0), []).append(m.span())
+    edits, symbols = [], []
+    for markup, spans in found.items():
+        if len(spans) < MIN_SVG_REPEAT:
+            continue
+        name = "s" + sha256(markup.encode())[:8]
+        ref = use(name, parse_svg(markup)[0])
+        saved = len(spans) * (len(markup) - len(ref)) - len(markup)
+        if saved <= 0:
+            continue
+        symbols.append(symbol(name, markup))
+        edits += [(a, b, ref) for a, b in spans]
+    if not edits or not find_tags(text, "body"):
+        return text
+    return add_symbols(splice(text, edits), symbols)
+
+
+def image_sizes(site, page, text):
+    """``width``/``height`` for ``<img>``s without them: the rendered size
+    when ``sizes`` is a single px length, else the intrinsic size of
+    ``src`` (which is what renders when there is no ``srcset``)."""
+    Image = None
+    edits = []
+    for tag in find_tags(text, "img"):
+        if "width" in tag.attrs or "height" in tag.attrs:
+            continue
+        fixed = re.fullmatch(r"\s*(\d+)px\s*", tag.get("sizes") or "")
+        if tag.get("srcset") and not fixed:
+            continue    # the rendered size depends on the viewport
+        path = site.resolve(tag.get("src") or "", page)
+        if path is None or path.suffix.lower() == ".svg":
+            continue
+        Image = Image or _pil()
+        try:
+            with Image.open(path) as im:
+                width, height = im.size
+        except OSError:
+            continue
+        if fixed:
+            width, height = (int(fixed.group(1)),
+                             round(height * int(fixed.group(1)) / width))
+        attrs = dict(tag.attrs, width=str(width), height=str(height))
+        edits.append((tag.start, tag.end, render_tag(
+            "img", attrs, tag.text.endswith("/>"))))
+    return splice(text, edits)
+
+
+def optimize(site, page):
+    before = page.read_text()
+    text = share_svgs(dedupe_blocks(before))
+    text = image_sizes(site, page, text)
+    text = splice(text, [(t.start, t.end, new)
+                         for t in find_tags(text)
+                         for new in [minimal_tag(t)]
+                         if len(new) < len(t.text)])
+    text = _outside_protected(text, drop_optional_ends)
+    text = re.sub(r"</body>\s*</html>\s*$|</html>\s*$", "", text, flags=re.I)
+    page.write_text(text)
+    return page, len(before.encode()), len(text.encode())
+
+
+def run(site):
+    pages = site.pages()
+    total_before = total_after = 0
+    with process_pool() as pool:
+        for page, before, after in pool.map(optimize, [site] * len(pages),
+                                            pages):
+            total_before += before
+            total_after += after
+            log("html", f"{site.url_for(page)}: {before} -> {after} bytes "
+                        f"({after - before:+d})")
+    log("html", f"{len(pages)} pages, {total_before} -> {total_after} bytes")
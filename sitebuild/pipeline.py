@@ -0,0 +1,273 @@
+"""The post-build stages and the scheduler that runs them.
+
+Each stage declares which kinds of file it reads and writes. A stage
+waits for every earlier stage it conflicts with (one writes what the
+other reads or writes), so the result is the same as running them in
+the order listed, but independent stages -- image encoding next to the
+HTML rewrites, say -- run side by side.
+
+A stage whose inputs hash the same as on a previous run is not run
+again: the files it wrote then are restored from .cache/sitebuild.
+Only the entries the latest run used are kept, so the cache doesn't
+grow with every build.
+"""
+
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from pathlib import Path
+
+from . import (budgets, bundle, compress, critical, emoji, favicon,
+               fingerprint, formats, icons, images, lazy, lossless, optimize,
+               preload, scripts, sw, thirdparty)
+from .cache import ContentCache
+from .site import log, sha256
+
+# What a stage can touch in public/, by suffix; anything else is "other".
+KINDS = {
+    "html": {".html"},
+    "css": {".css"},
+    "js": {".js", ".mjs"},
+    "images": {".jpg", ".jpeg", ".png", ".gif", ".webp", ".avif", ".svg",
+               ".ico"},
+    "fonts": {".woff", ".woff2", ".ttf", ".otf"},
+    "compressed": {".gz", ".br"},
+}
+PUBLIC = frozenset(KINDS) | {"other"}
+
+
+@dataclass(frozen=True)
+class Stage:
+    run: object
+    reads: frozenset = frozenset()
+    writes: frozenset = frozenset()
+
+    def touches(self):
+        return self.reads | self.writes
+
+
+def _stage(run, reads=(), writes=()):
+    """Expand "public" to every kind; "report:<name>" is a file in the cache."""
+    def expand(names):
+        return frozenset(k for n in names
+                         for k in (PUBLIC if n == "public" else (n,)))
+    return Stage(run, expand(reads), expand(writes))
+
+
+STAGES = {
+    "lossless": _stage(lossless.run, ["images"],
+                       ["images", "report:lossless.json"]),
+    "images": _stage(images.run, ["images"],
+                     ["images", "report:responsive.json"]),
+    "srcset": _stage(images.rewrite, ["images", "report:responsive.json"],
+                     ["html"]),
+    "formats": _stage(formats.run, ["images", "report:responsive.json"],
+                      ["images", "report:formats-report.json"]),
+    "icons": _stage(icons.run, [], ["html"]),
+    "emoji": _stage(emoji.run, [], ["html"]),
+    "thirdparty": _stage(thirdparty.run, ["css"],
+                         ["html", "report:thirdparty.json"]),
+    "picture": _stage(formats.picture, ["images", "report:responsive.json"],
+                      ["html"]),
+    "lazy": _stage(lazy.run, ["images"], ["html"]),
+    "favicon": _stage(favicon.run, ["images"], ["images", "other", "html"]),
+    "critical": _stage(critical.run, ["js"], ["html", "css"]),
+    "bundle": _stage(bundle.run, ["css", "js"],
+                     ["html", "css", "js", "other", "report:bundles.json"]),
+    "fingerprint": _stage(fingerprint.run, ["public"],
+                          ["public", f"report:{fingerprint.MANIFEST}"]),
+    "preload": _stage(preload.run, ["public"], ["html", "other"]),
+    "scripts": _stage(scripts.run, ["public"],
+                      ["html", "report:scripts.json"]),
+    "html": _stage(optimize.run, ["images"], ["html"]),
+    "sw": _stage(sw.run, ["public"], ["html", "js"]),
+    "compress": _stage(compress.run, ["public"], ["compressed"]),
+    "budgets": _stage(budgets.run, ["public"], ["report:budgets.json"]),
+}
+
+
+def graph(names):
+    """{stage: earlier stages it has to wait for}, for stages in STAGES order."""
+    order = [n for n in STAGES if n in names]
+    deps = {}
+    for i, name in enumerate(order):
+        b = STAGES[name]
+        deps[name] = {a for a in order[:i]
+                      if STAGES[a].writes & b.touches()
+                      or b.writes & STAGES[a].touches()}
+    return deps
+
+
+def _kind(path):
+    suffix = path.suffix.lower()
+    return next((k for k, s in KINDS.items() if suffix in s), "other")
+
+
+def _kind_of(tag):
+    root, rel = tag.split("/", 1)
+    return {_kind(Path(rel))} if root == "public" else {f"report:{rel}"}
+
+
+def snapshot(site, kinds):
+    """{"public/<path>" or "cache/<name>": sha256} for the given kinds."""
+    files = {}
+    if kinds & PUBLIC:
+        for path in site.public.rglob("*"):
+            if path.is_file() and _kind(path) in kinds:
+                rel = path.relative_to(site.public).as_posix()
+                files[f"public/{rel}"] = sha256(path.read_bytes())
+    for kind in kinds - PUBLIC:
+        path = site.cache / kind.removeprefix("report:")
+        if path.is_file():
+            files[f"cache/{path.name}"] = sha256(path.read_bytes())
+    return files
+
+
+def _path(site, tag):
+    root, rel = tag.split("/", 1)
+    return (site.public if root == "public" else site.cache) / rel
+
+
+def environment(site):
+    """Hash of everything besides public/ that a stage's output depends on:
+    this package, the site config and the assets the stages read."""
+    here = Path(__file__).parent
+    sources = sorted(here.glob("*.py"))
+    for base in (site.root, site.root / "themes" / site.config["theme"]):
+        sources += sorted(p for p in (base / "assets").rglob("*")
+                          if p.is_file())
+    digest = [sha256(json.dumps(site.config, sort_keys=True,
+                                default=str).encode())]
+    digest += [f"{p.name}:{sha256(p.read_bytes())}" for p in sources]
+    return sha256("\n".join(digest).encode())
+
+
+def _run(site, name, env, force):
+    """Run one stage, or replay its recorded outputs; returns
+    (start, end, cached, key)."""
+    stage = STAGES[name]
+    store = ContentCache(site, "stages")
+    start = time.perf_counter()
+    before = snapshot(site, stage.touches())
+    # A report the stage only writes is its own previous output, not input.
+    inputs = {tag: digest for tag, digest in before.items()
+              if tag.startswith("public/") or _kind_of(tag) & stage.reads}
+    key = sha256(json.dumps([name, env, inputs], sort_keys=True).encode())
+    record = store.dir / f"{name}-{key}.json"
+    if not force and record.is_file():
+        outputs = json.loads(record.read_text())
+        if all(d is None or (store.dir / d).is_file()
+               for d in outputs.values()):
+            for tag, digest in outputs.items():
+                path = _path(site, tag)
+                if digest is None:
+                    path.unlink(missing_ok=True)
+                else:
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    store.fetch(digest, "", path)
+            log(name, f"inputs unchanged, restored {len(outputs)} file(s)")
+            return start, time.perf_counter(), True, key
+
+    stage.run(site)
+    after = snapshot(site, stage.writes)
+    outputs = {tag: digest for tag, digest in after.items()
+               if before.get(tag) != digest}
+    outputs.update({tag: None for tag in before
+                    if tag not in after and _kind_of(tag) & stage.writes})
+    for tag, digest in outputs.items():
+        if digest is not None:
+            store.store(digest, "", _path(site, tag))
+    record.write_text(json.dumps(outputs, indent=2, sort_keys=True))
+    return start, time.perf_counter(), False, key
+
+
+def prune(site, used):
+    """Drop the records of stages in ``used`` ({stage: key}) other than
+    the ones just used, then the outputs no record refers to."""
+    store = ContentCache(site, "stages")
+    records = sorted(store.dir.glob("*.json"))
+    dropped = 0
+    for path in records:
+        stage, _, key = path.stem.rpartition("-")
+        if stage not in STAGES or used.get(stage, key) != key:
+            path.unlink()
+            dropped += 1
+    live = {d for path in store.dir.glob("*.json")
+            for d in json.loads(path.read_text()).values() if d}
+    for path in store.dir.iterdir():
+        if path.suffix != ".json" and path.name not in live:
+            path.unlink()
+            dropped += 1
+    return dropped
+
+
+def critical_path(deps, timings):
+    """The chain of stages that bounds the wall time, in run order."""
+    finish, via = {}, {}
+    for name in deps:
+        prev = max(deps[name], key=lambda d: finish[d], default=None)
+        finish[name] = timings[name]["seconds"] + (finish[prev] if prev
+                                                   else 0)
+        via[name] = prev
+    name = max(finish, key=finish.get, default=None)
+    path = []
+    while name:
+        path.append(name)
+        name = via[name]
+    return path[::-1]
+
+
+def direct(deps):
+    """``deps`` without the edges already implied by another one."""
+    return {name: {d for d in needs
+                   if not any(d in deps[other] for other in needs)}
+            for name, needs in deps.items()}
+
+
+def report(deps, timings, wall):
+    log("pipeline", f"{'stage':<12} {'start':>7} {'time':>7}  waits for")
+    edges = direct(deps)
+    for name, t in timings.items():
+        log("pipeline", f"{name:<12} {t['start']:>6.2f}s {t['seconds']:>6.2f}s"
+                        f"  {', '.join(sorted(edges[name])) or '-'}"
+                        f"{'  (cached)' if t['cached'] else ''}")
+    path = critical_path(deps, timings)
+    total = sum(timings[n]["seconds"] for n in path)
+    busy = sum(t["seconds"] for t in timings.values())
+    log("pipeline", f"critical path: {' -> '.join(path)} ({total:.2f}s)")
+    log("pipeline", f"wall {wall:.2f}s, {busy:.2f}s of stage time, "
+                    f"{sum(t['cached'] for t in timings.values())} of "
+                    f"{len(timings)} stage(s) cached")
+
+
+def run_stages(site, names, jobs=None, force=False):
+    """Run ``names`` (in STAGES order) as their dependencies allow.
+
+    Returns {stage: {"start", "seconds", "cached"}}, in completion order.
+    """
+    deps = graph(names)
+    env = environment(site)
+    (site.cache / "stages").mkdir(parents=True, exist_ok=True)
+    timings, running, used = {}, {}, {}
+    origin = time.perf_counter()
+    with ThreadPoolExecutor(jobs or os.cpu_count()) as pool:
+        while len(timings) < len(deps):
+            for name, needs in deps.items():
+                if (name not in timings and name not in running.values()
+                        and needs <= timings.keys()):
+                    running[pool.submit(_run, site, name, env, force)] = name
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                start, end, cached, used[name] = future.result()
+                timings[name] = {"start": round(start - origin, 3),
+                                 "seconds": round(end - start, 3),
+                                 "cached": cached}
+                log(name, f"done in {end - start:.2f}s")
+    report(deps, timings, time.perf_counter() - origin)
+    dropped = prune(site, used)
+    if dropped:
+        log("pipeline", f"pruned {dropped} stale cache entries")
+    return timings
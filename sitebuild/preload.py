@@ -0,0 +1,121 @@
+"""``<link rel=preload>`` and Early Hints for above-the-fold resources.
+
+For each page this preloads the LCP candidate (the first eagerly loaded
+``<img>``, which on the home page is the author portrait) with the
+srcset and type the browser would pick from its ``<picture>``, plus any
+web font the inlined critical CSS uses. The same hints go into
+``public/_headers`` as ``Link:`` headers for hosts that turn them into
+103 Early Hints.
+"""
+
+import re
+
+from . import css
+from .budgets import page_url, pick_candidate, picture_sources
+from .markup import find_tags, head_offset, render_tag, splice
+from .site import log
+
+FONT_TYPES = {".woff2": "font/woff2", ".woff": "font/woff"}
+STYLE = re.compile(r"<style\b[^>]*>(.*?)</style>", re.S | re.I)
+HEADERS = "_headers"
+
+
+def absolute(site, page, attrs):
+    """Make ``href``/``imagesrcset`` site-absolute so the same hint works
+    in the page and in ``_headers``."""
+    def fix(url):
+        path = site.resolve(url, page)
+        return site.url_for(path) if path is not None else url
+    if "href" in attrs:
+        attrs["href"] = fix(attrs["href"])
+    if "imagesrcset" in attrs:
+        attrs["imagesrcset"] = ", ".join(
+            " ".join([fix(url), *rest]) for url, *rest in
+            (c.split() for c in attrs["imagesrcset"].split(",") if c.strip()))
+    return attrs
+
+
+def lcp_hint(site, page, text):
+    sources = picture_sources(text)
+    for tag in find_tags(text, "img"):
+        if tag.get("loading") == "lazy":
+            continue
+        src = sources.get(tag.start, tag)
+        attrs = {"rel": "preload", "as": "image"}
+        if src.get("srcset"):
+            attrs["imagesrcset"] = src.get("srcset")
+            if src.get("sizes"):
+                attrs["imagesizes"] = src.get("sizes")
+        if tag.get("src") and src is tag:
+            attrs["href"] = tag.get("src")
+        if src.get("type"):
+            attrs["type"] = src.get("type")
+        attrs["fetchpriority"] = "high"
+        return absolute(site, page, attrs)
+    return None
+
+
+def font_hints(site, page, text):
+    inline = "".join(STYLE.findall(text))
+    if not inline:
+        return []
+    nodes = list(css.walk(css.parse(inline)))
+    used = " ".join(n.body for n in nodes if isinstance(n, css.Rule))
+    hints = []
+    for node in nodes:
+        if not (isinstance(node, css.AtRule) and node.name == "font-face"):
+            continue
+        family = re.search(r"font-family:\s*(['\"]?)([^;'\"}]+)\1",
+                           node.raw)
+        if not family or family.group(2).strip() not in used:
+            continue
+        for url in re.findall(r"url\(\s*['\"]?([^'\")]+)", node.raw):
+            path = site.resolve(url, page)
+            if path is not None and path.suffix in FONT_TYPES:
+                hints.append({"rel": "preload", "as": "font",
+                              "type": FONT_TYPES[path.suffix],
+                              "href": site.url_for(path),
+                              "crossorigin": None})
+                break
+    return hints
+
+
+def link_header(attrs):
+    href = attrs.get("href")
+    if href is None:
+        # Link needs a target; browsers that read imagesrcset ignore it,
+        # the others should get the candidate the page itself would load.
+        href = pick_candidate(attrs["imagesrcset"], attrs.get("imagesizes"))
+    parts = [f"<{href}>"]
+    for key, value in attrs.items():
+        if key in ("href", "fetchpriority"):
+            continue
+        parts.append(key if value is None else f'{key}="{value}"')
+    return "; ".join(parts)
+
+
+def run(site):
+    headers = []
+    for page in site.pages():
+        text = page.read_text()
+        existing = {(t.get("href"), t.get("imagesrcset"))
+                    for t in find_tags(text, "link")
+                    if t.get("rel") == "preload"}
+        hints = [h for h in [lcp_hint(site, page, text)] if h]
+        hints += font_hints(site, page, text)
+        hints = [h for h in hints
+                 if (h.get("href"), h.get("imagesrcset")) not in existing]
+        if not hints:
+            continue
+        at = head_offset(text)
+        if at is None:
+            continue
+        tags = "".join(render_tag("link", h) for h in hints)
+        page.write_text(splice(text, [(at, at, tags)]))
+        url = page_url(site, page)
+        headers.append(url + "\n" + "".join(
+            f"  Link: {link_header(h)}\n" for h in hints))
+        log("preload", f"{url}: " + ", ".join(h.get("type", h["as"])
+                                               for h in hints))
+    if headers:
+        (site.public / HEADERS).write_text("\n".join(headers))
@@ -0,0 +1,139 @@
+"""Script audit: what every page runs, and ``defer`` where it is safe.
+
+Lists each ``<script>`` in public/ with its size and how it loads:
+``render`` (a classic script in ``<head>``: nothing paints until it has
+run), ``parser`` (a classic script in ``<body>``), or ``defer``,
+``async`` or ``module``. Blocking scripts are moved off the critical
+path where that can't change what they do:
+
+- a local script gets ``defer`` unless it uses ``document.write`` or
+  ``document.currentScript``, or is listed in ``keep``;
+- an inline script in ``<body>`` becomes ``type=module`` if ``js``
+  finds nothing a module would treat differently. Inline scripts in
+  ``<head>`` are left: they are usually there to run before first
+  paint (a colour-scheme switch, say).
+
+Deferred scripts run in document order, so a script is only deferred
+if every classic script after it is deferred too. This runs before the
+HTML minifier and the service worker stage, whose registration script
+is a module and never blocks. The build fails if the home page still
+has more render-blocking JS than ``[params.sitebuild.scripts]
+home_blocking`` (bytes, default 0)::
+
+    [params.sitebuild.scripts]
+      home_blocking = "0B"
+      keep = ["/js/theme.js"]
+"""
+
+import json
+
+from . import js
+from .budgets import compressed_size, page_url, parse_size
+from .bundle import JS_TYPES, UNDEFERRABLE, _element_end
+from .markup import find_tags, render_tag, splice
+from .site import BuildError, log
+
+BLOCKING = ("render", "parser")
+REPORT = "scripts.json"
+
+
+def loading(tag, in_head):
+    """How the script loads, or None if it isn't JavaScript."""
+    kind = (tag.get("type") or "").lower()
+    if kind == "module":
+        return "module"
+    if kind not in JS_TYPES:
+        return None         # data blocks such as JSON-LD
+    if tag.get("src") and "async" in tag.attrs:
+        return "async"
+    if tag.get("src") and "defer" in tag.attrs:
+        return "defer"
+    return "render" if in_head else "parser"
+
+
+def audit(site, page, text, keep):
+    """The page's scripts, with the edits that defer the ones that can be."""
+    body = next(iter(find_tags(text, "body")), None)
+    body = body.start if body else len(text)
+    scripts = []
+    for tag in find_tags(text, "script"):
+        how = loading(tag, tag.start < body)
+        if how is None:
+            continue
+        src, end = tag.get("src"), _element_end(text, tag, "script")
+        path = src and site.resolve(src, page)
+        if src:
+            code = path.read_text() if path else None
+            size = path.stat().st_size if path else None
+            gz = compressed_size(path) if path else None
+        else:
+            code = text[tag.end:end - len("</script>")]
+            size = len(code.encode())
+            gz = None
+        scripts.append({"tag": tag, "end": end, "code": code,
+                        "src": site.url_for(path) if path else src,
+                        "bytes": size, "gzip": gz, "loading": how,
+                        "deferred": False})
+
+    edits, later_sync = [], False
+    for s in reversed(scripts):
+        if s["loading"] not in BLOCKING:
+            continue
+        tag, code = s["tag"], s["code"]
+        if code is None or UNDEFERRABLE.search(code) or later_sync:
+            later_sync = True
+        elif tag.get("src"):
+            if s["src"] in keep or "nomodule" in tag.attrs:
+                later_sync = True
+                continue
+            edits.append((tag.start, tag.end,
+                          render_tag("script", {**tag.attrs, "defer": None})))
+            s.update(loading="defer", deferred=True)
+        elif s["loading"] == "parser" and js.module_safe(code):
+            edits.append((tag.start, tag.end, render_tag(
+                "script", {**tag.attrs, "type": "module"})))
+            s.update(loading="module", deferred=True)
+        else:
+            later_sync = True
+    return scripts, edits
+
+
+def run(site):
+    cfg = site.settings("scripts")
+    keep = set(cfg.get("keep", []))
+    threshold = parse_size(cfg.get("home_blocking", 0))
+    report, deferred = {}, 0
+    for page in site.pages():
+        text = page.read_text()
+        scripts, edits = audit(site, page, text, keep)
+        if edits:
+            page.write_text(splice(text, edits))
+        if not scripts:
+            continue
+        url = page_url(site, page)
+        entry = report[url] = {
+            "scripts": [{k: s[k] for k in ("src", "bytes", "gzip", "loading",
+                                           "deferred")} for s in scripts]}
+        for how in BLOCKING:
+            entry[f"{how}_blocking"] = sum(s["bytes"] or 0 for s in scripts
+                                           if s["loading"] == how)
+        entry["deferred"] = len(edits)
+        deferred += len(edits)
+        for s in scripts:
+            log("scripts", f"{url}: {s['src'] or 'inline'} {s['bytes']} "
+                           f"bytes, {s['loading']}"
+                           + (" (deferred)" if s["deferred"] else ""))
+
+    site.cache.mkdir(parents=True, exist_ok=True)
+    (site.cache / REPORT).write_text(json.dumps(report, indent=2))
+    log("scripts", f"{sum(len(e['scripts']) for e in report.values())} "
+                   f"script(s) on {len(report)} page(s), {deferred} deferred")
+
+    home = report.get("/", {}).get("scripts", [])
+    blocking = [s for s in home if s["loading"] == "render"]
+    size = sum(s["bytes"] or 0 for s in blocking)
+    remote = [s["src"] for s in blocking if s["bytes"] is None]
+    if size > threshold or remote:
+        names = ", ".join(s["src"] or "inline" for s in blocking)
+        raise BuildError(f"home page has {size} bytes of render-blocking JS "
+                         f"(limit {threshold}): {names}")
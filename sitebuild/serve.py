@@ -0,0 +1,209 @@
+"""Production-like preview of public/: ``python -m sitebuild.serve``.
+
+Unlike ``hugo server`` this serves the optimised build the way a good
+host would: precompressed ``.br``/``.gz`` siblings by Accept-Encoding,
+immutable caching for fingerprinted files, ETags with 304s, HTTP/1.1
+keep-alive and, like GitHub Pages, a 301 from ``/dir`` to ``/dir/``. Every
+request is logged with its latency and bytes, and a hit-rate summary is
+printed on exit.
+"""
+
+import argparse
+import mimetypes
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+from .fingerprint import is_fingerprinted
+from .site import load_site, sha256
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "public, max-age=0, must-revalidate"
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+mimetypes.add_type("image/avif", ".avif")
+mimetypes.add_type("image/webp", ".webp")
+mimetypes.add_type("application/manifest+json", ".webmanifest")
+mimetypes.add_type("text/javascript", ".js")
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.status = Counter()
+        self.bytes = 0
+
+    def add(self, status, size):
+        with self.lock:
+            self.status[status] += 1
+            self.bytes += size
+
+    def summary(self):
+        total = sum(self.status.values())
+        hits = self.status[304]
+        rate = f"{hits / total:.0%}" if total else "n/a"
+        return (f"{total} requests, {self.bytes} bytes sent, "
+                f"{hits} revalidated (304, {rate})")
+
+
+def accepted(header):
+    """{coding: q} from an Accept-Encoding header."""
+    out = {}
+    for part in header.split(","):
+        coding, *params = [p.strip() for p in part.split(";")]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        out[coding.lower()] = q
+    return out
+
+
+def choose_encoding(header, available):
+    """The coding in ``available`` (in order of preference) the client
+    rates highest, or None for identity."""
+    q = accepted(header)
+    ranked = [(q.get(name, q.get("*", 0)), -i, name)
+              for i, name in enumerate(available)]
+    best = max(ranked, default=None)
+    return best[2] if best and best[0] > 0 else None
+
+
+# (path, mtime, size) -> (ETag, fingerprinted), so a file is only read
+# and hashed again once it changes.
+_FILES = {}
+
+
+def _describe(path):
+    """``(etag, fingerprinted)`` for the file at ``path``."""
+    st = path.stat()
+    key = (path, st.st_mtime_ns, st.st_size)
+    if key not in _FILES:
+        data = path.read_bytes()
+        _FILES[key] = ('"' + sha256(data)[:16] + '"',
+                       is_fingerprinted(path, data))
+    return _FILES[key]
+
+
+class Handler(BaseHTTPRequestHandler):
+    server_version = "sitebuild"
+    protocol_version = "HTTP/1.1"
+    public = None
+    stats = None
+    quiet = False
+
+    def do_GET(self):
+        self._serve(body=True)
+
+    def do_HEAD(self):
+        self._serve(body=False)
+
+    def _locate(self):
+        """The file for the request, or a URL to redirect to."""
+        parts = urlsplit(self.path)
+        path = unquote(parts.path)
+        target = (self.public / path.lstrip("/")).resolve()
+        try:
+            target.relative_to(self.public)
+        except ValueError:
+            return None
+        if target.is_dir():
+            if not path.endswith("/"):
+                query = f"?{parts.query}" if parts.query else ""
+                return f"{parts.path}/{query}"
+            target = target / "index.html"
+        return target if target.is_file() else None
+
+    def _serve(self, body):
+        start = time.perf_counter()
+        target = self._locate()
+        if isinstance(target, str):
+            self._finish(start, 301, b"", {"Location": target}, body)
+            return
+        status = 200
+        if target is None:
+            status, target = 404, self.public / "404.html"
+            if not target.is_file():
+                self._finish(start, 404, b"not found\n", {}, body)
+                return
+        ctype = mimetypes.guess_type(target.name)[0] or \
+            "application/octet-stream"
+        siblings = {name: target.with_name(target.name + suffix)
+                    for name, suffix in ENCODINGS}
+        encoding = choose_encoding(
+            self.headers.get("Accept-Encoding", ""),
+            [name for name, path in siblings.items() if path.is_file()])
+        send = siblings[encoding] if encoding else target
+        etag = _describe(send)[0]
+        headers = {
+            "Content-Type": ctype,
+            "ETag": etag,
+            "Vary": "Accept-Encoding",
+            "Cache-Control": (IMMUTABLE if _describe(target)[1]
+                              else REVALIDATE),
+        }
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        if status == 200 and etag in self.headers.get("If-None-Match", ""):
+            self._finish(start, 304, b"", headers, False)
+            return
+        self._finish(start, status, send.read_bytes(), headers, body)
+
+    def _finish(self, start, status, data, headers, body):
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        sent = len(data) if body else 0
+        if body:
+            self.wfile.write(data)
+        self.stats.add(status, sent)
+        if not self.quiet:
+            ms = (time.perf_counter() - start) * 1000
+            print(f"{status} {self.command} {self.path} {sent}B "
+                  f"{headers.get('Content-Encoding', '-')} {ms:.1f}ms",
+                  file=sys.stderr)
+
+    def log_message(self, *args):
+        pass
+
+
+def make_server(public, port=0, host="127.0.0.1", quiet=False):
+    """A preview server for ``public``, not yet serving."""
+    handler = type("BoundHandler", (Handler,), {
+        "public": public.resolve(), "stats": Stats(), "quiet": quiet})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="sitebuild.serve",
+                                     description=__doc__.split("\n")[0])
+    parser.add_argument("--public", help="build output (default: public/)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("-p", "--port", type=int, default=1313)
+    args = parser.parse_args(argv)
+    site = load_site(public=args.public)
+    server = make_server(site.public, args.port, args.host)
+    print(f"serving {site.public} on http://{args.host}:"
+          f"{server.server_port}/", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(server.RequestHandlerClass.stats.summary(), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""Paths, config and URL helpers shared by every stage."""
+
+import hashlib
+import multiprocessing
+import os
+import sys
+import tomllib
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from urllib.parse import unquote, urlsplit
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+class BuildError(Exception):
+    """A stage could not finish; the CLI prints it and exits non-zero."""
+
+
+def log(stage, msg):
+    print(f"[{stage}] {msg}", file=sys.stderr)
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def process_pool(workers=None):
+    """A process pool that doesn't fork: stages run on the pipeline's
+    threads, and forking a threaded process can deadlock the child."""
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context(
+        "forkserver" if "forkserver" in methods else "spawn")
+    return ProcessPoolExecutor(workers or os.cpu_count(), mp_context=context)
+
+
+@dataclass
+class Site:
+    root: Path
+    config: dict = field(repr=False)
+    public: Path = None
+    cache: Path = None
+
+    def __post_init__(self):
+        self.public = self.public or self.root / "public"
+        self.cache = self.cache or self.root / ".cache" / "sitebuild"
+
+    @property
+    def static(self):
+        return self.root / "static"
+
+    @property
+    def params(self):
+        return self.config.get("params", {})
+
+    def settings(self, name):
+        """Return ``[params.sitebuild.<name>]`` from hugo.toml, or ``{}``."""
+        return self.params.get("sitebuild", {}).get(name, {})
+
+    def pages(self):
+        return sorted(self.public.rglob("*.html"))
+
+    def url_for(self, path):
+        """Site-absolute URL of a file in public/."""
+        rel = path.relative_to(self.public).as_posix()
+        return "/" + rel
+
+    def resolve(self, ref, page, must_exist=True):
+        """Map a URL found in ``page`` to a file in public/, or None.
+
+        External URLs resolve to None, and so do references to missing
+        files unless ``must_exist`` is false.
+        """
+        parts = urlsplit(ref)
+        base = urlsplit(self.config.get("baseURL", ""))
+        if parts.scheme or parts.netloc:
+            if (parts.scheme, parts.netloc) not in {
+                (base.scheme, base.netloc), ("", base.netloc)
+            }:
+                return None
+        elif not parts.path:
+            return None
+        path = unquote(parts.path)
+        if path.startswith("/"):
+            target = self.public / path.lstrip("/")
+        else:
+            target = page.parent / path
+        if target.is_dir():
+            target = target / "index.html"
+        try:
+            target = target.resolve()
+            target.relative_to(self.public)
+        except (OSError, ValueError):
+            return None
+        return target if target.is_file() or not must_exist else None
+
+
+def load_site(root=None, public=None):
+    root = Path(root or ROOT).resolve()
+    with open(root / "hugo.toml", "rb") as f:
+        config = tomllib.load(f)
+    return Site(root, config, public=Path(public).resolve() if public else None)
@@ -0,0 +1,151 @@
+"""Service worker that precaches the home page and what it loads.
+
+The precache list is built from public/ after fingerprinting: the home
+page, everything it fetches (stylesheets, scripts, icons) and, for each
+of its images, the file every ``<source>`` format and the ``<img>``
+fallback would serve at 1x and 2x, each with a content-hash revision. Each version
+of the worker fills its own cache, copying entries whose revision is
+unchanged from the previous one, and old caches are only deleted once
+it activates.
+"""
+
+import json
+import re
+
+from .budgets import pick_candidate, subresources
+from .markup import find_tags, splice
+from .site import BuildError, log, sha256
+
+SW_PATH = "sw.js"
+REGISTER = ("<script type=module>if('serviceWorker'in navigator)"
+            "navigator.serviceWorker.register('/sw.js')</script>")
+REGISTERED = re.compile(
+    r"serviceWorker\s*\.\s*register\(\s*['\"]/%s['\"]" % re.escape(SW_PATH))
+
+TEMPLATE = """\
+const PRECACHE = %(entries)s;
+const PREFIX = "sitebuild-precache-";
+const CACHE = PREFIX + "%(version)s";
+const MANIFEST = "/__precache-manifest";
+
+// Each version gets its own cache, so pages the previous worker still
+// controls keep being served from the old one until this one activates.
+self.addEventListener("install", (event) => {
+  event.waitUntil((async () => {
+    const cache = await caches.open(CACHE);
+    const previous = [];
+    for (const name of await caches.keys()) {
+      if (!name.startsWith(PREFIX) || name === CACHE) continue;
+      const old = await caches.open(name);
+      const stored = await old.match(MANIFEST);
+      if (stored) previous.push([old, await stored.json()]);
+    }
+    await Promise.all(PRECACHE.map(async ([url, rev]) => {
+      for (const [old, revs] of previous) {
+        const hit = revs[url] === rev && await old.match(url);
+        if (hit) return cache.put(url, hit);
+      }
+      const res = await fetch(url, {cache: "reload"});
+      if (!res.ok) throw new Error(`precache ${url}: ${res.status}`);
+      await cache.put(url, res);
+    }));
+    await cache.put(MANIFEST,
+                    new Response(JSON.stringify(Object.fromEntries(PRECACHE))));
+    await self.skipWaiting();
+  })());
+});
+
+self.addEventListener("activate", (event) => {
+  event.waitUntil((async () => {
+    await Promise.all((await caches.keys())
+      .filter((name) => name.startsWith(PREFIX) && name !== CACHE)
+      .map((name) => caches.delete(name)));
+    await self.clients.claim();
+  })());
+});
+
+self.addEventListener("fetch", (event) => {
+  const req = event.request;
+  const url = new URL(req.url);
+  if (req.method !== "GET" || url.origin !== location.origin) return;
+  const key = req.mode === "navigate" && url.pathname.endsWith("/index.html")
+    ? url.pathname.slice(0, -10) : url.pathname;
+  event.respondWith((async () => {
+    const cache = await caches.open(CACHE);
+    const hit = await cache.match(key);
+    if (!hit) return fetch(req);
+    if (req.mode === "navigate") {
+      // Render from cache now, refresh it for next time.
+      event.waitUntil(fetch(req).then((res) => {
+        if (res.ok) return cache.put(key, res);
+      }).catch(() => {}));
+    }
+    return hit;
+  })());
+});
+"""
+
+
+def image_variants(site, home):
+    """Every file the home page's images may load.
+
+    An ``<img>`` in a ``<picture>`` loads from whichever ``<source>``
+    format the browser supports first, or from its own srcset if none
+    is, so each of them is listed, at the width a 1x and a 2x screen
+    would pick for the page's ``sizes``.
+    """
+    text = home.read_text()
+    pictures = [m.span() for m in
+                re.finditer(r"<picture\b.*?</picture>", text, re.S | re.I)]
+    found = []
+    for tag in find_tags(text, "source", "img"):
+        inside = any(a <= tag.start < b for a, b in pictures)
+        if tag.name == "source" and not inside:
+            continue
+        for density in (1, 2):
+            url = pick_candidate(tag.get("srcset") or "", tag.get("sizes"),
+                                 density)
+            path = site.resolve(url or tag.get("src") or "", home)
+            if path is not None and path not in found:
+                found.append(path)
+    return found
+
+
+def precache(site):
+    """``[(url, revision)]`` for the home page and what it needs."""
+    home = site.public / "index.html"
+    if not home.is_file():
+        raise BuildError("public/index.html missing")
+    files = {home: "/"}
+    for path in (subresources(site, home, lazy=True)
+                 + image_variants(site, home)):
+        files[path] = site.url_for(path)
+    return sorted((url, sha256(path.read_bytes())[:10])
+                  for path, url in files.items())
+
+
+def register(page):
+    text = page.read_text()
+    if REGISTERED.search(text):
+        return
+    body_end = text.lower().rfind("</body>")
+    at = body_end if body_end >= 0 else len(text)
+    page.write_text(splice(text, [(at, at, REGISTER)]))
+
+
+def run(site):
+    for page in site.pages():
+        if find_tags(page.read_text(), "body"):
+            register(page)
+    entries = precache(site)
+    missing = [u for u, _ in entries
+               if u != "/" and not (site.public / u.lstrip("/")).is_file()]
+    if missing:
+        raise BuildError(f"precache entries missing from public/: {missing}")
+    listing = json.dumps(entries, separators=(",", ":"))
+    (site.public / SW_PATH).write_text(TEMPLATE % {
+        "entries": listing, "version": sha256(listing.encode())[:10]})
+    size = sum((site.public / u.lstrip("/")).stat().st_size
+               if u != "/" else (site.public / "index.html").stat().st_size
+               for u, _ in entries)
+    log("sw", f"precaching {len(entries)} files, {size} bytes")
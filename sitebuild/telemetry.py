@@ -0,0 +1,198 @@
+"""Build telemetry: ``python -m sitebuild.telemetry [-n N] [--tolerance T]``.
+
+Every ``sitebuild.build`` appends one JSON record to .cache/telemetry.jsonl
+(outside .cache/sitebuild, so ``--clean`` keeps the history): Hugo's
+template metrics, the time each stage took, page and file counts, the
+bytes in public/ per content type and each page's blocking JS. The CLI
+prints the last N records and fails if the newest is slower or heavier
+than the median of the ones before it by more than the tolerance.
+"""
+
+import argparse
+import json
+import mimetypes
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from .site import ROOT, BuildError
+
+HISTORY = ROOT / ".cache" / "telemetry.jsonl"
+HUGO_FLAGS = ["--templateMetrics", "--templateMetricsHints"]
+MIN_DELTA_S = 0.05
+DURATION = re.compile(r"([\d.]+)(h|ms|µs|us|ns|m|s)")
+UNIT_MS = {"h": 3600000, "m": 60000, "s": 1000, "ms": 1, "µs": 1e-3,
+           "us": 1e-3, "ns": 1e-6}
+
+
+def _ms(text):
+    """Milliseconds in a Go duration such as ``1m2.5s`` or ``105.2µs``."""
+    return round(sum(float(n) * UNIT_MS[u]
+                     for n, u in DURATION.findall(text)), 3)
+
+
+def template_metrics(output):
+    """Rows of Hugo's ``--templateMetrics[Hints]`` table."""
+    rows = []
+    for line in output.splitlines():
+        cols = line.split()
+        if len(cols) not in (5, 8) or not DURATION.fullmatch(cols[0]):
+            continue
+        row = {"template": cols[-1], "cumulative_ms": _ms(cols[0]),
+               "average_ms": _ms(cols[1]), "maximum_ms": _ms(cols[2]),
+               "count": int(cols[-2])}
+        if len(cols) == 8:
+            row.update(cache_potential=int(cols[3]),
+                       percent_cached=int(cols[4]), cached=int(cols[5]))
+        rows.append(row)
+    return rows
+
+
+def content_types(public):
+    """Pages, files and {content type: bytes} for everything in public/.
+
+    Precompressed siblings are counted under their encoding (gzip, br).
+    """
+    sizes, files, pages = {}, 0, 0
+    for path in public.rglob("*"):
+        if not path.is_file():
+            continue
+        files += 1
+        pages += path.suffix == ".html"
+        kind, encoding = mimetypes.guess_type(path.name)
+        key = encoding or kind or "application/octet-stream"
+        sizes[key] = sizes.get(key, 0) + path.stat().st_size
+    return pages, files, dict(sorted(sizes.items()))
+
+
+def script_summary(site):
+    """{page: script count, blocking bytes, deferred} from the scripts
+    stage's report, without the per-script list."""
+    path = site.cache / "scripts.json"
+    if not path.is_file():
+        return {}
+    return {url: {**entry, "scripts": len(entry["scripts"])}
+            for url, entry in json.loads(path.read_text()).items()}
+
+
+def _commit(site):
+    if os.environ.get("GITHUB_SHA"):
+        return os.environ["GITHUB_SHA"][:12]
+    proc = subprocess.run(["git", "rev-parse", "--short=12", "HEAD"],
+                          cwd=site.root, capture_output=True, text=True)
+    return proc.stdout.strip() or None
+
+
+def record(site, hugo_seconds, hugo_output, stages):
+    """The telemetry record for a build that just finished."""
+    pages, files, sizes = content_types(site.public)
+    wall = max((t["start"] + t["seconds"] for t in stages.values()),
+               default=0)
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "commit": _commit(site),
+        "ci": bool(os.environ.get("GITHUB_ACTIONS")),
+        "seconds": round(hugo_seconds + wall, 3),
+        "hugo": {"seconds": round(hugo_seconds, 3),
+                 "templates": template_metrics(hugo_output)},
+        "stages": stages,
+        "pages": pages,
+        "files": files,
+        "bytes": sum(sizes.values()),
+        "content_types": sizes,
+        "scripts": script_summary(site),
+    }
+
+
+def append(entry, path=HISTORY):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as f:
+        f.write(json.dumps(entry, sort_keys=True) + "\n")
+
+
+def load(path=HISTORY):
+    if not path.is_file():
+        return []
+    return [json.loads(line) for line in path.read_text().splitlines()
+            if line.strip()]
+
+
+def metrics(entry):
+    """The numbers compared between builds, flattened."""
+    out = {"seconds": entry["seconds"], "hugo": entry["hugo"]["seconds"],
+           "files": entry["files"], "bytes": entry["bytes"]}
+    out.update({f"stage {name}": t["seconds"]
+                for name, t in entry["stages"].items() if not t["cached"]})
+    out.update({f"bytes {kind}": size
+                for kind, size in entry["content_types"].items()})
+    out.update({f"blocking js {url}": page["render_blocking"]
+                + page["parser_blocking"]
+                for url, page in entry.get("scripts", {}).items()})
+    return out
+
+
+def trend(entries):
+    print(f"{'time':20} {'commit':12} {'seconds':>8} {'hugo':>7} "
+          f"{'pages':>5} {'files':>5} {'bytes':>10}")
+    for e in entries:
+        print(f"{e['time']:20} {e['commit'] or '-':12} {e['seconds']:>8.2f} "
+              f"{e['hugo']['seconds']:>7.2f} {e['pages']:>5} {e['files']:>5} "
+              f"{e['bytes']:>10}")
+
+
+def compare(latest, previous, tolerance):
+    """Print the newest build against the median of ``previous``; return
+    the metrics that grew past ``tolerance``."""
+    history = [metrics(e) for e in previous]
+    worse = []
+    for m, value in metrics(latest).items():
+        old = [h[m] for h in history if m in h]
+        if not old or not statistics.median(old):
+            continue
+        before = statistics.median(old)
+        change = (value - before) / before
+        # Timings jitter by tens of milliseconds; ignore changes below that.
+        floor = MIN_DELTA_S if m == "hugo" or m.startswith(
+            ("seconds", "stage")) else 0
+        bad = change > tolerance and value - before > floor
+        if bad or abs(change) > tolerance:
+            print(f"{m:32} {before:>12g} -> {value:>12g} ({change:+.1%})"
+                  f"{'  REGRESSION' if bad else ''}")
+        if bad:
+            worse.append(m)
+    return worse
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="sitebuild.telemetry",
+                                     description=__doc__.split("\n")[0])
+    parser.add_argument("-n", type=int, default=10,
+                        help="builds to show and compare to (default: 10)")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="allowed slowdown/growth (default: 0.10)")
+    parser.add_argument("--history", type=Path, default=HISTORY,
+                        help="history file (default: .cache/telemetry.jsonl)")
+    args = parser.parse_args(argv)
+    try:
+        entries = load(args.history)[-(args.n + 1):]
+        if not entries:
+            raise BuildError(f"no builds recorded in {args.history}; "
+                             f"run python -m sitebuild.build")
+        trend(entries)
+        if len(entries) > 1:
+            print()
+            worse = compare(entries[-1], entries[:-1], args.tolerance)
+            if worse:
+                raise BuildError("regressed: " + ", ".join(worse))
+    except BuildError as e:
+        print(f"sitebuild.telemetry: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
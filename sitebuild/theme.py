@@ -0,0 +1,164 @@
+"""Vendor the theme at a pinned commit and review what an update costs.
+
+    python -m sitebuild.theme vendor <ref>   # snapshot into themes/<name>
+    python -m sitebuild.theme diff <ref>     # cost of moving to <ref>
+
+``vendor`` replaces the git submodule with plain files from ``<ref>``
+and records the source in ``themes/<name>/.vendored.json``, so checkouts
+never fetch the theme again. ``diff`` builds the site with the current
+theme and with ``<ref>`` (Hugo only, none of our stages) and compares
+bytes, CSS/JS file counts and render-blocking resources per page.
+"""
+
+import argparse
+import io
+import json
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+from pathlib import Path
+
+from .build import build
+from .markup import find_tags
+from .site import BuildError, load_site
+
+VENDORED = ".vendored.json"
+
+
+def git(*args, cwd):
+    proc = subprocess.run(["git", *args], cwd=cwd, capture_output=True)
+    if proc.returncode:
+        raise BuildError(f"git {args[0]} failed: "
+                         f"{proc.stderr.decode().strip()}")
+    return proc.stdout
+
+
+def theme_dir(site):
+    return site.root / "themes" / site.config["theme"]
+
+
+def theme_source(site):
+    """``(url, commit)`` of the theme as it is in the tree now."""
+    meta = theme_dir(site) / VENDORED
+    if meta.is_file():
+        data = json.loads(meta.read_text())
+        return data["url"], data["commit"]
+    rel = theme_dir(site).relative_to(site.root).as_posix()
+    url = git("config", "-f", ".gitmodules", f"submodule.{rel}.url",
+              cwd=site.root).decode().strip()
+    try:
+        commit = git("rev-parse", f"HEAD:{rel}",
+                     cwd=site.root).decode().strip()
+    except BuildError:
+        raise BuildError(f"{rel} has no pinned commit in HEAD; run "
+                         f"git submodule update --init first") from None
+    return url, commit
+
+
+def fetch(url, ref, dest):
+    """Export ``ref`` of ``url`` into ``dest``; return the commit id."""
+    with tempfile.TemporaryDirectory() as repo:
+        git("init", "-q", cwd=repo)
+        git("fetch", "-q", "--depth", "1", url, ref, cwd=repo)
+        commit = git("rev-parse", "FETCH_HEAD", cwd=repo).decode().strip()
+        archive = git("archive", "--format=tar", "FETCH_HEAD", cwd=repo)
+    dest.mkdir(parents=True, exist_ok=True)
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        tar.extractall(dest, filter="data")
+    return commit
+
+
+def vendor(site, ref):
+    url, _ = theme_source(site)
+    dest = theme_dir(site)
+    rel = dest.relative_to(site.root).as_posix()
+    if (site.root / ".gitmodules").is_file() and git(
+            "config", "-f", ".gitmodules", "--get-regexp", "path",
+            cwd=site.root).decode().split().count(rel):
+        git("submodule", "deinit", "-f", rel, cwd=site.root)
+        git("rm", "-q", "--cached", rel, cwd=site.root)
+        git("config", "-f", ".gitmodules", "--remove-section",
+            f"submodule.{rel}", cwd=site.root)
+        if not (site.root / ".gitmodules").read_text().strip():
+            git("rm", "-q", "-f", ".gitmodules", cwd=site.root)
+        shutil.rmtree(site.root / ".git" / "modules" / rel,
+                      ignore_errors=True)
+    shutil.rmtree(dest, ignore_errors=True)
+    commit = fetch(url, ref, dest)
+    (dest / VENDORED).write_text(json.dumps(
+        {"url": url, "commit": commit}, indent=2) + "\n")
+    print(f"vendored {url} @ {commit[:12]} into {rel}; commit it with "
+          f"git add {rel}", file=sys.stderr)
+
+
+def blocking(text):
+    """Render-blocking stylesheets and scripts in one page."""
+    count = 0
+    for tag in find_tags(text, "link", "script"):
+        if text.endswith("<noscript>", 0, tag.start):
+            continue
+        if tag.name == "link":
+            rels = (tag.get("rel") or "").lower().split()
+            if "stylesheet" in rels and tag.get("media") not in ("print",):
+                count += 1
+        elif tag.get("src") and not ({"async", "defer"} & set(tag.attrs)) \
+                and tag.get("type") != "module":
+            count += 1
+    return count
+
+
+def measure(public):
+    files = [p for p in public.rglob("*") if p.is_file()]
+    pages = {"/" + p.relative_to(public).as_posix(): blocking(p.read_text())
+             for p in files if p.suffix == ".html"}
+    return {
+        "bytes": sum(p.stat().st_size for p in files),
+        "css_files": sum(p.suffix == ".css" for p in files),
+        "js_files": sum(p.suffix in (".js", ".mjs") for p in files),
+        "blocking": pages,
+    }
+
+
+def diff(site, ref):
+    url, current = theme_source(site)
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        results = {}
+        for label, themes in (("current", None), ("new", tmp / "themes")):
+            if themes is not None:
+                commit = fetch(url, ref, themes / site.config["theme"])
+            out = load_site(site.root, tmp / f"public-{label}")
+            build(out, post=False, themes=themes)
+            results[label] = measure(out.public)
+    old, new = results["current"], results["new"]
+    print(f"theme {current[:12]} -> {commit[:12]}")
+    for key in ("bytes", "css_files", "js_files"):
+        print(f"  {key:10} {old[key]:>10} -> {new[key]:>10} "
+              f"({new[key] - old[key]:+d})")
+    for page in sorted(set(old["blocking"]) | set(new["blocking"])):
+        a, b = old["blocking"].get(page, 0), new["blocking"].get(page, 0)
+        if a or b:
+            print(f"  blocking {page}: {a} -> {b}"
+                  + ("  WORSE" if b > a else ""))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="sitebuild.theme",
+                                     description=__doc__.split("\n")[0])
+    parser.add_argument("action", choices=("vendor", "diff"))
+    parser.add_argument("ref", help="theme commit, tag or branch")
+    args = parser.parse_args(argv)
+    try:
+        site = load_site()
+        (vendor if args.action == "vendor" else diff)(site, args.ref)
+    except BuildError as e:
+        print(f"sitebuild.theme: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,252 @@
+"""Audit (and vendor) every third-party origin the pages load from.
+
+Runs offline on public/. Anything a page fetches while loading (styles,
+scripts, icons, images, frames, CSS ``url()``s) from another origin is
+listed, and the build fails unless the origin is in
+``[params.sitebuild.thirdparty] allowed``. Links a visitor has to click
+don't count.
+
+Third-party files that have a vendored copy under static/vendor/ are
+pointed at that copy instead. Fill it once, with network access, with
+``python -m sitebuild.thirdparty --vendor`` and commit the result; the
+fonts and images vendored stylesheets load come along with them.
+"""
+
+import argparse
+import json
+import mimetypes
+import re
+import sys
+import urllib.request
+from urllib.parse import urldefrag, urljoin, urlsplit
+
+from .fingerprint import CSS_IMPORT, CSS_URL
+from .markup import find_tags, render_tag, splice
+from .site import BuildError, load_site, log, sha256
+
+VENDOR = "vendor"
+FETCHED_RELS = {"stylesheet", "icon", "shortcut", "apple-touch-icon",
+                "preload", "modulepreload", "manifest", "preconnect",
+                "dns-prefetch", "prefetch", "mask-icon"}
+URL_ATTRS = {
+    "script": ("src",), "img": ("src", "srcset"), "source": ("src", "srcset"),
+    "iframe": ("src",), "video": ("src", "poster"), "audio": ("src",),
+    "embed": ("src",), "object": ("data",), "track": ("src",),
+    "input": ("src",),
+}
+
+
+def origin(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme or 'https'}://{parts.netloc}"
+
+
+def is_external(site, url):
+    parts = urlsplit(url.strip())
+    if not parts.netloc or parts.scheme not in ("", "http", "https"):
+        return False
+    return parts.netloc != urlsplit(site.config.get("baseURL", "")).netloc
+
+
+def _urls(attr, value):
+    if attr.endswith("srcset"):
+        return [c.split()[0] for c in value.split(",") if c.strip()]
+    return [value]
+
+
+def references(site, page, text):
+    """``(url, what, tag)`` for every load-time fetch in ``text``."""
+    out = []
+    for tag in find_tags(text, "link", *URL_ATTRS):
+        if tag.name == "link":
+            rels = set((tag.get("rel") or "").lower().split())
+            attrs = ("href", "imagesrcset") if rels & FETCHED_RELS else ()
+        else:
+            attrs = URL_ATTRS[tag.name]
+        for attr in attrs:
+            for url in _urls(attr, tag.get(attr) or ""):
+                out.append((url, f"<{tag.name} {attr}>", tag))
+    for m in list(CSS_URL.finditer(text)) + list(CSS_IMPORT.finditer(text)):
+        out.append((m.group(2), "inline css", None))
+    return out
+
+
+def stylesheet_references(site):
+    for path in sorted(site.public.rglob("*.css")):
+        css = path.read_text()
+        for m in list(CSS_URL.finditer(css)) + list(CSS_IMPORT.finditer(css)):
+            yield path, m.group(2)
+
+
+def vendored(site):
+    path = site.static / VENDOR / "manifest.json"
+    return json.loads(path.read_text()) if path.is_file() else {}
+
+
+def localise(text, copies):
+    """Point external URLs that have vendored copies at them."""
+    edits = []
+    for tag in find_tags(text, "link", *URL_ATTRS):
+        attrs, changed = dict(tag.attrs), False
+        for key, value in tag.attrs.items():
+            if not value or key not in ("href", "src", "srcset", "poster",
+                                        "data", "imagesrcset"):
+                continue
+            new = value
+            for url in _urls(key, value):
+                if url in copies:
+                    new = new.replace(url, copies[url])
+            if new != value:
+                attrs[key], changed = new, True
+        if changed:
+            edits.append((tag.start, tag.end, render_tag(tag.name, attrs)))
+    return splice(text, edits)
+
+
+def run(site):
+    allowed = set(site.settings("thirdparty").get("allowed", []))
+    copies = {u: "/" + p for u, p in vendored(site).items()
+              if (site.public / p).is_file()}
+    found, swapped = {}, 0
+    for page in site.pages():
+        text = page.read_text()
+        new = localise(text, copies)
+        if new != text:
+            swapped += 1
+            page.write_text(new)
+            text = new
+        for url, what, _ in references(site, page, text):
+            if is_external(site, url):
+                found.setdefault(origin(url), []).append(
+                    f"{site.url_for(page)} {what} {url}")
+    for sheet, url in stylesheet_references(site):
+        if is_external(site, url):
+            found.setdefault(origin(url), []).append(
+                f"{site.url_for(sheet)} url() {url}")
+
+    site.cache.mkdir(parents=True, exist_ok=True)
+    (site.cache / "thirdparty.json").write_text(json.dumps(found, indent=2))
+    for host, uses in sorted(found.items()):
+        status = "allowed" if host in allowed else "NOT ALLOWED"
+        log("thirdparty", f"{host} ({len(uses)} use(s), {status})")
+        for use in uses:
+            log("thirdparty", f"  {use}")
+    if swapped:
+        log("thirdparty", f"vendored copies used on {swapped} page(s)")
+    bad = sorted(set(found) - allowed)
+    if bad:
+        raise BuildError(f"unapproved third-party origin(s): "
+                         f"{', '.join(bad)}; vendor them with python -m "
+                         f"sitebuild.thirdparty --vendor or allow them in "
+                         f"[params.sitebuild.thirdparty]")
+
+
+def css_references(css, base):
+    """Absolute URLs of what ``css``, fetched from ``base``, loads.
+
+    Data URIs, fragments and references already pointing at vendored
+    copies are skipped.
+    """
+    refs = [m.group(2).strip() for m in
+            list(CSS_URL.finditer(css)) + list(CSS_IMPORT.finditer(css))]
+    return [urldefrag(urljoin(base, r))[0] for r in refs
+            if not r.startswith(("data:", "#", f"/{VENDOR}/"))]
+
+
+def rewrite_css(css, base, copies):
+    """Point the ``url()``s and ``@import``s in ``css`` at vendored copies."""
+    def sub(m):
+        ref = m.group(2).strip()
+        url, fragment = urldefrag(urljoin(base, ref))
+        local = copies.get(url)
+        if not local:
+            return m.group(0)
+        return m.group(0).replace(m.group(2),
+                                  local + (f"#{fragment}" if fragment else ""))
+    return CSS_IMPORT.sub(sub, CSS_URL.sub(sub, css))
+
+
+def _fetch(url):
+    try:
+        req = urllib.request.Request(url, headers={
+            "User-Agent": "Mozilla/5.0 (sitebuild vendor)"})
+        with urllib.request.urlopen(req, timeout=30) as resp:
+            return resp.read(), resp.headers.get_content_type()
+    except OSError as e:
+        raise BuildError(f"could not fetch {url}: {e}") from None
+
+
+def _is_css(rel):
+    return rel.endswith(".css")
+
+
+def vendor(site):
+    """Download every third-party file the pages load into static/.
+
+    Stylesheets are followed: the fonts and images their ``url()``s and
+    ``@import``s load are vendored too, and the vendored copy is
+    rewritten to use them.
+    """
+    manifest = vendored(site)
+    urls = set()
+    for page in site.pages():
+        for url, _, _ in references(site, page, page.read_text()):
+            if is_external(site, url):
+                urls.add(urljoin("https:", url))
+    for url, rel in manifest.items():
+        if _is_css(rel) and (site.static / rel).is_file():
+            urls.update(css_references((site.static / rel).read_text(), url))
+    todo = sorted(urls - set(manifest))
+    while todo:
+        url = todo.pop(0)
+        if url in manifest:
+            continue
+        data, ctype = _fetch(url)
+        parts = urlsplit(url)
+        stem = re.sub(r"[^\w.-]", "_", parts.path.rsplit("/", 1)[-1] or "index")
+        if parts.query:
+            stem = f"{stem}-{sha256(parts.query.encode())[:8]}"
+        suffix = "" if "." in stem else (mimetypes.guess_extension(ctype)
+                                         or "")
+        rel = f"{VENDOR}/{parts.netloc}/{stem}{suffix}"
+        dest = site.static / rel
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        dest.write_bytes(data)
+        manifest[url] = rel
+        print(f"vendored {url} -> static/{rel}", file=sys.stderr)
+        if _is_css(rel):
+            todo += [u for u in css_references(data.decode(errors="replace"), url)
+                     if u not in manifest and u not in todo]
+
+    copies = {u: "/" + p for u, p in manifest.items()}
+    for url, rel in manifest.items():
+        path = site.static / rel
+        if _is_css(rel) and path.is_file():
+            css = path.read_text()
+            new = rewrite_css(css, url, copies)
+            if new != css:
+                path.write_text(new)
+    path = site.static / VENDOR / "manifest.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(dict(sorted(manifest.items())), indent=2)
+                    + "\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="sitebuild.thirdparty",
+                                     description=__doc__.split("\n")[0])
+    parser.add_argument("--public", help="build output (default: public/)")
+    parser.add_argument("--vendor", action="store_true",
+                        help="download third-party files into static/vendor")
+    args = parser.parse_args(argv)
+    try:
+        site = load_site(public=args.public)
+        vendor(site) if args.vendor else run(site)
+    except BuildError as e:
+        print(f"sitebuild.thirdparty: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
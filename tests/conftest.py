@@ -0,0 +1,26 @@
+import pytest
+
+from sitebuild.site import Site
+
+
+@pytest.fixture
+def site(tmp_path):
+    """A site with an empty public/ and its own cache, under tmp_path."""
+    public = tmp_path / "public"
+    public.mkdir()
+    return Site(tmp_path, {"baseURL": "https://example.org/"},
+                public=public, cache=tmp_path / ".cache" / "sitebuild")
+
+
+@pytest.fixture
+def write(site):
+    """Write ``text`` (str or bytes) to ``rel`` under public/."""
+    def write(rel, text):
+        path = site.public / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if isinstance(text, bytes):
+            path.write_bytes(text)
+        else:
+            path.write_text(text)
+        return path
+    return write
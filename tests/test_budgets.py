@@ -0,0 +1,62 @@
+import gzip
+import json
+
+import pytest
+
+from sitebuild import budgets
+from sitebuild.site import BuildError
+
+CSS = "".join(f".c{i}{{margin:{i}px}}\n" for i in range(100))
+PAGE = ("<html><head><link rel=stylesheet href=/site.css>"
+        "<link rel=icon href=/favicon.ico></head><body>"
+        "<img src=/a.png><script src=/app.js></script></body></html>")
+
+
+@pytest.fixture
+def home(site, write):
+    write("site.css", CSS)
+    write("app.js", "console.log(1)")
+    write("a.png", b"\x89PNG" + bytes(996))
+    write("favicon.ico", bytes(500))
+    return write("index.html", PAGE)
+
+
+def expected(site):
+    """Compressed bytes of the page and what it loads, by hand."""
+    total = (site.public / "a.png").stat().st_size
+    for name in ("index.html", "site.css", "app.js"):
+        data = (site.public / name).read_bytes()
+        total += min(len(data), len(gzip.compress(data, compresslevel=9)))
+    return total
+
+
+def budget(site, **limits):
+    site.config["params"] = {"sitebuild": {"budgets": {"/": limits}}}
+
+
+def test_within_budget(site, home):
+    budget(site, compressed="10KB", requests=3, image="1KB")
+    budgets.run(site)
+    report = json.loads((site.cache / "budgets.json").read_text())["/"]
+    # The stylesheet, the image and the script; not the icon.
+    assert report["requests"] == 3
+    assert report["compressed"] == expected(site)
+    assert report["raw"] == sum((site.public / n).stat().st_size for n in
+                                ("index.html", "site.css", "app.js", "a.png"))
+    assert report["kinds"]["image"] == {"raw": 1000, "compressed": 1000}
+
+
+def test_over_budget(site, home):
+    budget(site, compressed=expected(site) - 1, requests=2)
+    with pytest.raises(BuildError) as e:
+        budgets.run(site)
+    assert f"/: compressed {expected(site)} > {expected(site) - 1}" in \
+        str(e.value)
+    assert "/: requests 3 > 2" in str(e.value)
+
+
+def test_default_budget_and_units(site, home):
+    site.config["params"] = {"sitebuild": {"budgets": {
+        "*": {"css": "0.1KB"}}}}
+    with pytest.raises(BuildError, match=r"/: css \d+ > 100$"):
+        budgets.run(site)
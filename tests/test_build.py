@@ -0,0 +1,27 @@
+import hashlib
+
+import pytest
+
+from sitebuild import build
+from sitebuild.site import BuildError
+
+NAME = "hugo_extended_0.125.7_linux-amd64.tar.gz"
+
+
+def sums(data):
+    return (f"{'0' * 64}  hugo_0.125.7_linux-amd64.tar.gz\n"
+            f"{hashlib.sha256(data).hexdigest()}  {NAME}\n")
+
+
+def test_verify_accepts_listed_digest():
+    build.verify(b"release", NAME, sums(b"release"))
+
+
+def test_verify_rejects_mismatch():
+    with pytest.raises(BuildError, match="does not match"):
+        build.verify(b"tampered", NAME, sums(b"release"))
+
+
+def test_verify_rejects_unlisted():
+    with pytest.raises(BuildError, match="not listed"):
+        build.verify(b"release", "hugo_0.1_linux-arm64.tar.gz", sums(b""))
@@ -0,0 +1,42 @@
+from sitebuild import bundle
+
+PAGE = ("<!doctype html><html><head><meta charset=utf-8></head><body>"
+        "<button onclick=fromHandler()>go</button>"
+        "<script src=/js/a.js></script><script src=/js/b.js></script>"
+        "<script async src=/js/c.js></script></body></html>")
+
+
+def test_keeps_functions_called_from_elsewhere(site, write):
+    write("js/a.js", "function helper(){return 1}\nfunction dead(){}\n")
+    write("js/b.js", "function fromHandler(){}\n"
+                     "document.body.dataset.x = 1;\n")
+    write("js/c.js", "helper();\n")
+    page = write("index.html", PAGE)
+    bundle.run(site)
+    (out,) = (site.public / "bundles").glob("*.js")
+    code = out.read_text()
+    assert "function helper" in code        # called from c.js
+    assert "function fromHandler" in code   # called from the page
+    assert "function dead" not in code
+    text = page.read_text()
+    assert text.count("<script") == 2 and "/js/c.js" in text
+
+
+def test_mixed_strictness_is_not_bundled(site, write):
+    write("js/a.js", '"use strict";\nfunction fromHandler(){}\n')
+    write("js/b.js", "x = 1;\n")
+    write("js/c.js", "")
+    page = write("index.html", PAGE)
+    bundle.run(site)
+    assert not (site.public / "bundles").exists()
+    assert page.read_text() == PAGE
+
+
+def test_strict_files_keep_the_prologue_first(site, write):
+    write("js/a.js", "'use strict';\nfunction fromHandler(){}\n")
+    write("js/b.js", '// b\n"use strict";\nlet y = 2;\n')
+    write("js/c.js", "")
+    write("index.html", PAGE)
+    bundle.run(site)
+    (out,) = (site.public / "bundles").glob("*.js")
+    assert out.read_text().startswith("'use strict';")
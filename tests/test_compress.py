@@ -0,0 +1,46 @@
+import gzip
+
+import pytest
+
+from sitebuild import compress
+
+brotli = pytest.importorskip("brotli")
+
+CSS = "".join(f".c{i}{{margin:{i}px;padding:{i}px}}\n" for i in range(200))
+
+
+def test_siblings(site, write):
+    big = write("css/site.css", CSS)
+    tiny = write("a.js", "x")
+    image = write("img/pic.png", CSS)
+    font = write("f.woff2", CSS)
+    old = write("old.js", "y")
+    write("old.js.gz", b"stale")
+
+    compress.run(site)
+
+    assert gzip.decompress(
+        (site.public / "css/site.css.gz").read_bytes()).decode() == CSS
+    assert brotli.decompress(
+        (site.public / "css/site.css.br").read_bytes()).decode() == CSS
+    assert (site.public / "css/site.css.br").stat().st_size < len(CSS)
+    # Nothing is kept that isn't smaller than the file itself, and a
+    # sibling left from an earlier build goes.
+    for path in (tiny, old):
+        for suffix in compress.SUFFIXES:
+            assert not path.with_name(path.name + suffix).exists()
+    # Formats that are already compressed aren't in the extension list.
+    for path in (image, font):
+        assert sorted(p.name for p in path.parent.iterdir()
+                      if p.stem == path.stem) == [path.name]
+    assert big.read_text() == CSS
+
+
+def test_extensions_setting(site, write):
+    site.config["params"] = {"sitebuild": {"compress": {
+        "extensions": [".txt"]}}}
+    write("a.css", CSS)
+    write("a.txt", CSS)
+    compress.run(site)
+    assert (site.public / "a.txt.br").exists()
+    assert not (site.public / "a.css.br").exists()
@@ -0,0 +1,79 @@
+import base64
+import hashlib
+
+from sitebuild import critical, fingerprint
+from sitebuild.markup import find_tags
+
+CSS = (".flex{display:flex}.unused{color:red}a:hover,.gone b{color:blue}"
+       "@media (min-width:640px){.sm-flex{display:flex}.h-36{height:9rem}}"
+       ".js-open{margin:0}.safe{padding:0}"
+       "@font-face{font-family:X;src:url(x.woff2)}")
+PAGE = ("<!doctype html><html><head><meta charset=utf-8>"
+        "<link rel=stylesheet href={href}{sri}></head>"
+        "<body class=flex><a href=/ class=h-36>home</a>"
+        "<script>el.classList.add('js-open')</script></body></html>")
+
+
+def sri(data, algo="sha384"):
+    digest = hashlib.new(algo, data).digest()
+    return f"{algo}-" + base64.b64encode(digest).decode()
+
+
+def build(site, write, name="main.css", integrity=False):
+    sheet = write(f"css/{name}", CSS)
+    attr = f' integrity="{sri(CSS.encode())}"' if integrity else ""
+    page = write("index.html", PAGE.format(href=f"/css/{name}", sri=attr))
+    site.config["params"] = {"sitebuild": {"critical": {"safelist": ["safe"]}}}
+    critical.run(site)
+    return sheet, page
+
+
+def test_prunes_unmatched_rules(site, write):
+    sheet, _ = build(site, write)
+    pruned = sheet.read_text()
+    # Matched by the page, by a script, or safelisted.
+    for kept in (".flex{", "a:hover{", ".h-36{", ".js-open{", ".safe{",
+                 "@font-face"):
+        assert kept in pruned
+    # Matched by nothing; the grouping rule keeps only its live child.
+    for gone in (".unused", ".gone b", ".sm-flex"):
+        assert gone not in pruned
+    assert "@media (min-width:640px){.h-36" in pruned
+
+
+def test_inlines_what_the_page_uses(site, write):
+    _, page = build(site, write)
+    text = page.read_text()
+    style = text[text.index("<style>"):text.index("</style>")]
+    assert ".flex{" in style and ".h-36{" in style
+    assert ".unused" not in style and ".sm-flex" not in style
+    # Relative url()s are made site-absolute once inlined.
+    assert "url(/css/x.woff2)" in style
+    assert 'rel="preload"' in text and "<noscript>" in text
+
+
+def test_integrity_matches_pruned_sheet(site, write):
+    sheet, page = build(site, write, integrity=True)
+    links = find_tags(page.read_text(), "link")
+    assert len(links) == 2      # the preload and its <noscript> fallback
+    for link in links:
+        assert link.get("integrity") == sri(sheet.read_bytes())
+
+
+def test_hugo_fingerprinted_sheet_is_renamed(site, write):
+    name = f"main.{hashlib.sha256(CSS.encode()).hexdigest()}.css"
+    sheet, page = build(site, write, name=name)
+    fingerprint.run(site)
+    assert not sheet.exists()
+    (renamed,) = (site.public / "css").glob("main.*.css")
+    assert fingerprint.is_fingerprinted(renamed)
+    assert renamed.name.count(".") == 2
+    assert f"/css/{renamed.name}" in page.read_text()
+
+
+def test_sha512_name_is_not_hashed_twice(site, write):
+    name = f"main.{hashlib.sha512(CSS.encode()).hexdigest()}.css"
+    write(f"css/{name}", CSS)
+    write("index.html", PAGE.format(href=f"/css/{name}", sri=""))
+    fingerprint.run(site)
+    assert [p.name for p in (site.public / "css").iterdir()] == [name]
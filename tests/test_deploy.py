@@ -0,0 +1,82 @@
+import json
+import subprocess
+
+import pytest
+
+from sitebuild import deploy
+
+pytestmark = pytest.mark.skipif(
+    subprocess.run(["git", "--version"], capture_output=True).returncode,
+    reason="git is not installed")
+
+
+def show(remote, path, branch="gh-pages"):
+    return subprocess.run(["git", "show", f"{branch}:{path}"], cwd=remote,
+                          capture_output=True, text=True, check=True).stdout
+
+
+def head(remote, branch="gh-pages"):
+    return subprocess.run(["git", "rev-parse", branch], cwd=remote,
+                          capture_output=True, text=True,
+                          check=True).stdout.strip()
+
+
+def files(remote, branch="gh-pages"):
+    out = subprocess.run(["git", "ls-tree", "-r", "--name-only", branch],
+                         cwd=remote, capture_output=True, text=True,
+                         check=True).stdout
+    return set(out.split())
+
+
+@pytest.fixture
+def remote(tmp_path):
+    path = tmp_path / "remote.git"
+    subprocess.run(["git", "init", "-q", "--bare", str(path)], check=True)
+    return str(path)
+
+
+@pytest.fixture
+def pub(tmp_path, monkeypatch):
+    """A relative public/ path, as the CLI would be given."""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "pub/a").mkdir(parents=True)
+    (tmp_path / "pub/index.html").write_text("<p>hi</p>")
+    (tmp_path / "pub/a/x.css").write_text("p{color:red}")
+    return tmp_path / "pub"
+
+
+def test_deploys_incrementally(pub, remote, capsys):
+    relative = pub.relative_to(pub.parent)
+
+    first = deploy.deploy(relative, remote)
+    assert first == [("A", "a/x.css"), ("A", "index.html")]
+    assert files(remote) == {"a/x.css", "index.html", ".nojekyll",
+                             deploy.MANIFEST}
+    manifest = json.loads(show(remote, deploy.MANIFEST))
+    assert manifest == deploy.snapshot(pub)
+    assert show(remote, ".nojekyll") == ""
+
+    (pub / "a/x.css").write_text("p{color:blue}")
+    assert deploy.deploy(relative, remote) == [("M", "a/x.css")]
+    assert show(remote, "a/x.css") == "p{color:blue}"
+
+    (pub / "index.html").unlink()
+    (pub / "b.txt").write_text("b")
+    capsys.readouterr()
+    assert deploy.deploy(relative, remote) == [("A", "b.txt"),
+                                               ("D", "index.html")]
+    assert "2 change(s), 1 unchanged file(s)" in capsys.readouterr().out
+    assert files(remote) == {"a/x.css", "b.txt", ".nojekyll",
+                             deploy.MANIFEST}
+    assert set(json.loads(show(remote, deploy.MANIFEST))) == {"a/x.css",
+                                                              "b.txt"}
+
+    before = head(remote)
+    assert deploy.deploy(relative, remote) == []
+    assert head(remote) == before
+
+
+def test_dry_run_pushes_nothing(pub, remote):
+    assert deploy.deploy(pub, remote, dry_run=True)
+    assert subprocess.run(["git", "branch"], cwd=remote, capture_output=True,
+                          text=True).stdout == ""
@@ -0,0 +1,48 @@
+import pytest
+
+from sitebuild import emoji
+
+
+@pytest.mark.parametrize("text", [
+    "\U0001f600", "\U0001f44d\U0001f3fd", "\U0001f1f3\U0001f1f1",
+    "\U0001f468\u200d\U0001f4bb", "\u2764\ufe0f", "\U0001f170\ufe0f",
+    "\U0001f004", "\U0001f0cf", "\U0001f19a", "\U0001faf6", "1\ufe0f\u20e3"])
+def test_emoji_are_found(text):
+    assert [seq for _, _, seq in emoji.found(f"<p>a {text} b</p>")] == [text]
+
+
+@pytest.mark.parametrize("text", [
+    "\U0001f0a1",       # playing card ace of spades
+    "\U0001f030",       # domino tile
+    "\U0001f100",       # digit zero full stop
+    "\U0001f130",       # squared latin capital letter A
+    "\U0001f170",       # negative squared A, text without U+FE0F
+    "\U0001f1e6",       # a lone regional indicator
+    "\u2764", "\u00a9", "1"])
+def test_text_symbols_are_left_alone(text):
+    assert emoji.found(f"<p>a {text} b</p>") == []
+
+
+def test_emoji_without_artwork_stay_text(site, write, tmp_path, capsys):
+    site.config["theme"] = "lynx"
+    html = "<html><body><p>hi \U0001f600</p></body></html>"
+    path = write("index.html", html)
+    emoji.run(site)
+    assert path.read_text() == html
+    assert "no artwork for 1f600" in capsys.readouterr().err
+
+
+def test_emoji_use_the_sprite(site, write, tmp_path):
+    site.config["theme"] = "lynx"
+    (tmp_path / "assets/emoji").mkdir(parents=True)
+    (tmp_path / "assets/emoji/1f600.svg").write_text(
+        '<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 36 36">'
+        '<circle r="18"/></svg>')
+    path = write("index.html", "<html><body><p>hi \U0001f600 \U0001f600 "
+                               "\U0001f680 \U0001f0a1</p></body></html>")
+    emoji.run(site)
+    text = path.read_text()
+    assert text.count('<symbol id="emoji-1f600"') == 1
+    assert text.count('href="#emoji-1f600"') == 2
+    # No artwork for the rocket: it stays text, as do the cards.
+    assert "\U0001f680" in text and "\U0001f0a1" in text
@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+from sitebuild import favicon
+
+Image = pytest.importorskip("PIL.Image")
+
+PAGE = ("<!doctype html><html><head><meta charset=utf-8>{head}<title>t"
+        "</title></head><body></body></html>")
+
+
+def portrait(site, write, side):
+    site.config["params"] = {"author": {"name": "A", "image": "me.jpeg"},
+                             "sitebuild": {"favicon": {
+                                 "theme_color": "#123456"}}}
+    im = Image.new("RGB", (side + 40, side))
+    im.putdata([(x % 256, y % 256, (x * y) % 256)
+                for y in range(side) for x in range(side + 40)])
+    path = site.public / "me.jpeg"
+    im.save(path, "JPEG")
+    return path
+
+
+def test_icon_set(site, write):
+    portrait(site, write, 460)
+    page = write("index.html", PAGE.format(head=""))
+    favicon.run(site)
+
+    with Image.open(site.public / "favicon.ico") as ico:
+        assert sorted(ico.info["sizes"]) == [(16, 16), (32, 32), (48, 48)]
+    with Image.open(site.public / "apple-touch-icon.png") as touch:
+        assert touch.size == (180, 180)
+    # 512 px can't be filled from a 460 px source, so it is left out.
+    assert not list(site.public.glob("icon-4*.png"))
+    assert not (site.public / "icon-512.png").exists()
+    manifest = json.loads((site.public / favicon.MANIFEST).read_text())
+    assert manifest["icons"] == [{"src": "/icon-192.png", "sizes": "192x192",
+                                  "type": "image/png"}]
+    assert manifest["theme_color"] == "#123456"
+
+    head = page.read_text()
+    assert '<link rel="icon" href="/favicon.ico" sizes="32x32">' in head
+    assert '<link rel="apple-touch-icon" href="/apple-touch-icon.png">' in head
+    assert f'<link rel="manifest" href="/{favicon.MANIFEST}">' in head
+    assert '<meta name="theme-color" content="#123456">' in head
+    assert head.index("<link") > head.index("<meta charset=utf-8>")
+
+
+def test_small_source_is_not_scaled_up(site, write):
+    portrait(site, write, 40)
+    write("index.html", PAGE.format(head=""))
+    favicon.run(site)
+    with Image.open(site.public / "favicon.ico") as ico:
+        assert sorted(ico.info["sizes"]) == [(16, 16), (32, 32)]
+    with Image.open(site.public / "apple-touch-icon.png") as touch:
+        assert touch.size == (40, 40)
+    manifest = json.loads((site.public / favicon.MANIFEST).read_text())
+    assert [i["sizes"] for i in manifest["icons"]] == ["40x40"]
+
+
+def test_theme_tags_win(site, write):
+    portrait(site, write, 64)
+    page = write("index.html", PAGE.format(
+        head='<link rel=icon href=/theme.ico>'))
+    favicon.run(site)
+    text = page.read_text()
+    assert "/favicon.ico" not in text
+    assert "apple-touch-icon" in text
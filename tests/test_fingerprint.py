@@ -0,0 +1,50 @@
+import shutil
+
+from sitebuild.pipeline import STAGES, run_stages
+from sitebuild.site import ROOT, Site
+
+CONFIG = {
+    "baseURL": "https://example.org/",
+    "title": "Example",
+    "theme": "lynx",
+    "params": {"author": {"name": "Example", "image": "prof.jpeg"},
+               "sitebuild": {"budgets": {"*": {"compressed": "1MB"}}}},
+}
+PAGE = ("<!doctype html><html lang=en><head><meta charset=utf-8>"
+        "<title>Example</title><link rel=stylesheet href=/css/main.css>"
+        "<script src=/js/app.js></script></head><body class=flex>"
+        "<img class=avatar src=/prof.jpeg alt=me><p>hi</p></body></html>")
+
+
+def source(public):
+    """What Hugo would have written."""
+    (public / "css").mkdir(parents=True)
+    (public / "js").mkdir()
+    shutil.copy(ROOT / "static" / "prof.jpeg", public / "prof.jpeg")
+    (public / "css" / "main.css").write_text(
+        ".flex{display:flex}.avatar{width:9rem;background:url(../prof.jpeg)}")
+    (public / "js" / "app.js").write_text("document.body.dataset.js = 1;\n")
+    (public / "index.html").write_text(PAGE)
+
+
+def build(root):
+    site = Site(root, CONFIG)
+    shutil.rmtree(site.public, ignore_errors=True)
+    source(site.public)
+    run_stages(site, list(STAGES), jobs=2)
+    return site
+
+
+def outputs(site):
+    manifest = (site.public / "asset-manifest.json").read_bytes()
+    names = sorted(p.relative_to(site.public).as_posix()
+                   for p in site.public.rglob("*") if p.is_file())
+    return manifest, names
+
+
+def test_rebuilds_are_identical(tmp_path):
+    first = outputs(build(tmp_path / "a"))
+    # A separate checkout, and a rebuild that replays cached stages.
+    assert outputs(build(tmp_path / "b")) == first
+    assert outputs(build(tmp_path / "a")) == first
+    assert b"/css/main.css" in first[0]
@@ -0,0 +1,42 @@
+import shutil
+
+import pytest
+from PIL import Image
+
+from sitebuild import formats, images
+from sitebuild.site import ROOT, BuildError
+
+
+@pytest.fixture
+def portrait(site, tmp_path):
+    """static/prof.jpeg, as Hugo would have copied it, with variants."""
+    site.config["params"] = {"author": {"image": "prof.jpeg"},
+                             "sitebuild": {"images": {"widths": [96, 192]}}}
+    site.static.mkdir()
+    for folder in (site.static, site.public):
+        shutil.copy(ROOT / "static" / "prof.jpeg", folder / "prof.jpeg")
+    (site.public / "index.html").write_text("<body><img src=/prof.jpeg>")
+    images.run(site)
+    return site.public / "prof.jpeg"
+
+
+def test_modern_formats_per_width(site, portrait):
+    formats.run(site)
+    for path, width in images.variants_of(site, portrait):
+        for suffix, (fmt, _, _) in formats.FORMATS.items():
+            alt = path.with_suffix(suffix)
+            with Image.open(alt) as im:
+                assert im.format == fmt and im.width == width
+            assert alt.stat().st_size < path.stat().st_size
+
+    formats.picture(site)
+    text = (site.public / "index.html").read_text()
+    assert text.count("<source") == len(formats.FORMATS)
+    assert 'type="image/avif" srcset="/prof-96w.avif 96w' in text
+
+
+def test_encoder_failure(site, portrait, monkeypatch):
+    monkeypatch.setitem(formats.FORMATS, ".nope", ("NOPE", "image/nope", {}))
+    with pytest.raises(BuildError, match="NOPE encoding unavailable") as e:
+        formats.run(site)
+    assert e.value.__cause__ is not None
@@ -0,0 +1,53 @@
+from sitebuild import icons
+
+GITHUB = ('<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 24 24" '
+          'width="24" height="24"><path d="M1 1h22v22H1z"/></svg>')
+
+
+def page(*links, head=""):
+    return (f"<html><head>{head}</head><body>" + "".join(links)
+            + "</body></html>")
+
+
+def setup(site, tmp_path):
+    site.config["theme"] = "lynx"
+    links = [{"github": "https://github.com/u"},
+             {"mail": "mailto:u@example.org"}]
+    site.config["params"] = {"author": {"links": links}}
+    (tmp_path / "assets/icons").mkdir(parents=True)
+    (tmp_path / "assets/icons/mail.svg").write_text(GITHUB.replace(
+        "M1 1h22v22H1z", "M2 4h20v16H2z"))
+
+
+def test_icon_drawn_once_stays_inline(site, write, tmp_path):
+    setup(site, tmp_path)
+    html = page(f'<a href="https://github.com/u">{GITHUB}</a>')
+    path = write("index.html", html)
+    icons.run(site)
+    assert path.read_text() == html
+
+
+def test_repeated_icon_goes_in_the_sprite(site, write, tmp_path):
+    setup(site, tmp_path)
+    link = f'<a href="https://github.com/u">{GITHUB}</a>'
+    path = write("index.html", page(link, link))
+    icons.run(site)
+    text = path.read_text()
+    assert text.count("<symbol") == 1
+    assert text.count('<use href="#icon-github">') == 2
+    assert text.count("M1 1h22v22H1z") == 1
+
+
+def test_icon_font_becomes_inline_svg(site, write, tmp_path):
+    setup(site, tmp_path)
+    path = write("index.html", page(
+        '<a href="mailto:u@example.org"><i class="fa fa-envelope"></i></a>',
+        head='<link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/'
+             'libs/font-awesome/6.0.0/css/all.min.css">'
+             '<link rel="stylesheet" href="/css/icons.css">'))
+    icons.run(site)
+    text = path.read_text()
+    assert "<i " not in text and "<symbol" not in text
+    assert 'viewBox="0 0 24 24"' in text and "M2 4h20v16H2z" in text
+    assert "font-awesome" not in text
+    assert 'href="/css/icons.css"' in text
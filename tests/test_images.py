@@ -0,0 +1,76 @@
+import shutil
+
+import pytest
+from PIL import Image
+
+from sitebuild import images
+from sitebuild.pipeline import run_stages
+from sitebuild.site import ROOT
+
+PAGE = ("<!doctype html><html><head><meta charset=utf-8></head><body>"
+        "<img class=avatar src=/prof.jpeg alt=me><img src=/other.png>"
+        "</body></html>")
+
+
+def hugo_output(site):
+    shutil.rmtree(site.public, ignore_errors=True)
+    site.public.mkdir()
+    shutil.copy(ROOT / "static" / "prof.jpeg", site.public / "prof.jpeg")
+    (site.public / "index.html").write_text(PAGE)
+    return site.public / "prof.jpeg"
+
+
+@pytest.fixture
+def portrait(site):
+    """static/prof.jpeg (460x460) as the author image, on one page."""
+    site.config["params"] = {"author": {"image": "prof.jpeg"}}
+    site.config["theme"] = "lynx"
+    return hugo_output(site)
+
+
+def test_variant_widths(site, portrait):
+    site.config["params"]["sitebuild"] = {"images": {"widths": [96, 192]}}
+    images.run(site)
+    variants = images.responsive(site)["/prof.jpeg"]["variants"]
+    assert [v["width"] for v in variants] == [96, 192, 460]
+    original = portrait.stat().st_size
+    for v in variants[:-1]:
+        path = site.public / v["url"].lstrip("/")
+        with Image.open(path) as im:
+            assert im.size == (v["width"], v["height"]) == (v["width"],) * 2
+            assert im.format == "JPEG"
+        assert v["bytes"] == path.stat().st_size < original
+
+
+def test_never_upscales(site, portrait):
+    site.config["params"]["sitebuild"] = {
+        "images": {"widths": [192, 460, 800]}}
+    images.run(site)
+    variants = images.responsive(site)["/prof.jpeg"]["variants"]
+    assert [v["width"] for v in variants] == [192, 460]
+    assert not list(site.public.glob("prof-460w.*"))
+    assert not list(site.public.glob("prof-800w.*"))
+
+
+def test_srcset_markup(site, portrait):
+    images.run(site)
+    images.rewrite(site)
+    text = (site.public / "index.html").read_text()
+    assert ('srcset="/prof-96w.jpeg 96w, /prof-192w.jpeg 192w, '
+            '/prof-384w.jpeg 384w, /prof.jpeg 460w" sizes="144px"') in text
+    assert "<img src=/other.png>" in text     # only the portrait
+
+
+def test_cache_hit_on_unchanged_source(site, portrait):
+    stages = ["images", "srcset"]
+    assert not run_stages(site, stages)["images"]["cached"]
+    encoded = (site.public / "prof-96w.jpeg").read_bytes()
+
+    hugo_output(site)
+    assert run_stages(site, stages)["images"]["cached"]
+    assert (site.public / "prof-96w.jpeg").read_bytes() == encoded
+
+    hugo_output(site)
+    with Image.open(portrait) as im:
+        im.transpose(Image.Transpose.FLIP_LEFT_RIGHT).save(portrait)
+    assert not run_stages(site, stages)["images"]["cached"]
@@ -0,0 +1,61 @@
+import io
+
+import pytest
+
+from sitebuild import lazy
+from sitebuild.markup import find_tags
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def image(write, name, mode="RGB"):
+    buf = io.BytesIO()
+    Image.new(mode, (40, 30), "red").save(buf, "PNG")
+    write(name, buf.getvalue())
+
+
+def imgs(path):
+    return {t.get("src"): t.attrs for t in find_tags(path.read_text(), "img")}
+
+
+@pytest.fixture
+def pics(site, write):
+    site.config["params"] = {"author": {"image": "me.png"}}
+    for name in ("me.png", "a.png", "b.png"):
+        image(write, name)
+    image(write, "clear.png", "RGBA")
+
+
+def test_portrait_stays_eager(site, write, pics):
+    page = write("index.html", "<body><img src=/a.png><img src=/me.png "
+                               "loading=lazy><img src=/b.png "
+                               "style=\"color:red\"><img src=/clear.png>"
+                               "</body>")
+    lazy.run(site)
+    tags = imgs(page)
+    assert "loading" not in tags["/me.png"]
+    assert tags["/me.png"]["fetchpriority"] == "high"
+    for src in ("/a.png", "/b.png", "/clear.png"):
+        assert tags[src]["loading"] == "lazy"
+        assert tags[src]["decoding"] == "async"
+    assert tags["/b.png"]["style"].startswith(
+        "color:red;background:url(data:image/webp;base64,")
+    assert "style" not in tags["/clear.png"]
+
+
+def test_first_image_is_eager_without_the_portrait(site, write, pics):
+    page = write("posts/p/index.html", "<body><img src=/a.png>"
+                                       "<img src=/b.png></body>")
+    lazy.run(site)
+    tags = imgs(page)
+    assert "loading" not in tags["/a.png"]
+    assert tags["/a.png"]["fetchpriority"] == "high"
+    assert tags["/b.png"]["loading"] == "lazy"
+    assert tags["/b.png"]["decoding"] == "async"
+
+
+def test_explicit_eager_is_kept(site, write, pics):
+    page = write("index.html", "<body><img src=/me.png>"
+                               "<img src=/a.png loading=eager></body>")
+    lazy.run(site)
+    assert imgs(page)["/a.png"]["loading"] == "eager"
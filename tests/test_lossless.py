@@ -0,0 +1,72 @@
+import io
+import shutil
+
+import pytest
+
+from sitebuild import lossless
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def encode(fmt, **extra):
+    im = Image.new("RGB", (64, 48))
+    im.putdata([(x * 4, y * 5, (x ^ y) * 3) for y in range(48)
+                for x in range(64)])
+    buf = io.BytesIO()
+    im.save(buf, fmt, **extra)
+    return buf.getvalue()
+
+
+def pixels(data):
+    with Image.open(io.BytesIO(data)) as im:
+        return im.size, im.convert("RGBA").tobytes()
+
+
+def fake_jpegtran(tmp_path, script):
+    path = tmp_path / "jpegtran"
+    path.write_text(f"#!/bin/sh\n{script}\n")
+    path.chmod(0o755)
+    return str(path)
+
+
+@pytest.mark.skipif(not shutil.which("jpegtran"),
+                    reason="jpegtran is not installed")
+def test_jpegtran_output_is_pixel_identical(site, write):
+    data = encode("JPEG", quality=90, comment=b"x" * 2000)
+    path = write("a.jpg", data)
+    lossless.run(site)
+    new = path.read_bytes()
+    assert len(new) < len(data)
+    assert pixels(new) == pixels(data)
+
+
+def test_png_output_is_pixel_identical(site, write):
+    data = encode("PNG", compress_level=0)
+    path = write("a.png", data)
+    lossless.run(site)
+    new = path.read_bytes()
+    assert len(new) < len(data)
+    assert pixels(new) == pixels(data)
+
+
+def test_larger_output_is_not_kept(tmp_path):
+    data = encode("JPEG")
+    grows = fake_jpegtran(tmp_path, "cat; printf padding")
+    assert lossless.reencode(data, ".jpg", grows) is data
+
+
+def test_different_pixels_are_not_kept(tmp_path):
+    data = encode("JPEG", quality=95)
+    other = tmp_path / "other.jpg"
+    other.write_bytes(encode("JPEG", quality=20))
+    lossy = fake_jpegtran(tmp_path, f"cat >/dev/null; cat {other}")
+    assert lossless.reencode(data, ".jpg", lossy) is data
+
+
+def test_missing_jpegtran(site, write, monkeypatch, capsys):
+    monkeypatch.setattr(lossless.shutil, "which", lambda name: None)
+    data = encode("JPEG", comment=b"x" * 2000)
+    path = write("a.jpg", data)
+    lossless.run(site)
+    assert path.read_bytes() == data
+    assert "jpegtran not found" in capsys.readouterr().err
@@ -0,0 +1,53 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from sitebuild import optimize
+from sitebuild.markup import find_tags
+
+
+def page_with(site, write, img):
+    Image.new("RGB", (460, 230)).save(site.public / "prof.png")
+    return write("index.html", f"<body>{img}</body>")
+
+
+def test_size_from_sizes(site, write):
+    page = page_with(site, write, '<img src=/prof.png srcset="/prof.png '
+                                  '460w" sizes=144px>')
+    text = optimize.image_sizes(site, page, page.read_text())
+    img = find_tags(text, "img")[0]
+    assert (img.get("width"), img.get("height")) == ("144", "72")
+
+
+def test_intrinsic_without_srcset(site, write):
+    page = page_with(site, write, "<img src=/prof.png>")
+    text = optimize.image_sizes(site, page, page.read_text())
+    img = find_tags(text, "img")[0]
+    assert (img.get("width"), img.get("height")) == ("460", "230")
+
+
+def test_viewport_sizes_left_alone(site, write):
+    img = '<img src=/prof.png srcset="/prof.png 460w" sizes="50vw">'
+    page = page_with(site, write, img)
+    assert optimize.image_sizes(site, page, page.read_text()).count(img) == 1
+
+
+def test_minified_page(site, write):
+    page = page_with(site, write, '<img src=/prof.png sizes="144px" '
+                                  'srcset="/prof.png 460w">'
+                                  '<svg viewBox="0 0 8 8"><linearGradient '
+                                  'gradientUnits="userSpaceOnUse"/>'
+                                  '<path d="M0 0h8"/></svg>')
+    optimize.optimize(site, page)
+    text = page.read_text()
+    assert "<img src=/prof.png sizes=144px" in text
+    assert "width=144 height=72>" in text
+    assert '<svg viewBox="0 0 8 8"><linearGradient ' in text
+    assert '<linearGradient gradientUnits="userSpaceOnUse"/>' in text
+
+
+def test_pool_runs_from_a_thread(site, write):
+    page_with(site, write, "<p>a</p><p>b</p>")
+    with ThreadPoolExecutor(1) as threads:
+        threads.submit(optimize.run, site).result()
+    assert "<p>a<p>b" in (site.public / "index.html").read_text()
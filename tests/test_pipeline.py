@@ -0,0 +1,20 @@
+from sitebuild.pipeline import run_stages
+
+
+def test_cache_keeps_only_latest_entries(site, write):
+    site.config["theme"] = "lynx"
+    page = write("index.html", "<html><body><p>one</p></body></html>")
+    run_stages(site, ["html"])
+    store = site.cache / "stages"
+    first = sorted(p.name for p in store.iterdir())
+    assert len([n for n in first if n.startswith("html-")]) == 1
+
+    page.write_text("<html><body><p>two</p></body></html>")
+    run_stages(site, ["html"])
+    second = sorted(p.name for p in store.iterdir())
+    assert len(second) == len(first) and not set(first) & set(second)
+
+    # A partial run leaves other stages' entries alone.
+    (store / "budgets-old.json").write_text("{}")
+    run_stages(site, ["html"])
+    assert (store / "budgets-old.json").is_file()
@@ -0,0 +1,39 @@
+from sitebuild import preload
+
+PAGE = ("<!doctype html><html><head><meta charset=utf-8><title>t</title>"
+        "</head><body><picture><source type=image/avif srcset=\"/me-96w.avif "
+        "96w, /me-192w.avif 192w, /me-384w.avif 384w\" sizes=144px>"
+        "<img src=/me.jpeg alt=me></picture>"
+        "<img src=/later.png loading=lazy></body></html>")
+
+
+def test_lcp_image_hint(site, write):
+    for name in ("me-96w.avif", "me-192w.avif", "me-384w.avif", "me.jpeg",
+                 "later.png"):
+        write(name, b"x")
+    page = write("index.html", PAGE)
+    preload.run(site)
+
+    text = page.read_text()
+    tag = ('<link rel="preload" as="image" imagesrcset="/me-96w.avif 96w, '
+           '/me-192w.avif 192w, /me-384w.avif 384w" imagesizes="144px" '
+           'type="image/avif" fetchpriority="high">')
+    assert text.index(tag) > text.index("<meta charset=utf-8>")
+    assert text.count('rel="preload"') == 1
+
+    # The Link target is what a 2x screen picks for 144px, not the
+    # smallest candidate.
+    assert (site.public / preload.HEADERS).read_text() == (
+        "/\n  Link: </me-384w.avif>; rel=\"preload\"; as=\"image\"; "
+        "imagesrcset=\"/me-96w.avif 96w, /me-192w.avif 192w, "
+        "/me-384w.avif 384w\"; imagesizes=\"144px\"; type=\"image/avif\"\n")
+
+    # Running again adds nothing.
+    preload.run(site)
+    assert page.read_text() == text
+
+
+def test_no_headers_file_without_hints(site, write):
+    write("index.html", "<html><head></head><body><p>text</body></html>")
+    preload.run(site)
+    assert not (site.public / preload.HEADERS).exists()
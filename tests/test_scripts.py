@@ -0,0 +1,52 @@
+import pytest
+
+from sitebuild import js, scripts
+
+
+@pytest.mark.parametrize("code", [
+    "window.onload=init",
+    "init",
+    "document.addEventListener('click', function (e) { e.preventDefault() })",
+    "(function () { var a = 1; if (a) { var b = 2 } function g() {} })()",
+    "items.forEach((item, i) => { item.n = i; i = 0 })",
+    "if (x) { let y = 1 }",
+])
+def test_module_safe(code):
+    assert js.module_safe(code)
+
+
+@pytest.mark.parametrize("code", [
+    "var x = 1",
+    "if(1){var t=1}",
+    "for(var i=0;;){}",
+    "{function g(){}}",
+    "function f() {}",
+    "let x = 1",
+    "counter++",
+    "(function () { missing = 1 })()",
+    "this.x = 1",
+    "z = 010",
+])
+def test_module_unsafe(code):
+    assert not js.module_safe(code)
+
+
+def test_audit_defers(site, write):
+    write("js/app.js", "document.body.dataset.ready = 1;")
+    page = write("index.html",
+                 "<html><head><script src=/js/app.js></script></head>"
+                 "<body><p>hi<script>window.onload=init</script></body>")
+    found, edits = scripts.audit(site, page, page.read_text(), set())
+    assert [s["loading"] for s in found] == ["defer", "module"]
+    assert len(edits) == 2
+
+
+def test_audit_keeps_order(site, write):
+    write("js/app.js", "document.body.dataset.ready = 1;")
+    page = write("index.html",
+                 "<html><head><script src=/js/app.js></script></head>"
+                 "<body><script>if(1){var t=1}</script></body>")
+    found, edits = scripts.audit(site, page, page.read_text(), set())
+    # The inline script stays classic, so the one before it can't defer.
+    assert [s["loading"] for s in found] == ["render", "parser"]
+    assert edits == []
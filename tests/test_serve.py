@@ -0,0 +1,71 @@
+import http.client
+import threading
+
+import pytest
+
+from sitebuild import serve
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip, deflate, br", "br"),
+    ("gzip", "gzip"),
+    ("gzip;q=0, identity", None),
+    ("br;q=0.5, gzip;q=0.8", "gzip"),
+    ("*", "br"),
+    ("*;q=0, gzip", "gzip"),
+    ("", None),
+])
+def test_choose_encoding(header, expected):
+    assert serve.choose_encoding(header, ["br", "gzip"]) == expected
+
+
+@pytest.fixture
+def server(site, write):
+    write("index.html", "<p>home")
+    write("about/index.html", "<p>about")
+    write("about/index.html.gz", b"gz")
+    server = serve.make_server(site.public, quiet=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield http.client.HTTPConnection("127.0.0.1", server.server_port)
+    server.shutdown()
+
+
+def test_keep_alive_redirect_and_encoding(server):
+    server.request("GET", "/about?x=1")
+    res = server.getresponse()
+    res.read()
+    assert res.status == 301 and res.getheader("Location") == "/about/?x=1"
+    assert res.version == 11
+
+    # The same connection is reused.
+    server.request("GET", "/about/", headers={
+        "Accept-Encoding": "gzip;q=0, identity"})
+    res = server.getresponse()
+    assert res.status == 200 and res.getheader("Content-Encoding") is None
+    assert res.read() == b"<p>about"
+
+    server.request("GET", "/about/", headers={"Accept-Encoding": "gzip"})
+    res = server.getresponse()
+    assert res.getheader("Content-Encoding") == "gzip" and res.read() == b"gz"
+
+
+def test_files_are_hashed_once(site, write, monkeypatch):
+    data = b"body{}"
+    name = f"app.{serve.sha256(data)[:10]}.css"
+    write(name, data)
+    calls = []
+    real = serve.is_fingerprinted
+    monkeypatch.setattr(serve, "is_fingerprinted",
+                        lambda *a: calls.append(a) or real(*a))
+    server = serve.make_server(site.public, quiet=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    conn = http.client.HTTPConnection("127.0.0.1", server.server_port)
+    try:
+        for _ in range(3):
+            conn.request("GET", f"/{name}")
+            res = conn.getresponse()
+            res.read()
+            assert res.getheader("Cache-Control") == serve.IMMUTABLE
+    finally:
+        server.shutdown()
+    assert len(calls) == 1
@@ -0,0 +1,40 @@
+from sitebuild import fingerprint, sw
+
+PAGE = ("<!doctype html><html><head><meta charset=utf-8></head><body>"
+        "<picture><source type=image/avif srcset=\"/prof-96w.avif 96w, "
+        "/prof.avif 460w\" sizes=64px><source type=image/webp srcset=\""
+        "/prof-96w.webp 96w, /prof.webp 460w\" sizes=64px>"
+        "<img src=/prof.jpeg srcset=\"/prof-96w.jpeg 96w, /prof.jpeg 460w\" "
+        "sizes=64px alt=me></picture>{script}</body></html>")
+NAMES = [f"prof{w}.{ext}" for w in ("", "-96w")
+         for ext in ("jpeg", "avif", "webp")]
+
+
+def home(site, write, script=""):
+    site.config["params"] = {"author": {"image": "prof.jpeg"}}
+    for name in NAMES:
+        write(name, b"x" + name.encode())
+    return write("index.html", PAGE.format(script=script))
+
+
+def test_precaches_every_format_the_picture_offers(site, write):
+    home(site, write)
+    urls = [u for u, _ in sw.precache(site)]
+    # 64px picks 96w at 1x and 460w at 2x, in whichever format the
+    # browser supports first.
+    assert sorted(urls) == sorted(["/"] + ["/" + n for n in NAMES])
+
+
+def test_register_once(site, write):
+    page = home(site, write, "<script>const serviceWorker = 1</script>")
+    sw.register(page)
+    sw.register(page)
+    assert page.read_text().count(sw.REGISTER) == 1
+
+
+def test_worker_keeps_its_url(site, write):
+    home(site, write)
+    sw.run(site)
+    fingerprint.run(site)
+    assert (site.public / "sw.js").is_file()
+    assert "/sw.js" not in (site.public / "asset-manifest.json").read_text()
@@ -0,0 +1,55 @@
+import json
+
+from sitebuild import telemetry
+
+# Hugo's --templateMetrics --templateMetricsHints table, columns trimmed.
+METRICS = """\
+  cumulative  average  maximum  cache  percent  cached  total
+    duration duration duration    pot   cached   count  count  template
+  ---------- -------- -------- ------ -------- ------- ------  --------
+       1.5ms    750µs    1.2ms      0        0       0      2  baseof.html
+"""
+
+
+def build(site, write, monkeypatch):
+    monkeypatch.setenv("GITHUB_SHA", "0123456789abcdef")
+    monkeypatch.setenv("GITHUB_ACTIONS", "true")
+    write("index.html", "<p>hi")
+    write("index.html.gz", b"x" * 3)
+    write("site.css", "p{}")
+    stages = {"html": {"start": 0.5, "seconds": 0.25, "cached": False},
+              "sw": {"start": 0.1, "seconds": 0.0, "cached": True}}
+    return telemetry.record(site, 1.0, METRICS, stages)
+
+
+def test_record(site, write, monkeypatch):
+    entry = build(site, write, monkeypatch)
+    assert entry["commit"] == "0123456789ab" and entry["ci"] is True
+    assert entry["seconds"] == 1.75                 # hugo + stage wall time
+    assert entry["hugo"]["templates"] == [{
+        "template": "baseof.html", "cumulative_ms": 1.5,
+        "average_ms": 0.75, "maximum_ms": 1.2, "count": 2,
+        "cache_potential": 0, "percent_cached": 0, "cached": 0}]
+    assert (entry["pages"], entry["files"]) == (1, 3)
+    assert entry["content_types"] == {"gzip": 3, "text/css": 3,
+                                      "text/html": 5}
+    assert entry["bytes"] == 11
+
+
+def test_append_and_compare(site, write, monkeypatch, tmp_path, capsys):
+    history = tmp_path / "history" / "telemetry.jsonl"
+    entry = build(site, write, monkeypatch)
+    telemetry.append(entry, history)
+    telemetry.append(entry, history)
+    lines = history.read_text().splitlines()
+    assert len(lines) == 2 and json.loads(lines[1]) == entry
+    assert telemetry.load(history) == [entry, entry]
+
+    slower = json.loads(json.dumps(entry))
+    slower["stages"]["html"]["seconds"] = 0.5
+    telemetry.append(slower, history)
+    assert telemetry.main(["--history", str(history)]) == 1
+    assert "regressed: stage html" in capsys.readouterr().err
+    # Getting faster again is not a regression.
+    telemetry.append(entry, history)
+    assert telemetry.main(["--history", str(history), "-n", "1"]) == 0
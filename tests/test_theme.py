@@ -0,0 +1,81 @@
+import json
+import subprocess
+
+import pytest
+
+from sitebuild import theme
+from sitebuild.site import Site
+
+pytestmark = pytest.mark.skipif(
+    subprocess.run(["git", "--version"], capture_output=True).returncode,
+    reason="git is not installed")
+
+
+def git(*args, cwd):
+    return subprocess.run(
+        ["git", "-c", "user.name=t", "-c", "user.email=t@example.org",
+         "-c", "protocol.file.allow=always", *args], cwd=cwd, check=True,
+        capture_output=True, text=True).stdout.strip()
+
+
+@pytest.fixture
+def upstream(tmp_path):
+    """A theme repository with two commits; returns (path, commits)."""
+    repo = tmp_path / "lynx"
+    (repo / "layouts").mkdir(parents=True)
+    git("init", "-q", cwd=repo)
+    commits = []
+    for version in ("one", "two"):
+        (repo / "layouts" / "index.html").write_text(version)
+        git("add", "-A", cwd=repo)
+        git("commit", "-q", "-m", version, cwd=repo)
+        commits.append(git("rev-parse", "HEAD", cwd=repo))
+    return repo, commits
+
+
+@pytest.fixture
+def site(tmp_path, upstream):
+    """A site repository with the theme as a submodule at its first
+    commit."""
+    root = tmp_path / "site"
+    root.mkdir()
+    git("init", "-q", cwd=root)
+    git("submodule", "add", "-q", str(upstream[0]), "themes/lynx", cwd=root)
+    git("checkout", "-q", upstream[1][0], cwd=root / "themes" / "lynx")
+    git("commit", "-q", "-am", "theme", cwd=root)
+    return Site(root, {"theme": "lynx"})
+
+
+def test_source_from_submodule(site, upstream):
+    assert theme.theme_source(site) == (str(upstream[0]), upstream[1][0])
+
+
+def test_vendor_replaces_the_submodule(site, upstream):
+    theme.vendor(site, upstream[1][1])
+    dest = site.root / "themes" / "lynx"
+    assert (dest / "layouts" / "index.html").read_text() == "two"
+    assert not (dest / ".git").exists()
+    assert not (site.root / ".gitmodules").exists()
+    assert json.loads((dest / theme.VENDORED).read_text()) == {
+        "url": str(upstream[0]), "commit": upstream[1][1]}
+    # Once vendored, the source comes from the record, and vendoring
+    # again moves to another commit.
+    assert theme.theme_source(site) == (str(upstream[0]), upstream[1][1])
+    theme.vendor(site, upstream[1][0])
+    assert (dest / "layouts" / "index.html").read_text() == "one"
+
+
+def test_blocking_resources(tmp_path):
+    public = tmp_path / "public"
+    public.mkdir()
+    (public / "index.html").write_text(
+        "<link rel=stylesheet href=/a.css>"
+        "<link rel=stylesheet href=/p.css media=print>"
+        "<noscript><link rel=stylesheet href=/n.css></noscript>"
+        "<script src=/a.js></script><script defer src=/b.js></script>"
+        "<script type=module src=/c.js></script><script>inline()</script>")
+    (public / "a.css").write_text("p{}")
+    (public / "a.js").write_text("")
+    assert theme.measure(public) == {
+        "bytes": (public / "index.html").stat().st_size + 3,
+        "css_files": 1, "js_files": 1, "blocking": {"/index.html": 2}}
@@ -0,0 +1,63 @@
+import json
+
+from sitebuild import thirdparty
+
+SHEET = """@import "more.css";
+@font-face { src: url(https://fonts.gstatic.com/s/inter.woff2) format("woff2"),
+                  url('../fonts/inter.woff') format("woff"); }
+body { background: url(data:image/gif;base64,R0lGOD) }
+.icon { mask: url("img/icon.svg#a") }
+"""
+FILES = {
+    "https://cdn.example.com/lib/css/site.css": (SHEET.encode(), "text/css"),
+    "https://cdn.example.com/lib/css/more.css":
+        (b"a { background: url(bg.png) }", "text/css"),
+    "https://fonts.gstatic.com/s/inter.woff2": (b"wOF2", "font/woff2"),
+    "https://cdn.example.com/lib/fonts/inter.woff": (b"wOFF", "font/woff"),
+    "https://cdn.example.com/lib/css/img/icon.svg": (b"<svg/>",
+                                                      "image/svg+xml"),
+    "https://cdn.example.com/lib/css/bg.png": (b"\x89PNG", "image/png"),
+}
+
+
+def test_css_references_resolve_against_the_sheet():
+    refs = thirdparty.css_references(SHEET, "https://cdn.example.com/lib/css/"
+                                            "site.css")
+    assert sorted(refs) == sorted([
+        "https://cdn.example.com/lib/css/more.css",
+        "https://fonts.gstatic.com/s/inter.woff2",
+        "https://cdn.example.com/lib/fonts/inter.woff",
+        "https://cdn.example.com/lib/css/img/icon.svg"])
+
+
+def test_vendor_follows_stylesheets(site, write, monkeypatch):
+    fetched = []
+
+    def fetch(url):
+        fetched.append(url)
+        return FILES[url]
+    monkeypatch.setattr(thirdparty, "_fetch", fetch)
+    write("index.html", '<link rel="stylesheet" '
+                        'href="https://cdn.example.com/lib/css/site.css">')
+
+    thirdparty.vendor(site)
+
+    manifest = json.loads((site.static / "vendor/manifest.json").read_text())
+    assert set(manifest) == set(FILES)
+    css = (site.static / manifest[
+        "https://cdn.example.com/lib/css/site.css"]).read_text()
+    assert "https://" not in css and "../fonts" not in css
+    assert 'url(/vendor/fonts.gstatic.com/inter.woff2)' in css
+    assert '@import "/vendor/cdn.example.com/more.css"' in css
+    assert 'url("/vendor/cdn.example.com/icon.svg#a")' in css
+    assert "data:image/gif" in css
+    more = (site.static / manifest[
+        "https://cdn.example.com/lib/css/more.css"]).read_text()
+    assert "url(/vendor/cdn.example.com/bg.png)" in more
+
+    # A second run has nothing left to fetch and leaves the copies alone.
+    fetched.clear()
+    thirdparty.vendor(site)
+    assert fetched == []
+    assert (site.static / manifest[
+        "https://cdn.example.com/lib/css/site.css"]).read_text() == css